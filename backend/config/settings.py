@@ -22,6 +22,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request latency, SQL query and ingest stage timings (see METRICS_ENABLED)
+    'equipment_api.metrics.MetricsMiddleware',
+    # Compresses responses for clients that accept gzip; compressed responses
+    # carry weak ETags, which conditional GETs still match
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -52,12 +57,35 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database profile, chosen with the DATABASE_PROFILE environment variable:
+# 'sqlite' (default, tuned with SQLITE_PRAGMAS) or 'postgresql' (configured
+# by the POSTGRES_* variables; records are bulk-loaded with COPY)
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+
+if DATABASE_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'equipment'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+            # Seconds a writer waits for the lock before "database is locked"
+            'OPTIONS': {'timeout': 20},
+        }
     }
-}
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -68,9 +96,117 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # orjson-backed JSON (falls back to the stdlib encoder without orjson)
+    'DEFAULT_RENDERER_CLASSES': [
+        'equipment_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Number of EquipmentData rows written per bulk_create during CSV ingest
+INGEST_BATCH_SIZE = 5000
+
+# CSV ingest engine: 'csv', 'pandas', or 'auto' (pandas for files of at least
+# INGEST_PANDAS_MIN_BYTES, falling back to csv when pandas is not installed)
+INGEST_ENGINE = 'auto'
+INGEST_PANDAS_MIN_BYTES = 1024 * 1024
+
+# Asynchronous ingest: when INGEST_ASYNC is true (or a client sends async=1),
+# POST /api/datasets/ returns 202 with an IngestJob that a local worker pool
+# ('process', 'thread' or 'inline') processes; poll /api/jobs/{id}/. Parses
+# of chunked uploads that are still arriving run in a pool of their own.
+INGEST_ASYNC = False
+INGEST_JOB_EXECUTOR = 'process'
+INGEST_JOB_WORKERS = 2
+INGEST_STREAM_WORKERS = 2
+
+# Columnar record storage: write each dataset's columns as memory-mappable
+# files under MEDIA_ROOT/columnar/. Uploads of at least COLUMNAR_ONLY_MIN_BYTES
+# are stored only as columns, without EquipmentData rows (None disables this).
+COLUMNAR_STORAGE = False
+COLUMNAR_ONLY_MIN_BYTES = None
+
+# Extended summary statistics: KLL quantile sketch size (rank error ~1.7/k)
+# and the number of equal-width histogram bins per numeric column
+SUMMARY_SKETCH_K = 200
+SUMMARY_HISTOGRAM_BINS = 10
+# Per equipment type: sketch size, how many of the most common types keep
+# their sketch in summary_partials, and how many are listed in summary_data
+# (the rest are folded into 'other_types')
+SUMMARY_TYPE_SKETCH_K = 50
+SUMMARY_SKETCH_TYPES = 100
+SUMMARY_MAX_TYPES = 20
+
+# Response cache for dataset detail, summary, report and history payloads.
+# Swap for 'django.core.cache.backends.filebased.FileBasedCache' to share it
+# between worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'equipment-api',
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+# Datasets with more records than this are revalidated but not kept in cache
+RESPONSE_CACHE_MAX_ROWS = 50000
+
+# Render each dataset's PDF report in the background right after ingest;
+# downloads are then served from MEDIA_ROOT/reports/
+REPORT_PRERENDER = True
+
+# Dataset retention, applied in bulk after each ingest commits and by
+# `manage.py prune_datasets` (which also removes orphaned upload files).
+# Any limit may be None.
+DATASET_RETENTION = {
+    'max_count': 5,
+    'max_age_days': None,
+    'max_rows': None,
+    'max_bytes': None,
+}
+RETENTION_AFTER_INGEST = True
+ORPHAN_UPLOAD_GRACE_SECONDS = 60 * 60
+
+# Chunked uploads (/api/uploads/): largest accepted chunk, how long a parse
+# that runs ahead of the upload waits for the next chunk, and how long an
+# idle upload session is kept before `prune_datasets` discards it
+UPLOAD_MAX_CHUNK_BYTES = 16 * 1024 * 1024
+UPLOAD_STALL_TIMEOUT = 10 * 60
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+# Instrumentation: per-stage Server-Timing headers on every response and
+# Prometheus metrics (latency histograms, query counts, rows ingested) at
+# /api/metrics. Off by default; the disabled hooks cost next to nothing.
+METRICS_ENABLED = False
+
+# Applied to every new SQLite connection. WAL lets reads proceed while an
+# upload is being written and synchronous=NORMAL is durable across app
+# crashes (only an OS crash can lose the last commits).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+# Load ingested records with COPY instead of INSERT on PostgreSQL
+INGEST_POSTGRES_COPY = True
+
+# Rows per record batch (and Parquet row group) in /api/datasets/{id}/export/
+EXPORT_BATCH_SIZE = 64 * 1024
+
+# Outlier index (/api/datasets/{id}/outliers/): after ingest, each equipment
+# type gets a normal range per field ('iqr': Q1 - k*IQR .. Q3 + k*IQR, or
+# 'zscore': mean +- k std) and records outside it are flagged. Keys are
+# equipment types, '*' applies to all; 'limits' fixes a field's range, e.g.
+# {'Pump': {'limits': {'pressure': [0, 20]}}}. Changes apply to later ingests
+# and to types first seen in appends; appends check only their new records
+# against the stored ranges, and `manage.py flag_outliers` recomputes them.
+# With OUTLIER_DETECTION off, the first request queues a background job.
+OUTLIER_DETECTION = True
+OUTLIER_THRESHOLDS = {
+    '*': {'method': 'iqr', 'k': 1.5},
+}
@@ -0,0 +1,216 @@
+"""Repeatable performance measurements for ingest and the dataset API.
+
+``run_suite`` uploads synthetic CSVs (see :mod:`equipment_api.synthetic`)
+through the real ``create`` view and then requests ``retrieve``,
+``summary``, ``generate_report`` and ``history`` for each dataset, recording
+wall time, database query count and time, and peak RSS. Results are plain
+dicts so they can be stored as JSON and checked against a saved baseline
+with ``compare``. ``manage.py benchmark_suite`` runs this against a
+throwaway database.
+"""
+import os
+import platform
+import shutil
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .ingest import get_batch_size
+from .synthetic import write_equipment_csv
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+ENDPOINTS = ('create', 'retrieve', 'summary', 'generate_report', 'history')
+# Metrics where a larger value is an improvement; everything else should shrink
+HIGHER_IS_BETTER = ('rows_per_second',)
+BOUNDARY = 'EquipmentBenchmarkBoundary'
+
+
+def reset_peak_rss():
+    """Reset the kernel's high-water mark so the next peak covers one step only."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def measure(request):
+    """Run ``request()`` and return ``(response, metrics)``."""
+    reset_peak_rss()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = request()
+        if getattr(response, 'streaming', False):
+            # Generated file responses are only produced while being consumed
+            for _ in response.streaming_content:
+                pass
+            response.close()
+        elapsed = time.perf_counter() - started
+    return response, {
+        'seconds': elapsed,
+        'queries': len(queries),
+        'query_seconds': sum(float(query['time']) for query in queries.captured_queries),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'status': response.status_code,
+    }
+
+
+def write_multipart_body(csv_path, body_path):
+    """Wrap a CSV in a multipart/form-data body on disk, as a browser would send it."""
+    with open(csv_path, 'rb') as source, open(body_path, 'wb') as body:
+        body.write(
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(csv_path)}"\r\n'
+            'Content-Type: text/csv\r\n\r\n'.encode('utf-8')
+        )
+        shutil.copyfileobj(source, body, 1024 * 1024)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode('utf-8'))
+
+
+def post_file(client, body_path):
+    """POST a prepared multipart body, streamed from disk rather than held in memory."""
+    with open(body_path, 'rb') as body:
+        return client.request(**{
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/api/datasets/',
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+            'wsgi.input': body,
+        })
+
+
+def dataset_csv(data_dir, rows, type_cardinality, seed):
+    """Return a synthetic CSV for these parameters, generating it only once."""
+    path = os.path.join(data_dir, f'equipment_{rows}_{type_cardinality}_{seed}.csv')
+    if not os.path.exists(path):
+        write_equipment_csv(path + '.part', rows, type_cardinality, seed)
+        os.replace(path + '.part', path)
+    return path
+
+
+def run_suite(row_counts, data_dir, type_cardinality=8, seed=0, repeat=5, endpoints=ENDPOINTS):
+    """Benchmark each row count in ``row_counts`` and return the results.
+
+    Each read endpoint is requested once with a cold response cache and then
+    ``repeat`` more times; warm timings are reported as the median.
+    """
+    rss_scope = 'step' if reset_peak_rss() else 'process'
+    user, _ = User.objects.get_or_create(username='benchmark')
+    client = APIClient()
+    client.force_authenticate(user)
+    results = {}
+
+    for rows in row_counts:
+        csv_path = dataset_csv(data_dir, rows, type_cardinality, seed)
+        body_path = os.path.join(data_dir, f'upload_{rows}.multipart')
+        write_multipart_body(csv_path, body_path)
+        try:
+            response, create = measure(lambda: post_file(client, body_path))
+        finally:
+            os.remove(body_path)
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f'Upload of {rows} rows failed: {response.content[:200]!r}')
+        dataset_id = response.data['id']
+
+        scenario = {'rows': rows, 'file_bytes': os.path.getsize(csv_path)}
+        if 'create' in endpoints:
+            scenario['create'] = {**create, 'rows_per_second': rows / create['seconds']}
+
+        urls = {
+            'retrieve': f'/api/datasets/{dataset_id}/',
+            'summary': f'/api/datasets/{dataset_id}/summary/',
+            'generate_report': f'/api/datasets/{dataset_id}/generate_report/',
+            'history': '/api/history/',
+        }
+        cache.clear()
+        for endpoint, url in urls.items():
+            if endpoint not in endpoints:
+                continue
+            _, cold = measure(lambda: client.get(url))
+            warm = [measure(lambda: client.get(url))[1] for _ in range(repeat)]
+            scenario[endpoint] = {
+                'cold': cold,
+                'warm': {
+                    'seconds': statistics.median(run['seconds'] for run in warm),
+                    'queries': max(run['queries'] for run in warm),
+                    'query_seconds': statistics.median(run['query_seconds'] for run in warm),
+                },
+            } if warm else {'cold': cold}
+        results[str(rows)] = scenario
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+            'type_cardinality': type_cardinality,
+            'seed': seed,
+            'repeat': repeat,
+            'ingest_engine': getattr(settings, 'INGEST_ENGINE', 'auto'),
+            'batch_size': get_batch_size(),
+            # 'process' means peak RSS could not be reset between steps
+            'peak_rss_scope': rss_scope,
+        },
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    metrics = {}
+    for key, value in results.items():
+        path = f'{prefix}/{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in ('rows', 'status'):
+            metrics[path] = value
+    return metrics
+
+
+def compare(current, baseline, tolerance=0.2):
+    """List metrics that got worse than ``baseline`` by more than ``tolerance``.
+
+    Both arguments are ``run_suite`` outputs. Returns ``(metric, baseline,
+    current, relative_change)`` tuples; the change is positive when worse.
+    """
+    now = flatten(current['results'])
+    before = flatten(baseline['results'])
+    regressions = []
+    for metric, old in sorted(before.items()):
+        new = now.get(metric)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if metric.rsplit('/', 1)[-1] in HIGHER_IS_BETTER:
+            change = -change
+        if change > tolerance:
+            regressions.append((metric, old, new, change))
+    return regressions
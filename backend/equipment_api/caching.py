@@ -0,0 +1,118 @@
+"""Response caching and conditional GET support for dataset endpoints.
+
+Datasets only change through appends, which bump their revision, so each
+cacheable representation is identified by the dataset id plus a version
+token. Rendered payloads live
+in the Django cache under ``equipment_api:<scope>:<variant>:<format>`` (the
+negotiated renderer's format) and are dropped by the signal handlers when a
+dataset is saved or deleted. Every
+response carries a strong ``ETag`` and ``Last-Modified`` so clients that
+revalidate get a ``304 Not Modified`` without the payload being rebuilt.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import ColumnarJSONRenderer
+
+DATASET_VARIANTS = ('retrieve', 'retrieve-columnar', 'summary')
+HISTORY_KEY = 'equipment_api:history'
+DEFAULT_TIMEOUT = 60 * 60
+DEFAULT_MAX_ROWS = 50_000
+
+
+def dataset_key(dataset_id, variant):
+    return f'equipment_api:dataset:{dataset_id}:{variant}'
+
+
+def compare_key(dataset_ids):
+    # Comparisons are not invalidated by the signal handlers: the version
+    # check in conditional_response keeps stale ones from being served
+    digest = hashlib.sha256(','.join(str(pk) for pk in dataset_ids).encode('utf-8')).hexdigest()
+    return f'equipment_api:compare:{digest[:32]}'
+
+
+def dataset_version(dataset):
+    # Records and summary change only when rows are appended; re-uploading
+    # identical content only moves upload_date, which must not invalidate anything
+    return f'{dataset.pk}:{dataset.revision}'
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def is_cacheable(dataset):
+    """Whether a dataset is small enough to keep its record payloads in cache."""
+    limit = getattr(settings, 'RESPONSE_CACHE_MAX_ROWS', DEFAULT_MAX_ROWS)
+    return dataset.summary_data.get('total_count', 0) <= limit
+
+
+def renderer_formats():
+    return {renderer.format for renderer in api_settings.DEFAULT_RENDERER_CLASSES} | {ColumnarJSONRenderer.format}
+
+
+def conditional_response(request, key, version, last_modified, build, cacheable=True):
+    """Serve ``build()`` with validators, short-circuiting to 304 when possible.
+
+    ``key`` names the cache entry, ``version`` identifies the representation
+    (it becomes the ETag, together with the negotiated format) and ``build``
+    returns the response to send when the client's copy is stale. The built
+    response is cached unless ``cacheable`` is false or it is a browsable
+    API page, which is rendered per user. Status, content and headers are
+    stored, so this works for JSON and file responses alike.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    render_format = getattr(renderer, 'format', '')
+    key = f'{key}:{render_format}'
+    cacheable = cacheable and not isinstance(renderer, BrowsableAPIRenderer)
+    etag = make_etag(key, version)
+    timestamp = int(last_modified.timestamp())
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, timestamp)
+
+    cached = cache.get(key) if cacheable else None
+    if cached is not None and cached['version'] == version:
+        response = cached['response']
+    else:
+        response = _render(request, build())
+        if cacheable and response.status_code == 200 and not response.streaming:
+            cache.set(
+                key, {'version': version, 'response': response},
+                getattr(settings, 'RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+            )
+    return _with_validators(response, etag, timestamp)
+
+
+def _render(request, response):
+    if isinstance(response, Response):
+        # Render now (normally done after the view returns) so the bytes can be
+        # cached, with the same context the view would have provided
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = {**request.parser_context['view'].get_renderer_context(), 'response': response}
+        response.render()
+    return response
+
+
+def _with_validators(response, etag, timestamp):
+    # The representation depends on content negotiation
+    patch_vary_headers(response, ('Accept',))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def invalidate_dataset(dataset_id):
+    keys = [dataset_key(dataset_id, variant) for variant in DATASET_VARIANTS] + [HISTORY_KEY]
+    cache.delete_many([f'{key}:{render_format}' for key in keys for render_format in renderer_formats()])
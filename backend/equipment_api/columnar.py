@@ -0,0 +1,394 @@
+"""Columnar, memory-mapped storage for dataset records.
+
+Each dataset gets a directory under ``MEDIA_ROOT/columnar/<dataset id>/``
+holding one little-endian binary file per column:
+
+* ``flowrate.f64``, ``pressure.f64``, ``temperature.f64`` - float64 values
+* ``equipment_type.u32`` - dictionary codes into ``meta.json["types"]``
+* ``equipment_name.bin`` / ``equipment_name.i64`` - UTF-8 names and offsets
+* ``outliers.i64`` - positions of outlier records (see :mod:`.outliers`)
+* ``derived/`` - sort orders and the name dictionary, computed on first use
+  and kept per row count (so per revision); appends clear them
+
+Files are appended batch by batch during ingest (and when rows are appended
+to the dataset later) and read back with ``numpy.memmap``, so analytics
+never materialize ORM rows. ``meta.json`` is rewritten last, so readers only
+see rows up to its ``count``.
+"""
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional at runtime
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from .models import STORAGE_BOTH, STORAGE_COLUMNAR, STORAGE_ROWS
+from .stats import NUMERIC_FIELDS
+
+FLOAT_DTYPE = '<f8'
+CODE_DTYPE = '<u4'
+OFFSET_DTYPE = '<i8'
+DERIVED_DIR = 'derived'
+
+
+def is_available():
+    return np is not None
+
+
+def dataset_dir(dataset_id):
+    return os.path.join(settings.MEDIA_ROOT, 'columnar', str(dataset_id))
+
+
+def choose_storage(file_path, size=None):
+    """Decide where a new upload's records go.
+
+    ``COLUMNAR_STORAGE`` enables writing the column files alongside the
+    ``EquipmentData`` rows; files of at least ``COLUMNAR_ONLY_MIN_BYTES`` skip
+    the rows entirely. ``size`` overrides the file's current size.
+    """
+    if not getattr(settings, 'COLUMNAR_STORAGE', False) or not is_available():
+        return STORAGE_ROWS
+    threshold = getattr(settings, 'COLUMNAR_ONLY_MIN_BYTES', None)
+    if size is None and threshold is not None:
+        size = os.path.getsize(file_path)
+    if threshold is not None and size >= threshold:
+        return STORAGE_COLUMNAR
+    return STORAGE_BOTH
+
+
+def outliers_path(dataset_id):
+    return os.path.join(dataset_dir(dataset_id), 'outliers.i64')
+
+
+def write_outlier_positions(dataset_id, positions):
+    path = outliers_path(dataset_id)
+    np.asarray(positions, dtype=OFFSET_DTYPE).tofile(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+
+
+def delete_store(dataset_id):
+    shutil.rmtree(dataset_dir(dataset_id), ignore_errors=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(lock_path(dataset_id))
+
+
+def lock_path(dataset_id):
+    return os.path.join(settings.MEDIA_ROOT, 'columnar', f'{dataset_id}.lock')
+
+
+_lock_guard = threading.Lock()
+
+
+@contextlib.contextmanager
+def dataset_lock(dataset_id):
+    """Hold an exclusive lock on ``dataset_id``'s records across processes.
+
+    Taken with ``flock`` on ``MEDIA_ROOT/columnar/<dataset id>.lock``, so it
+    also serializes writers on SQLite, where ``select_for_update`` is a no-op.
+    Without ``fcntl`` only threads of this process are serialized.
+    """
+    if fcntl is None:  # pragma: no cover
+        with _lock_guard:
+            yield
+        return
+    path = lock_path(dataset_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def discard_uncommitted(dataset_id, created=False):
+    """Cut the column files back to the rows recorded in ``meta.json``.
+
+    For appends whose transaction rolled back after their rows were written;
+    call it while still holding :func:`dataset_lock`. With ``created`` the
+    dataset itself was rolled back, so its whole store is removed.
+    """
+    if created:
+        delete_store(dataset_id)
+    elif ColumnarStore.exists(dataset_id):
+        ColumnarWriter(dataset_id, append=True).abort()
+
+
+FILE_NAMES = {
+    **{field: f'{field}.f64' for field in NUMERIC_FIELDS},
+    'equipment_type': 'equipment_type.u32',
+    'names': 'equipment_name.bin',
+    'offsets': 'equipment_name.i64',
+}
+
+
+class ColumnarWriter:
+    """Append record batches to a dataset's column files.
+
+    With ``append``, the existing files are extended instead of replaced;
+    anything past the rows recorded in ``meta.json`` (left by an interrupted
+    append) is cut off first, and ``abort()`` restores the previous length.
+    Positions set in ``outlier_positions`` (appended rows only) are added to
+    the outlier index on ``close()``.
+    """
+
+    def __init__(self, dataset_id, append=False):
+        self.dataset_id = dataset_id
+        self.path = dataset_dir(dataset_id)
+        os.makedirs(self.path, exist_ok=True)
+        self.count = 0
+        self.name_bytes = 0
+        self.type_codes = {}
+        self.sizes = None
+        self.outlier_positions = None
+        if append:
+            self._truncate_to_meta()
+        # Position of the first row written by this writer
+        self.start = self.count
+        self.files = {
+            key: open(os.path.join(self.path, filename), 'ab' if append else 'wb')
+            for key, filename in FILE_NAMES.items()
+        }
+        if not append:
+            np.zeros(1, dtype=OFFSET_DTYPE).tofile(self.files['offsets'])
+
+    def _truncate_to_meta(self):
+        with open(os.path.join(self.path, 'meta.json')) as meta:
+            meta = json.load(meta)
+        self.count = meta['count']
+        self.type_codes = {equipment_type: code for code, equipment_type in enumerate(meta['types'])}
+        offsets_path = os.path.join(self.path, FILE_NAMES['offsets'])
+        self.name_bytes = int(np.fromfile(
+            offsets_path, dtype=OFFSET_DTYPE, count=1, offset=self.count * np.dtype(OFFSET_DTYPE).itemsize
+        )[0])
+        self.sizes = {
+            **{field: self.count * np.dtype(FLOAT_DTYPE).itemsize for field in NUMERIC_FIELDS},
+            'equipment_type': self.count * np.dtype(CODE_DTYPE).itemsize,
+            'names': self.name_bytes,
+            'offsets': (self.count + 1) * np.dtype(OFFSET_DTYPE).itemsize,
+        }
+        self._truncate(self.count)
+
+    def _truncate(self, count):
+        for key, size in self.sizes.items():
+            os.truncate(os.path.join(self.path, FILE_NAMES[key]), size)
+        path = outliers_path(self.dataset_id)
+        if os.path.exists(path):
+            positions = np.fromfile(path, dtype=OFFSET_DTYPE)
+            kept = int(np.searchsorted(positions, count))
+            if kept < len(positions):
+                os.truncate(path, kept * np.dtype(OFFSET_DTYPE).itemsize)
+
+    def append(self, names, types, flowrates, pressures, temperatures):
+        for field, values in zip(NUMERIC_FIELDS, (flowrates, pressures, temperatures)):
+            np.asarray(values, dtype=FLOAT_DTYPE).tofile(self.files[field])
+
+        codes = self.type_codes
+        np.fromiter(
+            (codes.setdefault(equipment_type, len(codes)) for equipment_type in types),
+            dtype=CODE_DTYPE, count=len(types)
+        ).tofile(self.files['equipment_type'])
+
+        encoded = [name.encode('utf-8') for name in names]
+        self.files['names'].write(b''.join(encoded))
+        offsets = np.cumsum([len(name) for name in encoded], dtype=OFFSET_DTYPE) + self.name_bytes
+        offsets.tofile(self.files['offsets'])
+        if len(offsets):
+            self.name_bytes = int(offsets[-1])
+
+        self.count += len(names)
+
+    def flush(self):
+        for handle in self.files.values():
+            handle.flush()
+
+    def appended_columns(self):
+        """Type codes and numeric columns of the rows written so far by this writer."""
+        self.flush()
+        columns = {
+            field: np.fromfile(os.path.join(self.path, FILE_NAMES[field]), dtype=FLOAT_DTYPE,
+                               offset=self.start * np.dtype(FLOAT_DTYPE).itemsize)
+            for field in NUMERIC_FIELDS
+        }
+        type_codes = np.fromfile(os.path.join(self.path, FILE_NAMES['equipment_type']), dtype=CODE_DTYPE,
+                                 offset=self.start * np.dtype(CODE_DTYPE).itemsize)
+        return type_codes, list(self.type_codes), columns
+
+    def close(self):
+        for handle in self.files.values():
+            handle.close()
+        if self.outlier_positions is not None and len(self.outlier_positions):
+            with open(outliers_path(self.dataset_id), 'ab') as handle:
+                np.asarray(self.outlier_positions, dtype=OFFSET_DTYPE).tofile(handle)
+        # Replaced atomically so readers never see a half-written file
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as meta:
+            json.dump({'count': self.count, 'types': list(self.type_codes)}, meta)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+        shutil.rmtree(os.path.join(self.path, DERIVED_DIR), ignore_errors=True)
+
+    def abort(self):
+        for handle in self.files.values():
+            handle.close()
+        if self.sizes is None:
+            delete_store(self.dataset_id)
+        else:
+            self._truncate(self.start)
+
+
+class ColumnarStore:
+    """Read-only, memory-mapped view of a dataset's column files."""
+
+    def __init__(self, dataset_id):
+        self.path = dataset_dir(dataset_id)
+        with open(os.path.join(self.path, 'meta.json')) as meta:
+            meta = json.load(meta)
+        self.count = meta['count']
+        self.types = meta['types']
+        # Sliced to the recorded count: an append may be extending the files
+        self.columns = {
+            field: self._map(FILE_NAMES[field], FLOAT_DTYPE)[:self.count] for field in NUMERIC_FIELDS
+        }
+        self.type_codes = self._map(FILE_NAMES['equipment_type'], CODE_DTYPE)[:self.count]
+        self.name_offsets = self._map(FILE_NAMES['offsets'], OFFSET_DTYPE)[:self.count + 1]
+        self.name_data = self._map(FILE_NAMES['names'], 'u1')
+
+    @classmethod
+    def exists(cls, dataset_id):
+        return os.path.exists(os.path.join(dataset_dir(dataset_id), 'meta.json'))
+
+    def _map(self, filename, dtype):
+        path = os.path.join(self.path, filename)
+        if not os.path.getsize(path):
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def outlier_positions(self):
+        """Sorted positions of the outlier records, or ``None`` if not computed."""
+        path = os.path.join(self.path, 'outliers.i64')
+        if not os.path.exists(path):
+            return None
+        positions = np.fromfile(path, dtype=OFFSET_DTYPE)
+        # An append may have added positions past the recorded count
+        return positions[:np.searchsorted(positions, self.count)]
+
+    def type_code(self, equipment_type):
+        """Dictionary code for ``equipment_type``, or ``None`` if absent."""
+        try:
+            return self.types.index(equipment_type)
+        except ValueError:
+            return None
+
+    def name(self, index):
+        return self.name_bytes(index).decode('utf-8')
+
+    def name_bytes(self, index):
+        start, stop = self.name_offsets[index], self.name_offsets[index + 1]
+        return self.name_data[start:stop].tobytes()
+
+    def derived(self, name, compute):
+        """An array derived from the columns, computed with ``compute()`` on first use.
+
+        Saved under ``derived/`` keyed by the row count, so later requests
+        for the same revision memory-map it instead of recomputing it.
+        """
+        directory = os.path.join(self.path, DERIVED_DIR)
+        path = os.path.join(directory, f'{name}.{self.count}.npy')
+        try:
+            return np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+        array = compute()
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as tmp:
+            np.save(tmp, array)
+        os.replace(tmp_path, path)
+        return array
+
+    def name_codes(self):
+        """Each row's code into the distinct names, numbered in sorted order.
+
+        Built once per revision; sorting, filtering and grouping by name then
+        compare integers instead of decoding every name.
+        """
+        def compute():
+            data = self.name_data.tobytes()
+            offsets = self.name_offsets.tolist()
+            # UTF-8 bytes sort in the same order as the decoded strings
+            names = np.array([data[start:stop] for start, stop in zip(offsets, offsets[1:])], dtype=object)
+            return np.unique(names, return_inverse=True)[1].astype(CODE_DTYPE)
+        return self.derived('name_codes', compute)
+
+    def name_rows(self):
+        """Position of the first row holding each name code (see :meth:`name_codes`)."""
+        def compute():
+            codes = np.asarray(self.name_codes())
+            rows = np.empty(int(codes.max()) + 1 if len(codes) else 0, dtype=OFFSET_DTYPE)
+            # Reversed so that the first row of each name is written last
+            rows[codes[::-1]] = np.arange(self.count - 1, -1, -1)
+            return rows
+        return self.derived('name_rows', compute)
+
+    def name_code(self, name):
+        """Code of ``name`` in :meth:`name_codes`, or ``None`` if absent."""
+        rows = self.name_rows()
+        target = name.encode('utf-8')
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_bytes(rows[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(rows) and self.name_bytes(rows[low]) == target:
+            return low
+        return None
+
+    def sort_order(self, field, sort_key):
+        """Row positions in ascending ``sort_key()`` order (ties by position), cached per revision."""
+        return self.derived(f'order.{field}', lambda: np.argsort(sort_key(), kind='stable'))
+
+    def column_values(self, indexes, fields=None, encode_types=False):
+        """Lists of values per field for the given row positions.
+
+        With ``encode_types``, ``equipment_type`` holds codes into
+        ``self.types`` instead of the type names.
+        """
+        fields = fields or ('equipment_name', 'equipment_type') + NUMERIC_FIELDS
+        columns = {
+            field: self.columns[field][indexes].tolist() for field in NUMERIC_FIELDS if field in fields
+        }
+        if 'equipment_type' in fields:
+            codes = self.type_codes[indexes].tolist()
+            columns['equipment_type'] = codes if encode_types else [self.types[code] for code in codes]
+        if 'equipment_name' in fields:
+            columns['equipment_name'] = [self.name(index) for index in indexes]
+        return columns
+
+    def records(self, indexes, fields=None):
+        """Materialize record dicts for the given row positions only."""
+        fields = fields or ('equipment_name', 'equipment_type') + NUMERIC_FIELDS
+        columns = self.column_values(indexes, fields)
+        return [
+            {field: columns[field][position] for field in fields}
+            for position in range(len(indexes))
+        ]
+
+    def all_records(self, fields=None):
+        return self.records(np.arange(self.count), fields)
+
+    def all_column_values(self, fields=None, encode_types=False):
+        return self.column_values(np.arange(self.count), fields, encode_types)
@@ -0,0 +1,64 @@
+"""Side-by-side statistics for several datasets.
+
+Combined figures are produced by merging each dataset's stored
+``summary_partials`` (see :meth:`.stats.SummaryStats.to_partials`), so a
+comparison costs the same however many records the datasets hold.
+"""
+from .ingest import dataset_stats
+from .serializers import EquipmentDatasetListSerializer
+from .stats import NUMERIC_FIELDS, SummaryStats
+
+DEFAULT_LIMIT = 5
+MAX_DATASETS = 20
+
+
+def type_deltas(summaries, combined):
+    """Per equipment type: each dataset's share and means against the combined figures.
+
+    ``summaries`` and ``combined`` hold every type (see
+    :meth:`.stats.SummaryStats.type_summaries`), not just the ones listed in
+    ``summary_data``.
+    """
+    deltas = {}
+    for equipment_type, combined_type in combined['by_type'].items():
+        combined_share = combined_type['count'] / combined['total_count']
+        datasets = {}
+        for dataset_id, summary in summaries.items():
+            type_summary = summary['by_type'].get(equipment_type)
+            count = type_summary['count'] if type_summary else 0
+            share = count / summary['total_count'] if summary['total_count'] else 0.0
+            entry = {'count': count, 'share': share, 'share_delta': share - combined_share}
+            for field in NUMERIC_FIELDS:
+                mean = type_summary[field]['mean'] if type_summary else None
+                entry[field] = {
+                    'mean': mean,
+                    'delta': None if mean is None else mean - combined_type[field]['mean'],
+                }
+            datasets[dataset_id] = entry
+        deltas[equipment_type] = {
+            'combined': {
+                'count': combined_type['count'],
+                'share': combined_share,
+                **{field: {'mean': combined_type[field]['mean']} for field in NUMERIC_FIELDS},
+            },
+            'datasets': datasets,
+        }
+    return deltas
+
+
+def compare_datasets(datasets):
+    """Per-dataset summaries, their combined summary and per-type deltas."""
+    combined = SummaryStats()
+    summaries = {}
+    for dataset in datasets:
+        stats = dataset_stats(dataset)
+        # Rebuilt from the partials: summary_data of older datasets lacks by_type
+        summaries[str(dataset.pk)] = {'total_count': stats.count, 'by_type': stats.type_summaries()[0]}
+        combined.merge(stats)
+    combined_summary = combined.as_summary()
+    all_types = {'total_count': combined.count, 'by_type': combined.type_summaries()[0]}
+    return {
+        'datasets': EquipmentDatasetListSerializer(datasets, many=True).data,
+        'combined': combined_summary,
+        'type_deltas': type_deltas(summaries, all_types),
+    }
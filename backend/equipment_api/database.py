@@ -0,0 +1,95 @@
+"""Database-specific tuning and bulk loading.
+
+SQLite connections get the ``SQLITE_PRAGMAS`` (WAL journal, relaxed
+fsync, memory-mapped reads) as soon as they are opened, so uploads no
+longer block readers. On PostgreSQL, ingested records are loaded with
+``COPY ... FROM STDIN`` instead of multi-row INSERTs unless
+``INGEST_POSTGRES_COPY`` is off.
+"""
+import csv
+import io
+import itertools
+
+from django.conf import settings
+from django.db import connection
+
+from .models import EquipmentData
+
+DEFAULT_SQLITE_PRAGMAS = {
+    # Readers keep working while an ingest writes, and commits skip an fsync
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+DEFAULT_POSTGRES_COPY = True
+
+# Column order of the batches produced by the ingest engines
+RECORD_FIELDS = ('equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature')
+# Copied columns; COPY does not apply the model's defaults, so is_outlier is always written
+COPY_FIELDS = RECORD_FIELDS + ('is_outlier',)
+
+
+def apply_sqlite_pragmas(db_connection):
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+    with db_connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def uses_copy():
+    return connection.vendor == 'postgresql' and getattr(settings, 'INGEST_POSTGRES_COPY', DEFAULT_POSTGRES_COPY)
+
+
+def insert_records(dataset, batch, flags=None):
+    """Write one parsed batch (columns in ``RECORD_FIELDS`` order) as ``EquipmentData`` rows.
+
+    ``flags``, if given, holds each row's ``is_outlier``.
+    """
+    if flags is None:
+        flags = itertools.repeat(False)
+    if uses_copy():
+        copy_records(dataset, batch, flags)
+        return
+    EquipmentData.objects.bulk_create([
+        EquipmentData(
+            dataset=dataset,
+            equipment_name=name,
+            equipment_type=equipment_type,
+            flowrate=flowrate,
+            pressure=pressure,
+            temperature=temperature,
+            is_outlier=is_outlier
+        )
+        for name, equipment_type, flowrate, pressure, temperature, is_outlier in zip(*batch, flags)
+    ])
+
+
+def copy_sql():
+    quote = connection.ops.quote_name
+    meta = EquipmentData._meta
+    columns = [meta.get_field('dataset').column] + [
+        meta.get_field(name).column for name in COPY_FIELDS
+    ]
+    return (
+        f'COPY {quote(meta.db_table)} ({", ".join(quote(column) for column in columns)}) '
+        'FROM STDIN WITH (FORMAT csv)'
+    )
+
+
+def copy_records(dataset, batch, flags):
+    """Stream a batch into PostgreSQL with COPY, skipping per-row INSERT overhead."""
+    buffer = io.StringIO()
+    # Strings are quoted so that empty names stay '' instead of becoming NULL
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(
+        zip(itertools.repeat(str(dataset.pk)), *batch, flags)
+    )
+    sql = copy_sql()
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
@@ -0,0 +1,230 @@
+"""Binary bulk export of a dataset's records.
+
+``stream_export`` turns a dataset into an Arrow IPC stream, a Parquet file
+or a NumPy ``.npz`` archive, produced piece by piece while the response is
+being sent. Records are read in batches of ``EXPORT_BATCH_SIZE`` rows from a
+database cursor or sliced out of the dataset's column files, so memory use
+does not depend on the size of the dataset. ``equipment_type`` is exported
+dictionary-encoded with one dictionary for the whole dataset.
+"""
+import io
+import itertools
+import zipfile
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Length
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional at runtime
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - Arrow and Parquet exports are optional
+    pa = pq = None
+
+from .columnar import ColumnarStore
+from .models import EquipmentData
+from .serializers import RECORD_FIELDS
+from .stats import NUMERIC_FIELDS
+
+DEFAULT_BATCH_SIZE = 64 * 1024
+
+# format: (content type, file extension, required module)
+FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', 'pyarrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', 'pyarrow'),
+    'npz': ('application/octet-stream', 'npz', 'numpy'),
+}
+
+
+def get_batch_size():
+    return getattr(settings, 'EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def check_format(name):
+    """Raise ``ValueError`` unless ``name`` is a format this server can produce."""
+    if name not in FORMATS:
+        raise ValueError(f'Unknown export format {name!r}; use one of {", ".join(FORMATS)}')
+    module = FORMATS[name][2]
+    if (module == 'pyarrow' and pa is None) or (module == 'numpy' and np is None):
+        raise ValueError(f'{name} export requires the {module} package')
+
+
+class RowSource:
+    """Batches of a dataset's ``EquipmentData`` rows, read through one cursor per pass."""
+
+    def __init__(self, dataset, batch_size):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.count = dataset.summary_data.get('total_count', 0)
+        self.types = list(dataset.summary_data.get('equipment_types', {}))
+        self.type_lookup = {name: code for code, name in enumerate(self.types)}
+
+    def type_code(self, name):
+        code = self.type_lookup.get(name)
+        if code is None:
+            code = self.type_lookup[name] = len(self.types)
+            self.types.append(name)
+        return code
+
+    def batches(self, fields=RECORD_FIELDS):
+        """Yield ``{field: values}`` per batch; ``equipment_type`` holds codes."""
+        rows = (
+            EquipmentData.objects.filter(dataset=self.dataset).order_by('id')
+            .values_list(*fields).iterator(chunk_size=self.batch_size)
+        )
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            columns = dict(zip(fields, (list(column) for column in zip(*batch))))
+            if 'equipment_type' in columns:
+                columns['equipment_type'] = [self.type_code(name) for name in columns['equipment_type']]
+            yield columns
+
+    def max_name_length(self):
+        records = EquipmentData.objects.filter(dataset=self.dataset)
+        return records.aggregate(length=Max(Length('equipment_name')))['length'] or 0
+
+
+class StoreSource:
+    """Batches sliced out of a :class:`~.columnar.ColumnarStore`."""
+
+    def __init__(self, store, batch_size):
+        self.store = store
+        self.batch_size = batch_size
+        self.count = store.count
+        self.types = store.types
+
+    def batches(self, fields=RECORD_FIELDS):
+        for start in range(0, self.count, self.batch_size):
+            indexes = np.arange(start, min(start + self.batch_size, self.count))
+            yield self.store.column_values(indexes, fields, encode_types=True)
+
+    def max_name_length(self):
+        # Bytes, which is at least the number of characters
+        offsets = self.store.name_offsets
+        return int(np.diff(offsets).max()) if len(offsets) > 1 else 0
+
+
+def get_source(dataset, batch_size=None):
+    batch_size = batch_size or get_batch_size()
+    if dataset.has_rows:
+        return RowSource(dataset, batch_size)
+    return StoreSource(ColumnarStore(dataset.pk), batch_size)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that collects output until it is drained into the response."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema():
+    return pa.schema([
+        ('equipment_name', pa.string()),
+        ('equipment_type', pa.dictionary(pa.int32(), pa.string())),
+        *((field, pa.float64()) for field in NUMERIC_FIELDS),
+    ])
+
+
+def arrow_batches(source, schema):
+    for columns in source.batches():
+        # The dictionary only grows, so earlier codes stay valid
+        types = pa.array(source.types, pa.string())
+        yield pa.record_batch([
+            pa.array(columns['equipment_name'], pa.string()),
+            pa.DictionaryArray.from_arrays(pa.array(columns['equipment_type'], pa.int32()), types),
+            *(pa.array(columns[field], pa.float64()) for field in NUMERIC_FIELDS),
+        ], schema=schema)
+
+
+def stream_arrow(source):
+    sink = ChunkSink()
+    schema = arrow_schema()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in arrow_batches(source, schema):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(source):
+    sink = ChunkSink()
+    schema = arrow_schema()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in arrow_batches(source, schema):
+            # One row group per batch
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_npz(source):
+    """One ``.npy`` member per column, each filled in a pass over the records.
+
+    ``equipment_type`` holds codes into ``equipment_type_dictionary``.
+    """
+    sink = ChunkSink()
+    dtypes = {
+        'equipment_name': np.dtype(f'<U{max(source.max_name_length(), 1)}'),
+        'equipment_type': np.dtype('<i4'),
+        **{field: np.dtype('<f8') for field in NUMERIC_FIELDS},
+    }
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for field, dtype in dtypes.items():
+            with archive.open(f'{field}.npy', 'w', force_zip64=True) as member:
+                write_npy_header(member, dtype, source.count)
+                for columns in source.batches((field,)):
+                    member.write(np.asarray(columns[field], dtype=dtype).tobytes())
+                    yield sink.drain()
+        types = np.array(source.types, dtype=str)
+        with archive.open('equipment_type_dictionary.npy', 'w') as member:
+            write_npy_header(member, types.dtype, len(types))
+            member.write(types.tobytes())
+    yield sink.drain()
+
+
+def write_npy_header(stream, dtype, count):
+    np.lib.format.write_array_header_1_0(stream, {
+        'descr': np.lib.format.dtype_to_descr(dtype),
+        'fortran_order': False,
+        'shape': (count,),
+    })
+
+
+WRITERS = {
+    'arrow': stream_arrow,
+    'parquet': stream_parquet,
+    'npz': stream_npz,
+}
+
+
+def stream_export(dataset, export_format, batch_size=None):
+    """Return ``(chunks, content_type, extension)`` for ``dataset`` in ``export_format``."""
+    check_format(export_format)
+    content_type, extension, _ = FORMATS[export_format]
+    return WRITERS[export_format](get_source(dataset, batch_size)), content_type, extension
@@ -0,0 +1,322 @@
+import csv
+import gzip
+import copy
+import io
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import outliers
+from .columnar import ColumnarStore, ColumnarWriter
+from .database import insert_records
+from .metrics import inc, stage
+from .models import EquipmentData, EquipmentDataset
+from .stats import NUMERIC_FIELDS, SummaryStats
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover - pandas is optional at runtime
+    np = pd = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd uploads are optional
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_ENGINE = 'auto'
+DEFAULT_PANDAS_MIN_BYTES = 1024 * 1024
+
+CSV_COLUMNS = {
+    'equipment_name': 'Equipment Name',
+    'equipment_type': 'Equipment Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+TEXT_FIELDS = ('equipment_name', 'equipment_type')
+
+
+def get_batch_size():
+    return getattr(settings, 'INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+class CsvEngine:
+    """Pure-Python row-by-row parser; always available."""
+
+    name = 'csv'
+
+    def read_batches(self, stream, batch_size, stats):
+        names, types, flowrates, pressures, temperatures = [], [], [], [], []
+        csvfile = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+        for row in csv.DictReader(csvfile):
+            equipment_type = row.get('Equipment Type', '')
+            flowrate = float(row.get('Flowrate', 0))
+            pressure = float(row.get('Pressure', 0))
+            temperature = float(row.get('Temperature', 0))
+
+            names.append(row.get('Equipment Name', ''))
+            types.append(equipment_type)
+            flowrates.append(flowrate)
+            pressures.append(pressure)
+            temperatures.append(temperature)
+
+            if len(names) >= batch_size:
+                with stage('stats'):
+                    stats.update_rows(types, flowrates, pressures, temperatures)
+                yield names, types, flowrates, pressures, temperatures
+                names, types, flowrates, pressures, temperatures = [], [], [], [], []
+
+        if names:
+            with stage('stats'):
+                stats.update_rows(types, flowrates, pressures, temperatures)
+            yield names, types, flowrates, pressures, temperatures
+
+
+class PandasEngine:
+    """Columnar parser: typed ``read_csv`` chunks and vectorized reductions."""
+
+    name = 'pandas'
+
+    def read_batches(self, stream, batch_size, stats):
+        known_columns = set(CSV_COLUMNS.values())
+        try:
+            reader = pd.read_csv(
+                stream,
+                usecols=lambda column: column in known_columns,
+                dtype={
+                    column: (str if field in TEXT_FIELDS else 'float64')
+                    for field, column in CSV_COLUMNS.items()
+                },
+                encoding='utf-8',
+                na_filter=False,
+                chunksize=batch_size,
+            )
+        except pd.errors.EmptyDataError:
+            return
+
+        with reader:
+            for chunk in reader:
+                size = len(chunk)
+                columns = {}
+                for field, column in CSV_COLUMNS.items():
+                    if column in chunk.columns:
+                        columns[field] = chunk[column].to_numpy()
+                    elif field in TEXT_FIELDS:
+                        columns[field] = np.full(size, '', dtype=object)
+                    else:
+                        columns[field] = np.zeros(size)
+
+                with stage('stats'):
+                    type_codes, type_names = pd.factorize(columns['equipment_type'])
+                    stats.update_columns(type_codes, type_names.tolist(), columns)
+
+                yield (
+                    columns['equipment_name'].tolist(),
+                    columns['equipment_type'].tolist(),
+                    columns['flowrate'].tolist(),
+                    columns['pressure'].tolist(),
+                    columns['temperature'].tolist(),
+                )
+
+
+ENGINES = {
+    CsvEngine.name: CsvEngine(),
+    PandasEngine.name: PandasEngine(),
+}
+
+
+def detect_compression(head):
+    """Identify a compressed upload from its first bytes (not its file name)."""
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return None
+
+
+def open_decompressed(stream):
+    """Wrap a buffered binary ``stream`` so gzip/zstd content is inflated on the fly.
+
+    Nothing is written to disk; plain CSV is returned unchanged.
+    """
+    compression = detect_compression(stream.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)])
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd-compressed uploads require the zstandard package')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream, closefd=False))
+    return stream
+
+
+def get_engine(file_path, name=None, size=None):
+    """Pick the ingest engine for ``file_path``.
+
+    ``INGEST_ENGINE`` may force ``'csv'`` or ``'pandas'``; the default
+    ``'auto'`` uses pandas for files of at least ``INGEST_PANDAS_MIN_BYTES``
+    (``size`` stands in for the file's size while it is still being written).
+    The csv engine is used whenever pandas is not installed.
+    """
+    name = name or getattr(settings, 'INGEST_ENGINE', DEFAULT_ENGINE)
+    if name == 'auto':
+        threshold = getattr(settings, 'INGEST_PANDAS_MIN_BYTES', DEFAULT_PANDAS_MIN_BYTES)
+        if size is None:
+            size = os.path.getsize(file_path)
+        name = 'pandas' if size >= threshold else 'csv'
+    if name not in ENGINES:
+        raise ValueError(f'Unknown ingest engine: {name}')
+    if name == 'pandas' and pd is None:
+        name = 'csv'
+    return ENGINES[name]
+
+
+def rebuild_partials(dataset):
+    """Recompute and store the partials of a dataset ingested before they existed."""
+    stats = SummaryStats()
+    if dataset.has_rows:
+        records = EquipmentData.objects.filter(dataset=dataset).values_list(
+            'equipment_type', *NUMERIC_FIELDS
+        ).iterator(chunk_size=get_batch_size())
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= get_batch_size():
+                stats.update_rows(*map(list, zip(*batch)))
+                batch = []
+        if batch:
+            stats.update_rows(*map(list, zip(*batch)))
+    else:
+        store = ColumnarStore(dataset.pk)
+        stats.update_columns(store.type_codes, store.types, store.columns)
+    dataset.summary_partials = stats.to_partials()
+    dataset.save(update_fields=['summary_partials'])
+    return stats
+
+
+def dataset_stats(dataset):
+    """The :class:`SummaryStats` behind ``dataset``'s summary, rebuilt if missing."""
+    if not dataset.summary_partials:
+        return rebuild_partials(dataset)
+    return SummaryStats.from_partials(dataset.summary_partials)
+
+
+def refresh_outliers(dataset):
+    """Recompute ``dataset``'s outlier thresholds from all its records and re-flag them."""
+    with transaction.atomic():
+        dataset = EquipmentDataset.objects.select_for_update().get(pk=dataset.pk)
+        dataset.outlier_thresholds = outliers.flag_outliers(dataset, dataset_stats(dataset))
+        dataset.save(update_fields=['outlier_thresholds'])
+    return dataset
+
+
+def ingest_csv(dataset, file_path, batch_size=None, engine=None, progress=None, stream=None, size=None,
+               append=False):
+    """Stream ``file_path`` into ``dataset`` and return its summary.
+
+    Rows are parsed in batches, folded into running statistics and flushed
+    with ``bulk_create`` (``COPY`` on PostgreSQL) and/or appended to the dataset's column files
+    (depending on ``dataset.storage``), so memory use does not grow with the
+    size of the file. Callers are expected to wrap this in a transaction so a
+    failed ingest leaves no partial rows behind; partial column files are
+    removed here. A new dataset's column files are complete on return (its
+    outliers are flagged from them), so callers whose transaction rolls back
+    afterwards call :func:`~.columnar.discard_uncommitted` with ``created``.
+
+    ``progress``, if given, is called after every flushed batch with the
+    number of rows written so far and the number of bytes consumed.
+
+    ``stream`` replaces opening ``file_path`` (e.g. an upload that is still
+    arriving), with ``size`` its expected length. gzip and zstd files are
+    decompressed while they are read; progress then counts compressed bytes.
+
+    With ``append``, the rows are added to an already ingested dataset: its
+    column files are extended and the statistics resume from its stored
+    partials. The returned summary covers the whole dataset. The new columns
+    only become visible when the surrounding transaction commits; callers
+    hold :func:`~.columnar.dataset_lock` until then and call
+    :func:`~.columnar.discard_uncommitted` if it rolls back.
+
+    The mergeable statistics behind the summary are left (unsaved) in
+    ``dataset.summary_partials``. Unless ``OUTLIER_DETECTION`` is off, outlier
+    records are flagged and the thresholds left in
+    ``dataset.outlier_thresholds`` (see :mod:`equipment_api.outliers`): a new
+    dataset is flagged once all rows are written, while an append checks only
+    its own rows against the stored thresholds, so its cost depends on the new
+    rows alone. Appends to a dataset without thresholds clear them instead;
+    :func:`refresh_outliers` flags the whole dataset again.
+
+    Time spent parsing, updating statistics and writing rows and columns is
+    recorded as the ``parse``, ``stats``, ``insert``, ``columnar`` and ``outliers`` stages
+    (see :mod:`equipment_api.metrics`).
+    """
+    batch_size = batch_size or get_batch_size()
+    engine = get_engine(file_path, engine, size)
+    stats = dataset_stats(dataset) if append else SummaryStats()
+    writer = ColumnarWriter(dataset.pk, append=append) if dataset.has_columns else None
+    incremental = append and outliers.is_enabled() and bool(dataset.outlier_thresholds)
+    thresholds = copy.deepcopy(dataset.outlier_thresholds) if incremental else None
+    flagged = Counter()
+    rows = 0
+
+    try:
+        with stream or open(file_path, 'rb') as stream:
+            batches = engine.read_batches(open_decompressed(stream), batch_size, stats)
+            while True:
+                with stage('parse'):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                if dataset.has_rows:
+                    flags = None
+                    if incremental:
+                        with stage('outliers'):
+                            flags = outliers.flag_batch(thresholds, *batch[1:])
+                            flagged.update(equipment_type for equipment_type, flag in zip(batch[1], flags) if flag)
+                    with stage('insert'):
+                        insert_records(dataset, batch, flags)
+                if writer is not None:
+                    with stage('columnar'):
+                        writer.append(*batch)
+                rows += len(batch[0])
+                if progress is not None:
+                    progress(rows, stream.tell())
+
+        if not rows:
+            raise ValueError('CSV file is empty')
+        if incremental:
+            with stage('outliers'):
+                thresholds = outliers.flag_appended(dataset, stats, thresholds, flagged, writer)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is not None:
+        if append:
+            # Nothing is left buffered to land after a rollback has cut the files back
+            writer.flush()
+            transaction.on_commit(writer.close)
+        else:
+            writer.close()
+    inc('equipment_ingest_rows_total', rows, engine=engine.name)
+    if not append:
+        inc('equipment_ingest_datasets_total', engine=engine.name)
+    if incremental:
+        dataset.outlier_thresholds = thresholds
+    elif append:
+        # Flags no longer cover every record
+        dataset.outlier_thresholds = {}
+    elif outliers.is_enabled():
+        with stage('outliers'):
+            dataset.outlier_thresholds = outliers.flag_outliers(dataset, stats)
+    with stage('summary'):
+        dataset.summary_partials = stats.to_partials()
+        return stats.as_summary()
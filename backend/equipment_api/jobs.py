@@ -0,0 +1,237 @@
+import datetime
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .columnar import choose_storage
+from .metrics import recording, registry
+from .ingest import ingest_csv, refresh_outliers
+from .models import EquipmentDataset, IngestJob, UploadSession
+from .reports import get_report
+from .retention import prune_datasets
+from .uploads import open_upload_stream
+from .worker import init_worker, run_ingest_job, run_outlier_job, run_report_job, run_retention_job
+
+DEFAULT_EXECUTOR = 'process'
+DEFAULT_WORKERS = 2
+DEFAULT_STREAM_WORKERS = 2
+DEFAULT_REPORT_PRERENDER = True
+DEFAULT_RETENTION_AFTER_INGEST = True
+# After this long a queued outlier job is presumed lost and may be queued again
+OUTLIER_JOB_TIMEOUT = 600
+
+# Keyed by whether the pool runs streamed parses
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(streaming=False):
+    """Return a local worker pool, creating it on first use.
+
+    ``INGEST_JOB_EXECUTOR`` selects ``'process'`` (default), ``'thread'`` or
+    ``'inline'``; the latter runs jobs synchronously and returns ``None``.
+
+    Parses of chunked uploads that are still arriving (``streaming``) spend
+    most of their time waiting for chunks, so they get a pool of their own
+    (``INGEST_STREAM_WORKERS`` wide) and never hold up other jobs.
+    """
+    kind = getattr(settings, 'INGEST_JOB_EXECUTOR', DEFAULT_EXECUTOR)
+    if kind == 'inline':
+        return None
+
+    with _executor_lock:
+        if streaming not in _executors:
+            if streaming:
+                workers = getattr(settings, 'INGEST_STREAM_WORKERS', DEFAULT_STREAM_WORKERS)
+            else:
+                workers = getattr(settings, 'INGEST_JOB_WORKERS', DEFAULT_WORKERS)
+            if kind == 'process':
+                _executors[streaming] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_worker,
+                )
+            elif kind == 'thread':
+                _executors[streaming] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='stream' if streaming else 'ingest'
+                )
+            else:
+                raise ValueError(f'Unknown INGEST_JOB_EXECUTOR: {kind}')
+        return _executors[streaming]
+
+
+def can_stream_ingest():
+    """Whether a job may be started before its upload has finished arriving.
+
+    An inline job would block the request that starts it while waiting for
+    chunks that can only arrive in later requests.
+    """
+    return getattr(settings, 'INGEST_JOB_EXECUTOR', DEFAULT_EXECUTOR) != 'inline'
+
+
+def submit_ingest_job(job, streaming=False):
+    """Queue ``job`` once the surrounding transaction has committed.
+
+    ``streaming`` jobs parse an upload whose chunks are still arriving.
+    """
+    def submit():
+        executor = get_executor(streaming)
+        if executor is None:
+            process_ingest_job(job.pk)
+        else:
+            executor.submit(run_ingest_job, job.pk).add_done_callback(merge_worker_metrics)
+
+    transaction.on_commit(submit)
+
+
+def merge_worker_metrics(future):
+    # Worker processes hand back what they recorded (None from threads)
+    if not future.cancelled() and future.exception() is None and future.result():
+        registry.merge(future.result())
+
+
+def submit_report_render(dataset):
+    """Pre-render ``dataset``'s PDF report in the background after commit."""
+    if not getattr(settings, 'REPORT_PRERENDER', DEFAULT_REPORT_PRERENDER):
+        return
+
+    def submit():
+        executor = get_executor()
+        if executor is None:
+            get_report(dataset)
+        else:
+            executor.submit(run_report_job, dataset.pk)
+
+    transaction.on_commit(submit)
+
+
+def submit_retention():
+    """Apply the retention policy in the background after commit."""
+    if not getattr(settings, 'RETENTION_AFTER_INGEST', DEFAULT_RETENTION_AFTER_INGEST):
+        return
+
+    def submit():
+        executor = get_executor()
+        if executor is None:
+            prune_datasets()
+        else:
+            executor.submit(run_retention_job)
+
+    transaction.on_commit(submit)
+
+
+def submit_outlier_flagging(dataset):
+    """Flag ``dataset``'s outliers in the background after commit, once per dataset at a time.
+
+    The job is claimed by setting ``outliers_queued_at`` with a conditional
+    UPDATE, which every process sees and which rolls back with the
+    surrounding transaction; the job clears it when it ends.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=OUTLIER_JOB_TIMEOUT)
+    claimed = EquipmentDataset.objects.filter(
+        Q(outliers_queued_at__isnull=True) | Q(outliers_queued_at__lt=stale), pk=dataset.pk
+    ).update(outliers_queued_at=now)
+    if not claimed:
+        return
+
+    def submit():
+        executor = get_executor()
+        if executor is None:
+            run_outlier_flagging(dataset.pk)
+            return
+        try:
+            future = executor.submit(run_outlier_job, dataset.pk)
+        except Exception:
+            release_outlier_job(dataset.pk)
+            raise
+        future.add_done_callback(lambda future: release_outlier_job(dataset.pk, future))
+
+    transaction.on_commit(submit)
+
+
+def release_outlier_job(dataset_id, future=None):
+    # The job releases its own claim unless it never ran to the end (e.g. a crashed worker)
+    if future is None or future.cancelled() or future.exception() is not None:
+        EquipmentDataset.objects.filter(pk=dataset_id).update(outliers_queued_at=None)
+
+
+def run_outlier_flagging(dataset_id):
+    try:
+        dataset = EquipmentDataset.objects.filter(pk=dataset_id).first()
+        if dataset is not None:
+            refresh_outliers(dataset)
+    finally:
+        release_outlier_job(dataset_id)
+
+
+def process_ingest_job(job_id):
+    """Ingest the file behind an :class:`IngestJob`, recording progress.
+
+    Batches are committed as they are written so that progress is visible to
+    the polling API; the dataset stays hidden (``is_complete=False``) until the
+    summary is stored, and is removed again if the ingest fails. A job whose
+    chunked upload is still open parses the chunks as they are acknowledged;
+    its stream only ends once the upload is completed, so a file whose hash
+    does not match is never marked complete or counted by retention.
+    """
+    with recording('ingest_job'):
+        _process_ingest_job(job_id)
+
+
+def _process_ingest_job(job_id):
+    job = IngestJob.objects.get(pk=job_id)
+    job.status = IngestJob.STATUS_RUNNING
+    job.stage = IngestJob.STAGE_PARSING
+    job.save(update_fields=['status', 'stage', 'updated_at'])
+
+    dataset = EquipmentDataset.objects.create(
+        name=job.file_name,
+        file_path=job.file_path,
+        content_hash=job.content_hash,
+        summary_data={},
+        is_complete=False,
+        storage=choose_storage(job.file_path, job.total_bytes or None)
+    )
+    IngestJob.objects.filter(pk=job.pk).update(dataset=dataset)
+    upload = job.uploads.filter(status=UploadSession.STATUS_OPEN).first()
+
+    def progress(rows, bytes_read):
+        IngestJob.objects.filter(pk=job.pk).update(rows_processed=rows, bytes_processed=bytes_read)
+
+    try:
+        stream = open_upload_stream(upload) if upload is not None else None
+        summary = ingest_csv(dataset, job.file_path, progress=progress, stream=stream, size=job.total_bytes or None)
+        
+        IngestJob.objects.filter(pk=job.pk).update(stage=IngestJob.STAGE_FINALIZING)
+        job.refresh_from_db()
+        dataset.summary_data = summary
+        dataset.is_complete = True
+        # A streamed upload may only have been hashed once its last chunk landed
+        dataset.content_hash = dataset.content_hash or job.content_hash
+        dataset.save(update_fields=['summary_data', 'summary_partials', 'outlier_thresholds', 'is_complete',
+                                    'content_hash'])
+        
+        job.status = IngestJob.STATUS_COMPLETED
+        job.stage = IngestJob.STAGE_DONE
+        job.rows_processed = summary['total_count']
+        job.bytes_processed = job.total_bytes
+        job.save()
+
+        # Already off the request path, so render the report right here
+        if getattr(settings, 'REPORT_PRERENDER', DEFAULT_REPORT_PRERENDER):
+            get_report(dataset)
+        if getattr(settings, 'RETENTION_AFTER_INGEST', DEFAULT_RETENTION_AFTER_INGEST):
+            prune_datasets()
+    except Exception as e:
+        dataset.delete()
+        job.refresh_from_db()
+        job.status = IngestJob.STATUS_FAILED
+        # complete() may already have recorded why the upload was rejected
+        job.error = job.error or str(e)
+        job.save()
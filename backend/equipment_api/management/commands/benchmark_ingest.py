@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from equipment_api.ingest import ENGINES, get_batch_size, get_engine, ingest_csv
+from equipment_api.models import EquipmentDataset
+from equipment_api.stats import SummaryStats
+from equipment_api.synthetic import write_equipment_csv
+
+
+class Command(BaseCommand):
+    help = 'Compare ingest engine throughput on a synthetic equipment CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--engines', default=','.join(ENGINES))
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--with-db', action='store_true',
+            help='Also time bulk_create (inside a transaction that is rolled back).',
+        )
+
+    def handle(self, *args, **options):
+        engines = [name.strip() for name in options['engines'].split(',') if name.strip()]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f'Unknown engine(s): {", ".join(sorted(unknown))}')
+        batch_size = options['batch_size'] or get_batch_size()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'benchmark.csv')
+            write_equipment_csv(path, options['rows'])
+            self.stdout.write(
+                f'{options["rows"]:,} rows, {os.path.getsize(path) / 1e6:.1f} MB, batch size {batch_size}'
+            )
+
+            results = {}
+            for name in engines:
+                engine = get_engine(path, name)
+                if engine.name != name:
+                    self.stdout.write(self.style.WARNING(f'{name}: unavailable, skipped'))
+                    continue
+                started = time.perf_counter()
+                if options['with_db']:
+                    self._ingest_and_rollback(path, batch_size, name)
+                else:
+                    with open(path, 'rb') as stream:
+                        for _ in engine.read_batches(stream, batch_size, SummaryStats()):
+                            pass
+                elapsed = time.perf_counter() - started
+                results[name] = elapsed
+                self.stdout.write(f'{name:>8}: {elapsed:8.2f} s  {options["rows"] / elapsed:12,.0f} rows/s')
+
+        if 'csv' in results and len(results) > 1:
+            for name, elapsed in results.items():
+                if name != 'csv':
+                    self.stdout.write(self.style.SUCCESS(f'{name} speedup over csv: {results["csv"] / elapsed:.1f}x'))
+
+    def _ingest_and_rollback(self, path, batch_size, engine):
+        with transaction.atomic():
+            dataset = EquipmentDataset.objects.create(name='benchmark', file_path=path)
+            ingest_csv(dataset, path, batch_size=batch_size, engine=engine)
+            transaction.set_rollback(True)
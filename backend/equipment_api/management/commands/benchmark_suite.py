@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from equipment_api.benchmarks import ENDPOINTS, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark ingest and the dataset API on synthetic CSVs against a throwaway database, '
+        'optionally comparing the results with a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', default='1000,100000',
+            help='Comma-separated dataset sizes to benchmark (1k to 10M rows).',
+        )
+        parser.add_argument('--type-cardinality', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Warm requests per endpoint.')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument(
+            '--data-dir',
+            help='Keep generated CSVs here and reuse them on later runs (default: a temporary directory).',
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare against results saved by an earlier run.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            row_counts = [int(value) for value in options['rows'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--rows must be a comma-separated list of integers')
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            data_dir = options['data_dir'] or workdir
+            os.makedirs(data_dir, exist_ok=True)
+            results = self._run_isolated(workdir, row_counts, data_dir, options, endpoints)
+
+        for rows, scenario in results['results'].items():
+            self.stdout.write(f'{int(rows):,} rows ({scenario["file_bytes"] / 1e6:.1f} MB)')
+            if 'create' in scenario:
+                create = scenario['create']
+                self.stdout.write(
+                    f'  {"create":<16}{create["seconds"]:9.3f} s {create["rows_per_second"]:12,.0f} rows/s'
+                    f' {create["queries"]:6} queries'
+                )
+            for endpoint in ENDPOINTS[1:]:
+                if endpoint in scenario:
+                    cold = scenario[endpoint]['cold']
+                    warm = scenario[endpoint].get('warm', cold)
+                    self.stdout.write(
+                        f'  {endpoint:<16}{cold["seconds"] * 1000:9.1f} ms cold {warm["seconds"] * 1000:9.1f} ms warm'
+                        f' {cold["queries"]:6} queries'
+                    )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            for metric, old, new, change in regressions:
+                self.stdout.write(self.style.WARNING(f'{metric}: {old:.4g} -> {new:.4g} ({change:+.0%} worse)'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} metric(s) regressed')
+
+    def _run_isolated(self, workdir, row_counts, data_dir, options, endpoints):
+        """Run the suite on a freshly created test database and MEDIA_ROOT."""
+        if connection.vendor == 'sqlite':
+            # Benchmark an on-disk database like the real one, not the in-memory test default
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(workdir, 'media'),
+                INGEST_JOB_EXECUTOR='inline',
+                REPORT_PRERENDER=False,
+                RETENTION_AFTER_INGEST=False,
+            ):
+                return run_suite(
+                    row_counts, data_dir, options['type_cardinality'], options['seed'],
+                    options['repeat'], endpoints,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
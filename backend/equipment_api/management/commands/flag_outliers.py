@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from equipment_api.ingest import refresh_outliers
+from equipment_api.models import EquipmentDataset
+
+
+class Command(BaseCommand):
+    help = 'Recompute outlier thresholds from all records of each dataset and re-flag its outliers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', type=int, action='append', dest='datasets',
+                            help='Only this dataset (may be repeated).')
+        parser.add_argument('--missing', action='store_true', help='Only datasets without thresholds.')
+
+    def handle(self, *args, **options):
+        datasets = EquipmentDataset.objects.filter(is_complete=True).order_by('pk')
+        if options['datasets']:
+            datasets = datasets.filter(pk__in=options['datasets'])
+        if options['missing']:
+            datasets = datasets.filter(outlier_thresholds={})
+
+        flagged = 0
+        for dataset in datasets.defer('summary_data'):
+            thresholds = refresh_outliers(dataset).outlier_thresholds
+            flagged += 1
+            outliers = sum(threshold['outliers'] for threshold in thresholds.values())
+            self.stdout.write(f'Dataset {dataset.pk}: {outliers} outlier(s).')
+        self.stdout.write(f'Flagged {flagged} dataset(s).')
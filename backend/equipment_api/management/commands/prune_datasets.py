@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from equipment_api.retention import get_policy, prune_datasets, remove_orphan_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete datasets outside the DATASET_RETENTION policy and orphaned upload files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-count', type=int)
+        parser.add_argument('--max-age-days', type=float)
+        parser.add_argument('--max-rows', type=int)
+        parser.add_argument('--max-bytes', type=int)
+        parser.add_argument('--orphan-grace-seconds', type=int)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed.')
+
+    def handle(self, *args, **options):
+        policy = get_policy()
+        for key in ('max_count', 'max_age_days', 'max_rows', 'max_bytes'):
+            if options[key] is not None:
+                policy[key] = options[key]
+
+        dry_run = options['dry_run']
+        verb = 'Would remove' if dry_run else 'Removed'
+        pruned = prune_datasets(policy, dry_run=dry_run)
+        orphans = remove_orphan_uploads(options['orphan_grace_seconds'], dry_run=dry_run)
+        self.stdout.write(f'{verb} {len(pruned)} dataset(s) and {len(orphans)} orphaned upload file(s).')
@@ -0,0 +1,240 @@
+"""Lightweight request and ingest instrumentation.
+
+With ``METRICS_ENABLED`` on, ``MetricsMiddleware`` records every request's
+latency and SQL queries, code wrapped in ``stage(name)`` adds its time to the
+request (or ingest job) it runs in, and each response gets a
+``Server-Timing`` header listing the stages. Totals accumulate in an
+in-process registry that ``/api/metrics`` exposes in the Prometheus text
+format; ingest jobs run by worker processes send theirs back with the job
+result. When disabled, ``stage()`` costs one context variable lookup,
+``inc()`` one settings lookup, and the middleware passes requests straight
+through.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS = {
+    'equipment_http_requests_total': ('counter', 'HTTP requests handled.'),
+    'equipment_http_request_duration_seconds': ('histogram', 'HTTP request latency.'),
+    'equipment_stage_duration_seconds': ('histogram', 'Time spent per stage of a request or ingest job.'),
+    'equipment_db_queries_total': ('counter', 'SQL queries executed.'),
+    'equipment_db_query_duration_seconds_total': ('counter', 'Time spent executing SQL queries.'),
+    'equipment_ingest_rows_total': ('counter', 'Rows ingested from uploaded CSV files.'),
+    'equipment_ingest_datasets_total': ('counter', 'Datasets ingested.'),
+}
+
+_current = ContextVar('equipment_api_timings', default=None)
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class Registry:
+    """Thread-safe counters and histograms keyed by metric name and labels."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket plus +Inf, then the sum
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def drain(self):
+        """Return everything recorded so far and start again from zero."""
+        with self.lock:
+            snapshot = {'counters': self.counters, 'histograms': self.histograms}
+            self.counters, self.histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a ``drain()`` snapshot taken in another process."""
+        with self.lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in snapshot['histograms'].items():
+                current = self.histograms.get(key)
+                self.histograms[key] = values[:] if current is None else [a + b for a, b in zip(current, values)]
+
+    def render(self):
+        """Format every metric in the Prometheus text exposition format."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: values[:] for key, values in self.histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = sorted((labels, value) for (metric, labels), value in
+                            (counters if kind == 'counter' else histograms).items() if metric == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+registry = Registry()
+
+
+def inc(name, value=1, **labels):
+    if is_enabled():
+        registry.inc(name, tuple(sorted(labels.items())), value)
+
+
+class Timings:
+    """Stage durations and SQL queries of one request or ingest job."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.stages = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        # Time spent in nested stages, so each stage reports only its own time
+        self.nested = []
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+    def server_timing(self, total):
+        entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        entries.append(f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+    def observe(self):
+        handler = self.handler
+        for name, seconds in self.stages.items():
+            registry.observe('equipment_stage_duration_seconds', (('handler', handler), ('stage', name)), seconds)
+        registry.inc('equipment_db_queries_total', (('handler', handler),), self.queries)
+        registry.inc('equipment_db_query_duration_seconds_total', (('handler', handler),), self.query_seconds)
+
+
+class _Stage:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.timings.nested.append(0.0)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        nested = self.timings.nested
+        self.timings.add(self.name, elapsed - nested.pop())
+        if nested:
+            nested[-1] += elapsed
+
+
+_NO_STAGE = nullcontext()
+
+
+def stage(name):
+    """Context manager adding the enclosed time to stage ``name`` of the current recording.
+
+    Entering the same stage repeatedly (e.g. once per batch) accumulates;
+    time spent in stages nested inside it is counted only for those.
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NO_STAGE
+    return _Stage(timings, name)
+
+
+@contextmanager
+def recording(handler):
+    """Record stages and queries of the enclosed block under ``handler``.
+
+    Yields the :class:`Timings` (whose ``handler`` may still be changed), or
+    ``None`` when metrics are disabled.
+    """
+    if not is_enabled():
+        yield None
+        return
+    timings = Timings(handler)
+    token = _current.set(timings)
+    try:
+        with connection.execute_wrapper(timings.query_wrapper):
+            yield timings
+    finally:
+        _current.reset(token)
+        timings.observe()
+
+
+class MetricsMiddleware:
+    """Time each request and attach its stages as a ``Server-Timing`` header."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_enabled():
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with recording('unmatched') as timings:
+            response = self.get_response(request)
+            # Known only once URL resolution has run; view names keep label values bounded
+            match = getattr(request, 'resolver_match', None)
+            if match is not None:
+                timings.handler = match.view_name
+        elapsed = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.server_timing(elapsed)
+        labels = (('handler', timings.handler), ('method', request.method))
+        registry.inc('equipment_http_requests_total', labels + (('status', str(response.status_code)),))
+        registry.observe('equipment_http_request_duration_seconds', labels, elapsed)
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0002_ingest_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="storage",
+            field=models.CharField(
+                choices=[
+                    ("rows", "Database rows"),
+                    ("columnar", "Columnar files"),
+                    ("both", "Database rows and columnar files"),
+                ],
+                default="rows",
+                max_length=10,
+            ),
+        ),
+    ]
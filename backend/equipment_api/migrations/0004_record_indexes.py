@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0003_dataset_storage"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="equipmentdata",
+            options={},
+        ),
+        migrations.AlterField(
+            model_name="equipmentdata",
+            name="dataset",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="records",
+                to="equipment_api.equipmentdataset",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipmentdata",
+            index=models.Index(
+                fields=["dataset", "equipment_type"], name="equipment_dataset_type_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipmentdata",
+            index=models.Index(
+                fields=["dataset", "flowrate"], name="equipment_dataset_flow_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipmentdata",
+            index=models.Index(
+                fields=["dataset", "pressure"], name="equipment_dataset_press_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipmentdata",
+            index=models.Index(
+                fields=["dataset", "temperature"], name="equipment_dataset_temp_idx"
+            ),
+        ),
+    ]
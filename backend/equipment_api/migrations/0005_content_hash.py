@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0004_record_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="content_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="ingestjob",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
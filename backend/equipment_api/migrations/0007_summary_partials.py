@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0006_upload_sessions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="summary_partials",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
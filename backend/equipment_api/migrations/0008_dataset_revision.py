@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0007_summary_partials"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="revision",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0008_dataset_revision"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdata",
+            name="is_outlier",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="outlier_thresholds",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name="equipmentdata",
+            index=models.Index(
+                condition=models.Q(("is_outlier", True)),
+                fields=["dataset", "id"],
+                name="equipment_dataset_outlier_idx",
+            ),
+        ),
+    ]
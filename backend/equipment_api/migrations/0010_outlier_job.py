@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("equipment_api", "0009_outliers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipmentdataset",
+            name="outliers_queued_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,26 +1,142 @@
 from django.db import models
+from django.db.models import Q
 import uuid
 
+STORAGE_ROWS = 'rows'
+STORAGE_COLUMNAR = 'columnar'
+STORAGE_BOTH = 'both'
+STORAGE_CHOICES = [
+    (STORAGE_ROWS, 'Database rows'),
+    (STORAGE_COLUMNAR, 'Columnar files'),
+    (STORAGE_BOTH, 'Database rows and columnar files'),
+]
+
 class EquipmentDataset(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     upload_date = models.DateTimeField(auto_now_add=True)
     file_path = models.CharField(max_length=500)
     summary_data = models.JSONField(default=dict)
+    # SummaryStats.to_partials(): mergeable state behind summary_data
+    summary_partials = models.JSONField(default=dict, blank=True)
+    # False while an asynchronous ingest job is still writing records
+    is_complete = models.BooleanField(default=True)
+    # SHA-256 of the uploaded file, used to skip re-ingesting identical uploads
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Where the records live: EquipmentData rows, columnar files, or both
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default=STORAGE_ROWS)
+    # Bumped by every append; part of the version behind ETags, caches and reports
+    revision = models.PositiveIntegerField(default=0)
+    # outliers.flag_outliers(): per-type normal ranges and outlier counts
+    outlier_thresholds = models.JSONField(default=dict, blank=True)
+    # Set while a background job recomputes the outlier thresholds (jobs.submit_outlier_flagging)
+    outliers_queued_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-upload_date']
     
     def __str__(self):
         return f"{self.name} - {self.upload_date.date()}"
+    
+    @property
+    def has_rows(self):
+        return self.storage != STORAGE_COLUMNAR
+    
+    @property
+    def has_columns(self):
+        return self.storage != STORAGE_ROWS
 
 class EquipmentData(models.Model):
-    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.CASCADE, related_name='records')
+    # Covered by the composite indexes below, which all lead with dataset
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.CASCADE, related_name='records', db_index=False)
     equipment_name = models.CharField(max_length=255)
     equipment_type = models.CharField(max_length=100)
     flowrate = models.FloatField()
     pressure = models.FloatField()
     temperature = models.FloatField()
+    # A reading outside its type's range in dataset.outlier_thresholds
+    is_outlier = models.BooleanField(default=False)
     
     class Meta:
-        ordering = ['equipment_name']
\ No newline at end of file
+        indexes = [
+            models.Index(fields=['dataset', 'equipment_type'], name='equipment_dataset_type_idx'),
+            models.Index(fields=['dataset', 'flowrate'], name='equipment_dataset_flow_idx'),
+            models.Index(fields=['dataset', 'pressure'], name='equipment_dataset_press_idx'),
+            models.Index(fields=['dataset', 'temperature'], name='equipment_dataset_temp_idx'),
+            # Partial: holds only the outliers, in the default (id) ordering
+            models.Index(fields=['dataset', 'id'], condition=Q(is_outlier=True), name='equipment_dataset_outlier_idx'),
+        ]
+
+class IngestJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    STAGE_QUEUED = 'queued'
+    STAGE_PARSING = 'parsing'
+    STAGE_FINALIZING = 'finalizing'
+    STAGE_DONE = 'done'
+    STAGE_CHOICES = [
+        (STAGE_QUEUED, 'Queued'),
+        (STAGE_PARSING, 'Parsing and storing records'),
+        (STAGE_FINALIZING, 'Finalizing summary'),
+        (STAGE_DONE, 'Done'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    content_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default=STAGE_QUEUED)
+    rows_processed = models.BigIntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.file_name} - {self.status}"
+
+
+class UploadSession(models.Model):
+    """A chunked upload: the file is written piece by piece at given offsets."""
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_ABORTED = 'aborted'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Receiving chunks'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_ABORTED, 'Aborted'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    total_bytes = models.BigIntegerField()
+    # Everything before this offset has been written and matched its chunk's checksum
+    received_bytes = models.BigIntegerField(default=0)
+    # SHA-256 announced by the client, replaced by the computed one on completion
+    content_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    job = models.ForeignKey(IngestJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.file_name} - {self.received_bytes}/{self.total_bytes}"
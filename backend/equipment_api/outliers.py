@@ -0,0 +1,214 @@
+"""Per-type outlier thresholds and the precomputed outlier index.
+
+Once a dataset's records are written, every equipment type gets a normal
+range per numeric field, derived from the type's summary statistics:
+
+* ``iqr`` - ``Q1 - k * IQR`` to ``Q3 + k * IQR`` (quartiles from the KLL
+  sketch, so approximate for large types); ``k`` defaults to 1.5
+* ``zscore`` - within ``k`` standard deviations of the mean; ``k`` defaults to 3
+
+Types whose sketch was not kept (see :class:`~.stats.SummaryStats`) fall
+back to ``zscore`` with its default ``k`` when thresholds are recomputed.
+
+``OUTLIER_THRESHOLDS`` picks the method and ``k`` per type (``'*'`` applies
+to all types) and may fix a field's range outright with
+``'limits': {field: [low, high]}`` (either end may be ``None``). A record is
+an outlier when any reading falls outside its type's range. Rows are flagged
+with one set-based UPDATE per type (``EquipmentData.is_outlier``, covered by
+a partial index); column stores get an array of outlier positions computed
+with vectorized comparisons. Listing outliers then costs time proportional
+to their number.
+
+Appends keep the stored thresholds: only the new records are checked (rows
+as they are inserted, columns over the appended range), and types new to
+the dataset get thresholds of their own. ``manage.py flag_outliers``
+recomputes the thresholds from the whole dataset and re-flags every record;
+datasets ingested with ``OUTLIER_DETECTION`` off are flagged by a background
+job on their first outliers request.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional at runtime
+    np = None
+
+from .columnar import ColumnarStore, write_outlier_positions
+from .models import EquipmentData
+from .stats import NUMERIC_FIELDS
+
+DEFAULT_K = {'iqr': 1.5, 'zscore': 3.0}
+DEFAULT_CONFIG = {'method': 'iqr', 'k': None, 'limits': {}}
+
+
+def is_enabled():
+    return getattr(settings, 'OUTLIER_DETECTION', True)
+
+
+def type_config(equipment_type):
+    configured = getattr(settings, 'OUTLIER_THRESHOLDS', {})
+    config = {**DEFAULT_CONFIG, **configured.get('*', {}), **configured.get(equipment_type, {})}
+    if config['method'] not in DEFAULT_K:
+        raise ValueError(f'Unknown outlier method for {equipment_type!r}: {config["method"]}')
+    if config['k'] is None:
+        config['k'] = DEFAULT_K[config['method']]
+    return config
+
+
+def field_range(field_stats, method, k):
+    if method == 'iqr':
+        q1, q3 = field_stats.sketch.quantiles([0.25, 0.75])
+        spread = q3 - q1
+        return q1 - k * spread, q3 + k * spread
+    std = math.sqrt(field_stats.variance)
+    return field_stats.mean - k * std, field_stats.mean + k * std
+
+
+def compute_thresholds(stats, types=None):
+    """``{type: {'method', 'k', 'fields': {field: {'low', 'high'}}}}`` from a :class:`~.stats.SummaryStats`.
+
+    ``types`` limits the result to those equipment types.
+    """
+    thresholds = {}
+    for equipment_type in stats.by_type if types is None else types:
+        type_fields = stats.by_type[equipment_type]
+        config = type_config(equipment_type)
+        if config['method'] == 'iqr' and any(type_fields[field].sketch is None for field in NUMERIC_FIELDS):
+            config.update(method='zscore', k=DEFAULT_K['zscore'])
+        fields = {}
+        for field in NUMERIC_FIELDS:
+            if field in config['limits']:
+                low, high = config['limits'][field]
+            else:
+                low, high = field_range(type_fields[field], config['method'], config['k'])
+            fields[field] = {'low': low, 'high': high}
+        thresholds[equipment_type] = {'method': config['method'], 'k': config['k'], 'fields': fields}
+    return thresholds
+
+
+def out_of_range(fields):
+    condition = Q()
+    for field, bounds in fields.items():
+        if bounds['low'] is not None:
+            condition |= Q(**{f'{field}__lt': bounds['low']})
+        if bounds['high'] is not None:
+            condition |= Q(**{f'{field}__gt': bounds['high']})
+    return condition
+
+
+def flag_rows(dataset, thresholds):
+    """Set ``is_outlier`` on the dataset's rows; returns the count per type."""
+    records = EquipmentData.objects.filter(dataset=dataset)
+    # Clears flags left by an earlier revision; only reads flagged rows
+    records.filter(is_outlier=True).update(is_outlier=False)
+    counts = {}
+    for equipment_type, threshold in thresholds.items():
+        condition = out_of_range(threshold['fields'])
+        if not condition:
+            counts[equipment_type] = 0
+            continue
+        counts[equipment_type] = records.filter(condition, equipment_type=equipment_type).update(is_outlier=True)
+    return counts
+
+
+def type_bounds(thresholds, equipment_type):
+    """``(low, high)`` per numeric field, open ends as infinities; ``None`` for unknown types."""
+    threshold = thresholds.get(equipment_type)
+    if threshold is None:
+        return None
+    return [
+        (-math.inf if bounds['low'] is None else bounds['low'], math.inf if bounds['high'] is None else bounds['high'])
+        for bounds in (threshold['fields'][field] for field in NUMERIC_FIELDS)
+    ]
+
+
+def flag_batch(thresholds, types, *values):
+    """``is_outlier`` for each row of a parsed batch; rows of unknown types are not flagged."""
+    lookup = {}
+    flags = []
+    for equipment_type, *readings in zip(types, *values):
+        if equipment_type not in lookup:
+            lookup[equipment_type] = type_bounds(thresholds, equipment_type)
+        bounds = lookup[equipment_type]
+        flags.append(bounds is not None and any(
+            value < low or value > high for value, (low, high) in zip(readings, bounds)
+        ))
+    return flags
+
+
+def outlier_counts(type_codes, type_names, columns, thresholds):
+    """Positions of the outliers among the given records, and their count per type.
+
+    Types missing from ``thresholds`` are not flagged.
+    """
+    outlier = np.zeros(len(type_codes), dtype=bool)
+    bounds = [type_bounds(thresholds, equipment_type) or [(-np.inf, np.inf)] * len(NUMERIC_FIELDS)
+              for equipment_type in type_names]
+    for index, field in enumerate(NUMERIC_FIELDS):
+        # Each row's bounds, looked up through its type code
+        low = np.array([limits[index][0] for limits in bounds], dtype=np.float64)
+        high = np.array([limits[index][1] for limits in bounds], dtype=np.float64)
+        values = columns[field]
+        outlier |= (values < low[type_codes]) | (values > high[type_codes])
+    positions = np.flatnonzero(outlier)
+    counts = np.bincount(type_codes[positions], minlength=len(type_names))
+    return positions, {equipment_type: int(count) for equipment_type, count in zip(type_names, counts) if count}
+
+
+def flag_columns(dataset, thresholds):
+    """Store the positions of the dataset's outlier records; returns the count per type."""
+    store = ColumnarStore(dataset.pk)
+    positions, counts = outlier_counts(store.type_codes, store.types, store.columns, thresholds)
+    write_outlier_positions(dataset.pk, positions)
+    return counts
+
+
+def flag_appended(dataset, stats, thresholds, flagged, writer=None):
+    """Extend ``dataset``'s stored ``thresholds`` to the records just appended.
+
+    ``flagged`` counts, per type, the rows already flagged while they were
+    inserted; column stores are checked here over the range ``writer``
+    added, and the positions left for ``writer.close()``. Types new to the
+    dataset get thresholds from ``stats`` and are flagged among the new
+    records only. Returns the updated thresholds.
+    """
+    thresholds = {equipment_type: dict(threshold) for equipment_type, threshold in thresholds.items()}
+    new_types = [equipment_type for equipment_type in stats.by_type if equipment_type not in thresholds]
+    thresholds.update(compute_thresholds(stats, new_types))
+    if dataset.has_rows:
+        counts = Counter(flagged)
+        records = EquipmentData.objects.filter(dataset=dataset)
+        for equipment_type in new_types:
+            # The type's rows are all among the new ones
+            condition = out_of_range(thresholds[equipment_type]['fields'])
+            if condition:
+                counts[equipment_type] += records.filter(condition, equipment_type=equipment_type).update(
+                    is_outlier=True
+                )
+    else:
+        type_codes, type_names, columns = writer.appended_columns()
+        positions, counts = outlier_counts(type_codes, type_names, columns, thresholds)
+        writer.outlier_positions = positions + writer.start
+    for equipment_type, threshold in thresholds.items():
+        threshold['outliers'] = threshold.get('outliers', 0) + counts.get(equipment_type, 0)
+    return thresholds
+
+
+def flag_outliers(dataset, stats):
+    """Compute thresholds from ``stats`` and flag all of ``dataset``'s outlier records.
+
+    Returns the thresholds with each type's outlier count, as stored in
+    ``EquipmentDataset.outlier_thresholds``.
+    """
+    thresholds = compute_thresholds(stats)
+    if dataset.has_rows:
+        counts = flag_rows(dataset, thresholds)
+    else:
+        counts = flag_columns(dataset, thresholds)
+    for equipment_type, threshold in thresholds.items():
+        threshold['outliers'] = counts.get(equipment_type, 0)
+    return thresholds
@@ -0,0 +1,135 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional at runtime
+    np = None
+
+from .serializers import EquipmentDataSerializer, columnar_payload
+
+
+class RecordCursorPagination(CursorPagination):
+    """Cursor pagination for a dataset's records with ``?ordering=`` support.
+
+    Any record field may be used for ordering (prefix with ``-`` for
+    descending); ``id`` is always appended as a tie-breaker so pages stay
+    stable when many rows share a value.
+    """
+
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+    ordering = 'id'
+    ordering_fields = tuple(EquipmentDataSerializer.Meta.fields) + ('id',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering')
+        if not ordering:
+            return (self.ordering,)
+
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            raise ValidationError({'ordering': f'Cannot order by {field!r}.'})
+        if field == 'id':
+            return (ordering,)
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
+
+class ColumnarRecordPagination:
+    """Paginate records straight out of a :class:`~.columnar.ColumnarStore`.
+
+    Mirrors :class:`RecordCursorPagination` (same query parameters and
+    ``next``/``previous``/``results`` envelope) for datasets whose records are
+    not stored as ``EquipmentData`` rows. The cursor is an opaque row offset
+    into the requested ordering. ``positions`` restricts the records to those
+    row positions (ascending) without touching the others, and ``stride`` to
+    every ``stride``-th row position.
+    """
+
+    page_size = RecordCursorPagination.page_size
+    page_size_query_param = RecordCursorPagination.page_size_query_param
+    max_page_size = RecordCursorPagination.max_page_size
+    cursor_query_param = 'cursor'
+
+    def paginate(self, store, request, fields, mask=None, columnar=False, positions=None, stride=1):
+        order = self.get_order(store, request.query_params.get('ordering'), positions)
+        if mask is not None:
+            order = order[mask[order]]
+        if stride > 1:
+            order = order[order % stride == 0]
+        total = len(order)
+        page_size = self.get_page_size(request)
+        offset = self.decode_cursor(request)
+
+        indexes = order[offset:offset + page_size]
+        url = request.build_absolute_uri()
+        next_url = previous_url = None
+        if offset + page_size < total:
+            next_url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(offset + page_size))
+        if offset > 0:
+            previous_url = replace_query_param(
+                url, self.cursor_query_param, self.encode_cursor(max(offset - page_size, 0))
+            )
+
+        if columnar:
+            dictionaries = {'equipment_type': store.types} if 'equipment_type' in fields else None
+            results = columnar_payload(store.column_values(indexes, fields, encode_types=True), len(indexes), dictionaries)
+        else:
+            results = store.records(indexes, fields)
+        return Response(OrderedDict([
+            ('next', next_url),
+            ('previous', previous_url),
+            ('results', results),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_order(self, store, ordering, positions=None):
+        if not ordering or ordering.lstrip('-') == 'id':
+            order = np.arange(store.count) if positions is None else positions
+        else:
+            field = ordering.lstrip('-')
+            if field not in RecordCursorPagination.ordering_fields:
+                raise ValidationError({'ordering': f'Cannot order by {field!r}.'})
+            if positions is None:
+                # Sorted once per revision, not on every page
+                order = store.sort_order(field, lambda: self.sort_key(store, field))
+            else:
+                order = positions[np.argsort(self.sort_key(store, field, positions), kind='stable')]
+        if ordering and ordering.startswith('-'):
+            order = order[::-1]
+        return order
+
+    def sort_key(self, store, field, positions=None):
+        if field == 'equipment_type':
+            rank = np.empty(len(store.types), dtype=np.int64)
+            rank[np.argsort(np.array(store.types, dtype=object))] = np.arange(len(store.types))
+            codes = store.type_codes if positions is None else store.type_codes[positions]
+            return rank[codes]
+        if field == 'equipment_name':
+            codes = store.name_codes()
+            return codes if positions is None else codes[positions]
+        return store.columns[field] if positions is None else store.columns[field][positions]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            return max(int(b64decode(encoded.encode('ascii')).decode('ascii')), 0)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, offset):
+        return b64encode(str(offset).encode('ascii')).decode('ascii')
@@ -0,0 +1,194 @@
+"""Server-side filtering and group-by aggregation over a dataset's records.
+
+Query parameters understood by :func:`parse_query`:
+
+* ``equipment_type=Pump,Valve`` / ``equipment_name=P-001`` - equality (``,`` = any of)
+* ``<field>__gt``, ``__gte``, ``__lt``, ``__lte`` on flowrate, pressure, temperature
+* ``group_by=equipment_type`` - one result row per type
+* ``aggregate=avg:temperature,max:pressure,count`` - which aggregates to compute;
+  defaults to count plus avg/min/max of every numeric field when grouping
+
+Row-backed datasets push everything down into SQL; columnar datasets are
+answered with NumPy masks over the memory-mapped columns, with names matched
+and grouped through the store's name codes rather than decoded.
+"""
+from django.db.models import Avg, Count, Max, Min
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional at runtime
+    np = None
+
+from .stats import NUMERIC_FIELDS
+
+TEXT_FIELDS = ('equipment_name', 'equipment_type')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+GROUP_FIELDS = ('equipment_type', 'equipment_name')
+AGGREGATES = {'avg': Avg, 'min': Min, 'max': Max}
+RESERVED_PARAMS = {'group_by', 'aggregate', 'cursor', 'page_size', 'ordering', 'fields', 'format', 'stride'}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class DatasetQuery:
+    def __init__(self, equals, ranges, group_by, aggregates):
+        self.equals = equals
+        self.ranges = ranges
+        self.group_by = group_by
+        self.aggregates = aggregates
+
+    @property
+    def is_aggregate(self):
+        return bool(self.group_by or self.aggregates)
+
+    def filter_kwargs(self):
+        kwargs = {}
+        for field, values in self.equals.items():
+            if len(values) == 1:
+                kwargs[field] = values[0]
+            else:
+                kwargs[f'{field}__in'] = values
+        for field, lookup, value in self.ranges:
+            kwargs[f'{field}__{lookup}'] = value
+        return kwargs
+
+
+def parse_query(params):
+    equals, ranges = {}, []
+    for key, value in params.items():
+        if key in RESERVED_PARAMS:
+            continue
+        field, _, lookup = key.partition('__')
+        if field in TEXT_FIELDS and not lookup:
+            equals[field] = value.split(',')
+        elif field in NUMERIC_FIELDS and lookup in RANGE_LOOKUPS:
+            try:
+                ranges.append((field, lookup, float(value)))
+            except ValueError:
+                raise QueryError(f'{key} must be a number')
+        elif field in NUMERIC_FIELDS and not lookup:
+            try:
+                ranges.extend([(field, 'gte', float(value)), (field, 'lte', float(value))])
+            except ValueError:
+                raise QueryError(f'{key} must be a number')
+        else:
+            raise QueryError(f'Unsupported filter: {key}')
+
+    group_by = params.get('group_by') or None
+    if group_by is not None and group_by not in GROUP_FIELDS:
+        raise QueryError(f'Cannot group by {group_by!r}')
+
+    aggregates = []
+    for spec in filter(None, (params.get('aggregate') or '').split(',')):
+        if spec == 'count':
+            aggregates.append(('count', None))
+            continue
+        function, _, field = spec.partition(':')
+        if function not in AGGREGATES or field not in NUMERIC_FIELDS:
+            raise QueryError(f'Unsupported aggregate: {spec}')
+        aggregates.append((function, field))
+    if group_by and not aggregates:
+        aggregates = [('count', None)] + [
+            (function, field) for field in NUMERIC_FIELDS for function in AGGREGATES
+        ]
+
+    return DatasetQuery(equals, ranges, group_by, aggregates)
+
+
+def aggregate_name(function, field):
+    return function if field is None else f'{function}_{field}'
+
+
+def aggregate_rows(queryset, query):
+    """Run ``query``'s aggregates in SQL over an ``EquipmentData`` queryset."""
+    expressions = {
+        aggregate_name(function, field): Count('id') if field is None else AGGREGATES[function](field)
+        for function, field in query.aggregates
+    }
+    queryset = queryset.filter(**query.filter_kwargs()).order_by()
+    if not query.group_by:
+        return queryset.aggregate(**expressions)
+    return list(
+        queryset.values(query.group_by).annotate(**expressions).order_by(query.group_by)
+    )
+
+
+def columnar_mask(store, query):
+    """Boolean mask of the rows in ``store`` matching ``query``'s filters."""
+    mask = np.ones(store.count, dtype=bool)
+    for field, values in query.equals.items():
+        if field == 'equipment_type':
+            codes = [store.type_code(value) for value in values]
+            mask &= np.isin(store.type_codes, [code for code in codes if code is not None])
+        else:
+            codes = [store.name_code(value) for value in values]
+            mask &= np.isin(store.name_codes(), [code for code in codes if code is not None])
+    for field, lookup, value in query.ranges:
+        column = store.columns[field]
+        mask &= {
+            'gt': column > value,
+            'gte': column >= value,
+            'lt': column < value,
+            'lte': column <= value,
+        }[lookup]
+    return mask
+
+
+def aggregate_columns(store, query):
+    """Same result shape as :func:`aggregate_rows`, computed with NumPy."""
+    mask = columnar_mask(store, query)
+    if not query.group_by:
+        return _aggregate_block(store, mask, query.aggregates)
+
+    # Group keys number the groups in name order
+    rows = np.flatnonzero(mask)
+    if query.group_by == 'equipment_type':
+        type_order = sorted(range(len(store.types)), key=store.types.__getitem__)
+        rank = np.empty(len(store.types), dtype=np.int64)
+        rank[type_order] = np.arange(len(store.types))
+        keys = rank[store.type_codes[rows]]
+    else:
+        keys = store.name_codes()[rows]
+    if not len(rows):
+        return []
+
+    # Rows sorted by group, then reduced one contiguous run per group
+    order = np.argsort(keys, kind='stable')
+    rows, keys = rows[order], keys[order]
+    present, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    if query.group_by == 'equipment_type':
+        labels = [store.types[type_order[key]] for key in present.tolist()]
+    else:
+        # Only the names of groups in the result are decoded
+        labels = [store.name(row) for row in store.name_rows()[present].tolist()]
+    groups = [{query.group_by: label} for label in labels]
+    for function, field in query.aggregates:
+        if field is None:
+            values = counts.tolist()
+        else:
+            column = store.columns[field][rows]
+            if function == 'avg':
+                values = (np.add.reduceat(column, starts) / counts).tolist()
+            else:
+                values = {'min': np.minimum, 'max': np.maximum}[function].reduceat(column, starts).tolist()
+        name = aggregate_name(function, field)
+        for group, value in zip(groups, values):
+            group[name] = value
+    return groups
+
+
+def _aggregate_block(store, mask, aggregates):
+    result = {}
+    count = int(mask.sum())
+    for function, field in aggregates:
+        name = aggregate_name(function, field)
+        if field is None:
+            result[name] = count
+        elif not count:
+            result[name] = None
+        else:
+            values = store.columns[field][mask]
+            result[name] = float({'avg': values.mean, 'min': values.min, 'max': values.max}[function]())
+    return result
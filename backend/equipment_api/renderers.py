@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that encodes with orjson when it is installed.
+
+    Anything orjson cannot encode natively (and datetimes, so they keep
+    DRF's formatting) goes through DRF's own encoder. Indented output for
+    the browsable API still uses the standard library.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """Opt-in record format, selected with ``?format=columnar``.
+
+    Views that list records emit them as one array per field (see
+    :func:`equipment_api.serializers.records_payload`) when this renderer
+    was negotiated; the encoding itself is plain JSON.
+    """
+
+    media_type = 'application/vnd.equipment.columnar+json'
+    format = 'columnar'
+
+
+def wants_columnar(request):
+    return getattr(getattr(request, 'accepted_renderer', None), 'format', None) == ColumnarJSONRenderer.format
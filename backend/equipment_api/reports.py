@@ -0,0 +1,160 @@
+"""PDF report rendering and the on-disk, content-addressed report store.
+
+Reports depend only on a dataset's summary, which changes only when rows
+are appended, so each one is rendered once per revision and kept at
+``MEDIA_ROOT/reports/<dataset id>/<key>.pdf``. The key hashes the dataset
+version and ``REPORT_TEMPLATE_VERSION``; bump the latter whenever the
+layout below changes so stale files are no longer served.
+"""
+import contextlib
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+
+from .caching import dataset_version
+
+REPORT_TEMPLATE_VERSION = 1
+LOCK_TIMEOUT = 120
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def render_report(dataset):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(1*inch, height-1*inch, f"Equipment Analysis Report: {dataset.name}")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(1*inch, height-1.25*inch, f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(1*inch, height-1.75*inch, "Summary Statistics:")
+
+    pdf.setFont("Helvetica", 10)
+    y = height - 2*inch
+    summary = dataset.summary_data
+
+    pdf.drawString(1.5*inch, y, f"Total Equipment: {summary['total_count']}")
+    y -= 0.25*inch
+
+    pdf.drawString(1.5*inch, y, "Equipment Type Distribution:")
+    y -= 0.2*inch
+
+    for eq_type, count in summary['equipment_types'].items():
+        pdf.drawString(2*inch, y, f"{eq_type}: {count}")
+        y -= 0.2*inch
+
+    y -= 0.1*inch
+    pdf.drawString(1.5*inch, y, "Average Values:")
+    y -= 0.2*inch
+
+    for param, value in summary['averages'].items():
+        pdf.drawString(2*inch, y, f"{param.capitalize()}: {value:.2f}")
+        y -= 0.2*inch
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def reports_dir(dataset_id):
+    return os.path.join(settings.MEDIA_ROOT, 'reports', str(dataset_id))
+
+
+def report_path(dataset):
+    key = hashlib.sha256(
+        f'{dataset_version(dataset)}:template-{REPORT_TEMPLATE_VERSION}'.encode('utf-8')
+    ).hexdigest()
+    return os.path.join(reports_dir(dataset.pk), f'{key}.pdf')
+
+
+def delete_reports(dataset_id):
+    shutil.rmtree(reports_dir(dataset_id), ignore_errors=True)
+
+
+def delete_stale_reports(dataset):
+    """Remove reports rendered for earlier revisions of ``dataset``."""
+    current = os.path.basename(report_path(dataset))
+    try:
+        names = os.listdir(reports_dir(dataset.pk))
+    except FileNotFoundError:
+        return
+    for name in names:
+        # Lock and temporary files belong to renders still in progress
+        if name.endswith('.pdf') and name != current:
+            try:
+                os.remove(os.path.join(reports_dir(dataset.pk), name))
+            except FileNotFoundError:
+                pass
+
+
+def get_report(dataset):
+    """Return the path of ``dataset``'s rendered report, rendering it if needed.
+
+    Concurrent callers for the same report are single-flighted: threads in
+    this process share a lock, and other processes wait on a ``.lock`` file
+    until the winner has atomically moved the finished PDF into place.
+    """
+    path = report_path(dataset)
+    if os.path.exists(path):
+        return path
+
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            _render_once(dataset, path)
+    with _locks_guard:
+        _locks.pop(path, None)
+    return path
+
+
+def _render_once(dataset, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_path = f'{path}.lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            # Another process is rendering; wait for it, or take over a stale lock
+            if os.path.exists(path):
+                return
+            if time.monotonic() > deadline:
+                # Another waiter may have taken it over first
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(lock_path)
+                deadline = time.monotonic() + LOCK_TIMEOUT
+            time.sleep(0.05)
+
+    try:
+        os.close(fd)
+        if os.path.exists(path):
+            return
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as tmp:
+                tmp.write(render_report(dataset))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    finally:
+        # Gone if a waiter took it over as stale
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path)
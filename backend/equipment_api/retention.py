@@ -0,0 +1,116 @@
+"""Dataset retention: set-based pruning outside the upload request.
+
+``DATASET_RETENTION`` configures the policy; any limit may be ``None``:
+
+* ``max_count`` - keep at most this many datasets (newest first)
+* ``max_age_days`` - drop datasets uploaded longer ago than this
+* ``max_rows`` - keep the newest datasets whose record counts fit in this total
+* ``max_bytes`` - likewise for the size of their uploaded files
+
+Pruning runs after each ingest commits (on the worker pool) and from
+``manage.py prune_datasets``.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EquipmentDataset, IngestJob, UploadSession
+from .uploads import upload_storage
+
+DEFAULT_POLICY = {'max_count': 5, 'max_age_days': None, 'max_rows': None, 'max_bytes': None}
+DEFAULT_ORPHAN_GRACE_SECONDS = 60 * 60
+DEFAULT_UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+
+def get_policy():
+    return {**DEFAULT_POLICY, **getattr(settings, 'DATASET_RETENTION', {})}
+
+
+def select_expired(policy=None):
+    """Return ``(id, file_path)`` for every complete dataset outside the policy."""
+    policy = policy or get_policy()
+    cutoff = None
+    if policy['max_age_days'] is not None:
+        cutoff = timezone.now() - timedelta(days=policy['max_age_days'])
+
+    datasets = (
+        EquipmentDataset.objects.filter(is_complete=True)
+        .order_by('-upload_date')
+        .values_list('id', 'upload_date', 'file_path', 'summary_data__total_count')
+    )
+    expired, kept, rows, size = [], 0, 0, 0
+    for dataset_id, upload_date, file_path, total_count in datasets.iterator():
+        rows += total_count or 0
+        size += os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        if (
+            (policy['max_count'] is not None and kept >= policy['max_count'])
+            or (cutoff is not None and upload_date < cutoff)
+            or (policy['max_rows'] is not None and rows > policy['max_rows'] and kept)
+            or (policy['max_bytes'] is not None and size > policy['max_bytes'] and kept)
+        ):
+            expired.append((dataset_id, file_path))
+        else:
+            kept += 1
+    return expired
+
+
+def prune_datasets(policy=None, dry_run=False):
+    """Delete expired datasets in bulk and remove their uploaded files.
+
+    Records go in a single ``DELETE ... WHERE dataset_id IN (...)`` issued by
+    the queryset delete, rather than one cascade per dataset. Returns the
+    ids of the pruned datasets.
+    """
+    expired = select_expired(policy)
+    ids = [dataset_id for dataset_id, _ in expired]
+    if dry_run or not ids:
+        return ids
+
+    with transaction.atomic():
+        EquipmentDataset.objects.filter(id__in=ids).delete()
+
+    referenced = set(EquipmentDataset.objects.values_list('file_path', flat=True))
+    for _, file_path in expired:
+        if file_path not in referenced and os.path.exists(file_path):
+            os.remove(file_path)
+    return ids
+
+
+def remove_orphan_uploads(grace_seconds=None, dry_run=False):
+    """Delete files in ``MEDIA_ROOT/uploads`` that no dataset or live job uses.
+
+    Files younger than ``grace_seconds`` are left alone so uploads that are
+    still being written are not touched. Chunked uploads that have received
+    nothing for ``UPLOAD_SESSION_TTL_SECONDS`` are aborted and lose their file.
+    """
+    if grace_seconds is None:
+        grace_seconds = getattr(settings, 'ORPHAN_UPLOAD_GRACE_SECONDS', DEFAULT_ORPHAN_GRACE_SECONDS)
+    location = upload_storage().location
+    if not os.path.isdir(location):
+        return []
+
+    referenced = set(EquipmentDataset.objects.values_list('file_path', flat=True))
+    referenced.update(
+        IngestJob.objects.filter(
+            status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING]
+        ).values_list('file_path', flat=True)
+    )
+    session_ttl = getattr(settings, 'UPLOAD_SESSION_TTL_SECONDS', DEFAULT_UPLOAD_SESSION_TTL_SECONDS)
+    cutoff = timezone.now() - timedelta(seconds=session_ttl)
+    open_sessions = UploadSession.objects.filter(status=UploadSession.STATUS_OPEN)
+    referenced.update(open_sessions.filter(updated_at__gte=cutoff).values_list('file_path', flat=True))
+    if not dry_run:
+        open_sessions.filter(updated_at__lt=cutoff).update(status=UploadSession.STATUS_ABORTED)
+    threshold = time.time() - grace_seconds
+
+    removed = []
+    for entry in os.scandir(location):
+        if entry.is_file() and entry.path not in referenced and entry.stat().st_mtime < threshold:
+            if not dry_run:
+                os.remove(entry.path)
+            removed.append(entry.path)
+    return removed
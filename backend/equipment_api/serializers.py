@@ -1,14 +1,93 @@
 from rest_framework import serializers
-from .models import EquipmentDataset, EquipmentData
+from .columnar import ColumnarStore
+from .models import EquipmentDataset, EquipmentData, IngestJob, UploadSession
 
 class EquipmentDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = EquipmentData
         fields = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
 
+RECORD_FIELDS = tuple(EquipmentDataSerializer.Meta.fields)
+# Sent as codes plus a table of distinct values in the columnar format
+DICTIONARY_FIELDS = ('equipment_type',)
+
+
+def records_payload(rows, fields, columnar=False):
+    """Render ``rows`` (tuples of ``fields`` values) as records.
+
+    A fast stand-in for ``EquipmentDataSerializer(many=True)`` that builds no
+    model instances or per-field objects: a list of dicts, or with
+    ``columnar`` one list per field (see :func:`columnar_payload`).
+    """
+    if not columnar:
+        return [dict(zip(fields, row)) for row in rows]
+    columns = [list(column) for column in zip(*rows)] or [[] for _ in fields]
+    return columnar_payload(dict(zip(fields, columns)), len(rows))
+
+
+def columnar_payload(columns, count, dictionaries=None):
+    """``{'count', 'columns', 'dictionaries'}``, dictionary-encoding ``DICTIONARY_FIELDS``.
+
+    Columns already encoded by the caller come with their value tables in
+    ``dictionaries``.
+    """
+    dictionaries = dict(dictionaries or {})
+    for field in DICTIONARY_FIELDS:
+        if field in columns and field not in dictionaries:
+            codes = {}
+            columns[field] = [codes.setdefault(value, len(codes)) for value in columns[field]]
+            dictionaries[field] = list(codes)
+    return {'count': count, 'columns': columns, 'dictionaries': dictionaries}
+
+
+def dataset_records(dataset, fields=RECORD_FIELDS, columnar=False):
+    """All of ``dataset``'s records in upload order, from its rows or its column files."""
+    if dataset.has_rows:
+        rows = list(EquipmentData.objects.filter(dataset=dataset).order_by('id').values_list(*fields))
+        return records_payload(rows, fields, columnar)
+    store = ColumnarStore(dataset.pk)
+    if not columnar:
+        return store.all_records(fields)
+    columns = store.all_column_values(fields, encode_types=True)
+    dictionaries = {'equipment_type': store.types} if 'equipment_type' in fields else None
+    return columnar_payload(columns, store.count, dictionaries)
+
+
+class EquipmentDatasetListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EquipmentDataset
+        fields = ['id', 'name', 'upload_date', 'revision', 'summary_data']
+
 class EquipmentDatasetSerializer(serializers.ModelSerializer):
-    records = EquipmentDataSerializer(many=True, read_only=True)
+    records = serializers.SerializerMethodField()
     
     class Meta:
         model = EquipmentDataset
-        fields = ['id', 'name', 'upload_date', 'summary_data', 'records']
\ No newline at end of file
+        fields = ['id', 'name', 'upload_date', 'revision', 'summary_data', 'records']
+    
+    def get_records(self, dataset):
+        # Set by views that negotiated ?format=columnar
+        return dataset_records(dataset, columnar=self.context.get('columnar', False))
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'dataset', 'file_name', 'status', 'stage', 'rows_processed',
+                  'bytes_processed', 'total_bytes', 'progress', 'error', 'created_at', 'updated_at']
+    
+    def get_progress(self, job):
+        if job.status == IngestJob.STATUS_COMPLETED:
+            return 1.0
+        if not job.total_bytes:
+            return 0.0
+        return min(job.bytes_processed / job.total_bytes, 1.0)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'file_name', 'total_bytes', 'received_bytes', 'content_hash', 'status', 'job',
+                  'created_at', 'updated_at']
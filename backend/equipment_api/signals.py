@@ -0,0 +1,28 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_dataset
+from .columnar import delete_store
+from .database import apply_sqlite_pragmas
+from .models import EquipmentDataset
+from .reports import delete_reports
+
+
+@receiver(post_delete, sender=EquipmentDataset)
+def remove_dataset_files(sender, instance, **kwargs):
+    if instance.has_columns:
+        delete_store(instance.pk)
+    delete_reports(instance.pk)
+
+
+@receiver(post_save, sender=EquipmentDataset)
+@receiver(post_delete, sender=EquipmentDataset)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    invalidate_dataset(instance.pk)
+
+
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_sqlite_pragmas(connection)
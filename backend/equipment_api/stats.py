@@ -0,0 +1,414 @@
+import bisect
+import math
+import random
+from collections import Counter
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - only update_columns needs numpy
+    np = None
+
+NUMERIC_FIELDS = ('flowrate', 'pressure', 'temperature')
+QUANTILES = {'p05': 0.05, 'p25': 0.25, 'p50': 0.5, 'p75': 0.75, 'p95': 0.95, 'p99': 0.99}
+
+DEFAULT_SKETCH_K = 200
+# Per-type sketches only back the outlier thresholds; there may be thousands of types
+DEFAULT_TYPE_SKETCH_K = 50
+DEFAULT_HISTOGRAM_BINS = 10
+DEFAULT_SUMMARY_TYPES = 20
+DEFAULT_SKETCH_TYPES = 100
+
+
+class KLLSketch:
+    """Mergeable approximate quantile sketch (Karnin, Lang & Liberty, 2016).
+
+    Values are kept in a hierarchy of compactors; an item at level ``h``
+    stands for ``2 ** h`` inputs. Memory is ``O(k)`` and rank error is about
+    ``1.7 / k``. Until the first compaction the sketch is exact.
+    """
+
+    def __init__(self, k=None, seed=0):
+        self.k = k or getattr(settings, 'SUMMARY_SKETCH_K', DEFAULT_SKETCH_K)
+        self.compactors = [[]]
+        self.size = 0
+        self.max_size = 0
+        self._rng = random.Random(seed)
+        self._update_max_size()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _update_max_size(self):
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def extend(self, values):
+        self.compactors[0].extend(values)
+        self.size += len(values)
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size = sum(len(items) for items in self.compactors)
+        self._update_max_size()
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for level in range(len(self.compactors)):
+                if len(self.compactors[level]) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                        self._update_max_size()
+                    self.compactors[level + 1].extend(self._compact(level))
+                    self.size = sum(len(items) for items in self.compactors)
+                    if self.size < self.max_size:
+                        break
+
+    def _compact(self, level):
+        items = sorted(self.compactors[level])
+        # An odd item out stays behind so the total weight is preserved; taking
+        # it from a random end keeps the kept values from drifting one way
+        leftover = [items.pop(-self._rng.randint(0, 1))] if len(items) % 2 else []
+        self.compactors[level] = leftover
+        return items[self._rng.randint(0, 1)::2]
+
+    def _weighted(self):
+        pairs = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        values, cumulative, total = [], [], 0
+        for value, weight in pairs:
+            total += weight
+            values.append(value)
+            cumulative.append(total)
+        return values, cumulative, total
+
+    def quantiles(self, fractions):
+        values, cumulative, total = self._weighted()
+        if not total:
+            return [0 for _ in fractions]
+        return [
+            values[min(bisect.bisect_left(cumulative, fraction * total), len(values) - 1)]
+            for fraction in fractions
+        ]
+
+    def histogram(self, low, high, bins):
+        """Equal-width histogram over ``[low, high]`` derived from the sketch."""
+        values, cumulative, total = self._weighted()
+        if not total or bins <= 0:
+            return {'edges': [], 'counts': []}
+        width = (high - low) / bins if high > low else 0
+        edges = [low + width * index for index in range(bins)] + [high]
+        counts, previous = [], 0
+        for index, edge in enumerate(edges[1:], start=1):
+            # Bins are half-open except the last, which includes ``high``
+            if index == bins:
+                position = bisect.bisect_right(values, edge)
+            else:
+                position = bisect.bisect_left(values, edge)
+            seen = cumulative[position - 1] if position else 0
+            counts.append(seen - previous)
+            previous = seen
+        return {'edges': edges, 'counts': counts}
+
+    def to_dict(self):
+        return {'k': self.k, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data['k'])
+        sketch.compactors = [list(items) for items in data['compactors']]
+        sketch.size = sum(len(items) for items in sketch.compactors)
+        sketch._update_max_size()
+        return sketch
+
+
+class FieldStats:
+    """Welford moments, extrema and a quantile sketch for one numeric column.
+
+    ``sketch`` is ``None`` once it has been dropped from stored partials;
+    quantiles are then unavailable.
+    """
+
+    def __init__(self, sketch_k=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = KLLSketch(k=sketch_k)
+
+    def update_values(self, values):
+        """Fold in a list of floats in one step (cheaper than per-value updates)."""
+        size = len(values)
+        if not size:
+            return
+        mean = sum(values) / size
+        m2 = sum((value - mean) * (value - mean) for value in values)
+        self._combine(size, mean, m2, min(values), max(values))
+        if self.sketch is not None:
+            self.sketch.extend(values)
+
+    def update_array(self, values):
+        """Fold in a NumPy array using Chan et al.'s pairwise combination."""
+        size = len(values)
+        if not size:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        self._combine(size, mean, m2, float(values.min()), float(values.max()))
+        if self.sketch is not None:
+            self.sketch.extend(values.tolist())
+
+    def update_moments(self, count, mean, m2, low, high, values):
+        """Fold in a group whose moments were already reduced; ``values`` feed the sketch."""
+        self._combine(count, mean, m2, low, high)
+        if self.sketch is not None:
+            self.sketch.extend(values)
+
+    def merge_moments(self, other):
+        """Like ``merge()``, leaving the sketch out."""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+            if other.sketch is None:
+                self.sketch = None
+            elif self.sketch is not None:
+                self.sketch.merge(other.sketch)
+
+    def _combine(self, count, mean, m2, low, high):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def variance(self):
+        """Sample variance (``n - 1`` denominator); 0 for fewer than two values."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_summary(self, quantiles=QUANTILES, bins=None):
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'variance': self.variance,
+            'std': math.sqrt(self.variance),
+            'min': self.min if self.count else 0,
+            'max': self.max if self.count else 0,
+        }
+        if quantiles and self.sketch is not None:
+            summary['quantiles'] = dict(zip(quantiles, self.sketch.quantiles(list(quantiles.values()))))
+        if bins and self.sketch is not None:
+            summary['histogram'] = self.sketch.histogram(summary['min'], summary['max'], bins)
+        return summary
+
+    def to_dict(self, sketch=True):
+        return {
+            'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max,
+            'sketch': self.sketch.to_dict() if sketch and self.sketch is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count, stats.mean, stats.m2 = data['count'], data['mean'], data['m2']
+        stats.min, stats.max = data['min'], data['max']
+        stats.sketch = KLLSketch.from_dict(data['sketch']) if data['sketch'] is not None else None
+        return stats
+
+
+class SummaryStats:
+    """Single-pass running statistics behind ``EquipmentDataset.summary_data``.
+
+    ``to_partials()`` captures the running state (counts, sums, Welford
+    moments, extrema and sketches) as JSON; it is stored as
+    ``EquipmentDataset.summary_partials`` so summaries of several datasets
+    can be combined with ``merge()`` without reading their records again.
+
+    Every equipment type keeps moments and a small sketch
+    (``SUMMARY_TYPE_SKETCH_K``), but only the ``SUMMARY_SKETCH_TYPES`` most
+    common types keep their sketch in the partials. The summary lists the
+    ``SUMMARY_MAX_TYPES`` most common types, without quantiles, and folds the
+    rest into ``other_types``.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.type_counter = Counter()
+        self.sums = {field: 0.0 for field in NUMERIC_FIELDS}
+        self.fields = {field: FieldStats() for field in NUMERIC_FIELDS}
+        self.by_type = {}
+
+    def _type_fields(self, equipment_type):
+        if equipment_type not in self.by_type:
+            sketch_k = getattr(settings, 'SUMMARY_TYPE_SKETCH_K', DEFAULT_TYPE_SKETCH_K)
+            self.by_type[equipment_type] = {field: FieldStats(sketch_k) for field in NUMERIC_FIELDS}
+        return self.by_type[equipment_type]
+
+    def update_rows(self, types, flowrates, pressures, temperatures):
+        """Fold a batch of parsed rows (parallel lists) in at once."""
+        size = len(types)
+        if not size:
+            return
+        self.count += size
+        self.type_counter.update(types)
+        grouped = {}
+        for field, values in zip(NUMERIC_FIELDS, (flowrates, pressures, temperatures)):
+            self.sums[field] += sum(values)
+            self.fields[field].update_values(values)
+
+        for index, equipment_type in enumerate(types):
+            grouped.setdefault(equipment_type, []).append(index)
+        for equipment_type, indexes in grouped.items():
+            type_fields = self._type_fields(equipment_type)
+            for field, values in zip(NUMERIC_FIELDS, (flowrates, pressures, temperatures)):
+                type_fields[field].update_values([values[index] for index in indexes])
+
+    def update_columns(self, type_codes, type_names, columns):
+        """Fold a whole batch in at once.
+
+        ``type_codes`` is a NumPy array of indexes into ``type_names`` (as
+        returned by ``pandas.factorize``) and ``columns`` maps each numeric
+        field to a NumPy array of its values.
+        """
+        size = len(type_codes)
+        if not size:
+            return
+        self.count += size
+        for field in NUMERIC_FIELDS:
+            values = columns[field]
+            self.sums[field] += float(values.sum())
+            self.fields[field].update_array(values)
+
+        # Grouped reductions: one sort and a few bincounts, whatever the number of types
+        counts = np.bincount(type_codes, minlength=len(type_names))
+        present = np.flatnonzero(counts)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        order = np.argsort(type_codes, kind='stable')
+        type_fields = [self._type_fields(type_names[code]) for code in present]
+        for code, group_size in zip(present, counts[present]):
+            self.type_counter[type_names[code]] += int(group_size)
+        for field in NUMERIC_FIELDS:
+            values = columns[field]
+            means = np.bincount(type_codes, weights=values, minlength=len(counts)) / np.maximum(counts, 1)
+            m2 = np.bincount(type_codes, weights=(values - means[type_codes]) ** 2, minlength=len(counts))
+            grouped = values[order]
+            lows = np.minimum.reduceat(grouped, bounds[present])
+            highs = np.maximum.reduceat(grouped, bounds[present])
+            grouped = grouped.tolist()
+            for index, code in enumerate(present):
+                type_fields[index][field].update_moments(
+                    int(counts[code]), float(means[code]), float(m2[code]), float(lows[index]),
+                    float(highs[index]), grouped[bounds[code]:bounds[code + 1]]
+                )
+
+    def merge(self, other):
+        self.count += other.count
+        self.type_counter.update(other.type_counter)
+        for field in NUMERIC_FIELDS:
+            self.sums[field] += other.sums[field]
+            self.fields[field].merge(other.fields[field])
+        for equipment_type, other_fields in other.by_type.items():
+            type_fields = self._type_fields(equipment_type)
+            for field in NUMERIC_FIELDS:
+                type_fields[field].merge(other_fields[field])
+
+    def to_partials(self):
+        sketch_types = getattr(settings, 'SUMMARY_SKETCH_TYPES', DEFAULT_SKETCH_TYPES)
+        sketched = {equipment_type for equipment_type, _ in self.type_counter.most_common(sketch_types)}
+        return {
+            'count': self.count,
+            'types': dict(self.type_counter),
+            'sums': dict(self.sums),
+            'fields': {field: stats.to_dict() for field, stats in self.fields.items()},
+            'by_type': {
+                equipment_type: {
+                    field: stats.to_dict(sketch=equipment_type in sketched) for field, stats in type_fields.items()
+                }
+                for equipment_type, type_fields in self.by_type.items()
+            },
+        }
+
+    @classmethod
+    def from_partials(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.type_counter = Counter(data['types'])
+        stats.sums = dict(data['sums'])
+        stats.fields = {field: FieldStats.from_dict(value) for field, value in data['fields'].items()}
+        stats.by_type = {
+            equipment_type: {field: FieldStats.from_dict(value) for field, value in type_fields.items()}
+            for equipment_type, type_fields in data['by_type'].items()
+        }
+        return stats
+
+    def type_summaries(self, limit=None):
+        """``by_type`` entries (moments only) for the ``limit`` most common types, and the rest folded together."""
+        types = [equipment_type for equipment_type, _ in self.type_counter.most_common() if equipment_type in self.by_type]
+        listed, rest = (types, []) if limit is None else (types[:limit], types[limit:])
+        by_type = {
+            equipment_type: {
+                'count': self.type_counter[equipment_type],
+                **{field: self.by_type[equipment_type][field].as_summary(quantiles=None) for field in NUMERIC_FIELDS},
+            }
+            for equipment_type in listed
+        }
+        if not rest:
+            return by_type, None
+        other = {field: FieldStats(sketch_k=1) for field in NUMERIC_FIELDS}
+        for equipment_type in rest:
+            for field in NUMERIC_FIELDS:
+                other[field].merge_moments(self.by_type[equipment_type][field])
+        return by_type, {
+            'types': len(rest),
+            'count': sum(self.type_counter[equipment_type] for equipment_type in rest),
+            **{field: other[field].as_summary(quantiles=None) for field in NUMERIC_FIELDS},
+        }
+
+    def as_summary(self):
+        bins = getattr(settings, 'SUMMARY_HISTOGRAM_BINS', DEFAULT_HISTOGRAM_BINS)
+        by_type, other_types = self.type_summaries(getattr(settings, 'SUMMARY_MAX_TYPES', DEFAULT_SUMMARY_TYPES))
+        summary = {
+            'total_count': self.count,
+            'equipment_types': dict(self.type_counter),
+            'averages': {
+                field: self.sums[field] / self.count if self.count else 0
+                for field in NUMERIC_FIELDS
+            },
+            'ranges': {
+                field: {
+                    'min': self.fields[field].min if self.count else 0,
+                    'max': self.fields[field].max if self.count else 0,
+                }
+                for field in NUMERIC_FIELDS
+            },
+            'statistics': {
+                field: self.fields[field].as_summary(bins=bins) for field in NUMERIC_FIELDS
+            },
+            'by_type': by_type,
+        }
+        if other_types is not None:
+            summary['other_types'] = other_types
+        return summary
@@ -0,0 +1,47 @@
+import csv
+import random
+
+EQUIPMENT_TYPES = (
+    'Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser', 'Mixer', 'Separator',
+)
+
+# Baseline (flowrate, pressure, temperature) per type, matching sample_equipment_data.csv
+TYPE_PROFILES = {
+    'Pump': (120.0, 5.2, 110.0),
+    'Compressor': (95.0, 8.4, 95.0),
+    'Valve': (60.0, 4.1, 105.0),
+    'HeatExchanger': (150.0, 6.2, 130.0),
+    'Reactor': (140.0, 7.5, 140.0),
+    'Condenser': (170.0, 6.5, 125.0),
+    'Mixer': (200.0, 5.5, 65.0),
+    'Separator': (120.3, 8.7, 75.5),
+}
+
+
+def equipment_types(cardinality):
+    """Return ``cardinality`` type names, reusing the real ones first."""
+    types = list(EQUIPMENT_TYPES[:cardinality])
+    for index in range(len(types), cardinality):
+        types.append(f'Type{index:03d}')
+    return types
+
+
+def write_equipment_csv(path, rows, type_cardinality=len(EQUIPMENT_TYPES), seed=0):
+    """Write ``rows`` synthetic readings in the upload CSV format to ``path``."""
+    rng = random.Random(seed)
+    types = equipment_types(type_cardinality)
+    profiles = [TYPE_PROFILES.get(name, (100.0, 6.0, 100.0)) for name in types]
+
+    with open(path, 'w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Equipment Name', 'Equipment Type', 'Flowrate', 'Pressure', 'Temperature'])
+        for index in range(rows):
+            type_index = rng.randrange(len(types))
+            flowrate, pressure, temperature = profiles[type_index]
+            writer.writerow([
+                f'{types[type_index]}-{index + 1:07d}',
+                types[type_index],
+                f'{rng.gauss(flowrate, flowrate * 0.1):.2f}',
+                f'{rng.gauss(pressure, pressure * 0.1):.2f}',
+                f'{rng.gauss(temperature, temperature * 0.05):.2f}',
+            ])
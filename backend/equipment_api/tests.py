@@ -1,3 +1,991 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import benchmarks, export, ingest, jobs, metrics, reports, retention, uploads
+from .columnar import ColumnarStore
+from .models import EquipmentDataset, EquipmentData, UploadSession
+from .stats import KLLSketch
+
+SAMPLE_CSV = (
+    'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n'
+    'Reactor-001,Reactor,150.5,10.2,85.0\n'
+    'Mixer-001,Mixer,200.0,5.5,65.0\n'
+    'Reactor-002,Reactor,180.7,12.1,90.0\n'
+    'Pump-001,Pump,300.2,15.3,40.0\n'
+)
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user('tester', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=SAMPLE_CSV, name='sample.csv', **extra):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        file = SimpleUploadedFile(name, content, content_type='text/csv')
+        return self.client.post('/api/datasets/', {'file': file, **extra}, format='multipart')
+
+
+class UploadTests(APITestCase):
+    def test_upload_computes_summary(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        summary = response.data['summary_data']
+        self.assertEqual(summary['total_count'], 4)
+        self.assertEqual(summary['equipment_types'], {'Reactor': 2, 'Mixer': 1, 'Pump': 1})
+        self.assertAlmostEqual(summary['averages']['pressure'], (10.2 + 5.5 + 12.1 + 15.3) / 4)
+        self.assertEqual(summary['ranges']['flowrate'], {'min': 150.5, 'max': 300.2})
+
+    def test_dataset_records_keep_upload_order(self):
+        names = ['Reactor-001', 'Mixer-001', 'Reactor-002', 'Pump-001']
+        for storage in ({}, {'COLUMNAR_STORAGE': True, 'COLUMNAR_ONLY_MIN_BYTES': 0}):
+            with self.subTest(**storage), override_settings(**storage):
+                dataset_id = self.upload(SAMPLE_CSV + '\n' * len(storage)).data['id']
+                with CaptureQueriesContext(connection) as queries:
+                    records = self.client.get(f'/api/datasets/{dataset_id}/').data['records']
+                self.assertEqual([record['equipment_name'] for record in records], names)
+                if not storage:
+                    record_queries = [query['sql'] for query in queries if 'equipment_api_equipmentdata"' in query['sql']]
+                    self.assertIn('ORDER BY', record_queries[-1])
+
+    def test_upload_computes_extended_statistics(self):
+        summary = self.upload().data['summary_data']
+        pressure = summary['statistics']['pressure']
+        self.assertEqual(pressure['count'], 4)
+        self.assertAlmostEqual(pressure['mean'], statistics.mean([10.2, 5.5, 12.1, 15.3]))
+        self.assertAlmostEqual(pressure['variance'], statistics.variance([10.2, 5.5, 12.1, 15.3]))
+        self.assertEqual(pressure['quantiles']['p50'], 10.2)
+        self.assertEqual(sum(pressure['histogram']['counts']), 4)
+        self.assertEqual(len(pressure['histogram']['edges']), 11)
+
+        reactor = summary['by_type']['Reactor']
+        self.assertEqual(reactor['count'], 2)
+        self.assertAlmostEqual(reactor['temperature']['mean'], 87.5)
+        self.assertEqual(reactor['flowrate']['max'], 180.7)
+
+    @override_settings(SUMMARY_MAX_TYPES=2, SUMMARY_SKETCH_TYPES=1)
+    def test_summary_lists_most_common_types(self):
+        csv_text = SAMPLE_CSV + 'Reactor-003,Reactor,170.0,11.0,88.0\nMixer-002,Mixer,210.0,6.0,60.0\n'
+        with override_settings(INGEST_ENGINE='csv'):
+            expected = self.upload(csv_text).data['summary_data']
+        with override_settings(INGEST_ENGINE='pandas'):
+            response = self.upload(csv_text + '\n')
+        summary = response.data['summary_data']
+        self.assertEqual(list(summary['by_type']), ['Reactor', 'Mixer'])
+        self.assertNotIn('quantiles', summary['by_type']['Reactor']['pressure'])
+        self.assertEqual(summary['other_types']['types'], 1)
+        self.assertEqual(summary['other_types']['flowrate']['mean'], 300.2)
+        for field in ('flowrate', 'pressure', 'temperature'):
+            for key in ('mean', 'variance', 'min', 'max'):
+                self.assertAlmostEqual(summary['by_type']['Mixer'][field][key], expected['by_type']['Mixer'][field][key])
+
+        partials = EquipmentDataset.objects.get(pk=response.data['id']).summary_partials
+        self.assertIsNotNone(partials['by_type']['Reactor']['flowrate']['sketch'])
+        self.assertIsNone(partials['by_type']['Mixer']['flowrate']['sketch'])
+
+    @override_settings(INGEST_BATCH_SIZE=3)
+    def test_upload_flushes_in_batches(self):
+        self.upload()
+        self.assertEqual(EquipmentData.objects.count(), 4)
+
+    def test_empty_csv_is_rejected_without_leftovers(self):
+        response = self.upload('Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'CSV file is empty')
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+    def test_invalid_row_rolls_back(self):
+        response = self.upload(SAMPLE_CSV + 'Broken-001,Pump,abc,1,1\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EquipmentData.objects.exists())
+
+    @override_settings(INGEST_ENGINE='pandas', INGEST_BATCH_SIZE=3)
+    def test_pandas_engine_matches_csv_engine(self):
+        with override_settings(INGEST_ENGINE='csv'):
+            expected = self.upload().data['summary_data']
+        summary = self.upload(SAMPLE_CSV + '\n').data['summary_data']
+        self.assertEqual(summary['total_count'], expected['total_count'])
+        self.assertEqual(summary['equipment_types'], expected['equipment_types'])
+        self.assertEqual(summary['ranges'], expected['ranges'])
+        self.assertEqual(summary['by_type'].keys(), expected['by_type'].keys())
+        for field, stats in expected['statistics'].items():
+            self.assertAlmostEqual(summary['statistics'][field]['variance'], stats['variance'])
+            self.assertEqual(summary['statistics'][field]['quantiles'], stats['quantiles'])
+        for field, value in expected['averages'].items():
+            self.assertAlmostEqual(summary['averages'][field], value)
+        self.assertEqual(EquipmentData.objects.count(), 8)
+
+    def test_compressed_uploads_are_detected_by_content(self):
+        expected = self.upload().data['summary_data']
+        for padding, engine in enumerate(('csv', 'pandas'), start=1):
+            with self.subTest(engine=engine), override_settings(INGEST_ENGINE=engine):
+                content = gzip.compress((SAMPLE_CSV + '\n' * padding).encode('utf-8'))
+                response = self.upload(content, name='plant.bin')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['summary_data']['averages'], expected['averages'])
+
+    @skipUnless(ingest.zstandard, 'zstandard is not installed')
+    def test_zstd_upload(self):
+        content = ingest.zstandard.ZstdCompressor().compress(SAMPLE_CSV.encode('utf-8'))
+        response = self.upload(content, name='sample.csv.zst')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary_data']['total_count'], 4)
+
+
+class SketchTests(TestCase):
+    def test_quartiles_of_uniform_input_within_rank_error(self):
+        values = np.random.default_rng(7).random(200_000)
+        sketch = KLLSketch(k=200)
+        for start in range(0, len(values), 4999):
+            sketch.extend(values[start:start + 4999].tolist())
+        self.assertLess(sum(len(items) for items in sketch.compactors), 2000)
+        fractions = [0.25, 0.5, 0.75]
+        # On [0, 1) a rank error is the same size as a value error
+        for estimate, exact in zip(sketch.quantiles(fractions), np.quantile(values, fractions)):
+            self.assertAlmostEqual(estimate, exact, delta=1.7 / sketch.k)
+
+
+class DatasetListingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload().data['id']
+
+    def test_list_and_history_omit_records(self):
+        for url in ('/api/datasets/', '/api/history/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('records', response.data[0])
+            self.assertEqual(response.data[0]['summary_data']['total_count'], 4)
+
+    def test_retrieve_keeps_records(self):
+        response = self.client.get(f'/api/datasets/{self.dataset_id}/')
+        self.assertEqual(len(response.data['records']), 4)
+
+    def test_records_cursor_pagination(self):
+        url = f'/api/datasets/{self.dataset_id}/records/'
+        first = self.client.get(url, {'page_size': 3, 'ordering': '-pressure', 'fields': 'equipment_name,pressure'})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(
+            [record['pressure'] for record in first.data['results']], [15.3, 12.1, 10.2]
+        )
+        self.assertEqual(set(first.data['results'][0]), {'equipment_name', 'pressure'})
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual([record['pressure'] for record in second.data['results']], [5.5])
+        self.assertIsNone(second.data['next'])
+
+    def test_records_rejects_unknown_ordering(self):
+        response = self.client.get(f'/api/datasets/{self.dataset_id}/records/', {'ordering': 'dataset'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_columnar_format(self):
+        response = self.client.get(
+            f'/api/datasets/{self.dataset_id}/records/',
+            {'format': 'columnar', 'ordering': 'flowrate', 'fields': 'equipment_type,flowrate'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/vnd.equipment.columnar+json')
+        results = json.loads(response.content)['results']
+        self.assertEqual(results, {
+            'count': 4,
+            'columns': {'equipment_type': [0, 0, 1, 2], 'flowrate': [150.5, 180.7, 200.0, 300.2]},
+            'dictionaries': {'equipment_type': ['Reactor', 'Mixer', 'Pump']},
+        })
+
+        rows = self.client.get(f'/api/datasets/{self.dataset_id}/').data['records']
+        columnar = json.loads(self.client.get(f'/api/datasets/{self.dataset_id}/', {'format': 'columnar'}).content)
+        types = columnar['records']['dictionaries']['equipment_type']
+        self.assertEqual([types[code] for code in columnar['records']['columns']['equipment_type']],
+                         [record['equipment_type'] for record in rows])
+        self.assertEqual(self.client.get(f'/api/datasets/{self.dataset_id}/summary/?format=columnar').status_code, 404)
+
+
+@override_settings(INGEST_JOB_EXECUTOR='inline')
+class AsyncIngestTests(APITestCase):
+    def test_async_upload_returns_job_and_completes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(**{'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(f"/api/jobs/{response.data['id']}/", response['Location'])
+
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['stage'], 'done')
+        self.assertEqual(job['rows_processed'], 4)
+        self.assertEqual(job['progress'], 1.0)
+
+        dataset = self.client.get(f"/api/datasets/{job['dataset']}/").data
+        self.assertEqual(dataset['summary_data']['total_count'], 4)
+
+    def test_failed_job_removes_partial_dataset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(SAMPLE_CSV + 'Broken-001,Pump,abc,1,1\n', **{'async': 'true'})
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'failed')
+        self.assertIsNone(job['dataset'])
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+
+@override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0)
+class ColumnarStorageTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = EquipmentDataset.objects.get(pk=self.upload().data['id'])
+
+    def test_columnar_only_dataset_has_no_rows(self):
+        self.assertEqual(self.dataset.storage, 'columnar')
+        self.assertFalse(EquipmentData.objects.exists())
+        store = ColumnarStore(self.dataset.pk)
+        self.assertEqual(store.count, 4)
+        self.assertEqual(store.types, ['Reactor', 'Mixer', 'Pump'])
+        self.assertEqual(store.columns['flowrate'].tolist(), [150.5, 200.0, 180.7, 300.2])
+        self.assertEqual(store.name(3), 'Pump-001')
+
+    def test_records_served_from_columns(self):
+        url = f'/api/datasets/{self.dataset.pk}/records/'
+        first = self.client.get(url, {'page_size': 3, 'ordering': '-pressure'})
+        self.assertEqual([record['pressure'] for record in first.data['results']], [15.3, 12.1, 10.2])
+        self.assertEqual(first.data['results'][0]['equipment_name'], 'Pump-001')
+        second = self.client.get(first.data['next'])
+        self.assertEqual([record['equipment_name'] for record in second.data['results']], ['Mixer-001'])
+        self.assertIsNone(second.data['next'])
+
+        detail = self.client.get(f'/api/datasets/{self.dataset.pk}/')
+        self.assertEqual(len(detail.data['records']), 4)
+
+        columnar = json.loads(self.client.get(url, {'format': 'columnar', 'fields': 'equipment_type'}).content)
+        self.assertEqual(columnar['results']['columns']['equipment_type'], [0, 1, 0, 2])
+        self.assertEqual(columnar['results']['dictionaries']['equipment_type'], ['Reactor', 'Mixer', 'Pump'])
+
+    @override_settings(INGEST_JOB_EXECUTOR='inline')
+    def test_sort_orders_are_kept_per_revision(self):
+        url = f'/api/datasets/{self.dataset.pk}/records/'
+        for _ in range(2):
+            names = self.client.get(url, {'ordering': '-equipment_name', 'fields': 'equipment_name'}).data['results']
+            self.assertEqual([record['equipment_name'] for record in names],
+                             ['Reactor-002', 'Reactor-001', 'Pump-001', 'Mixer-001'])
+        store = ColumnarStore(self.dataset.pk)
+        self.assertEqual(store.name_codes().tolist(), [2, 0, 3, 1])
+        self.assertEqual((store.name_code('Pump-001'), store.name_code('Pump-002')), (1, None))
+        self.assertEqual(sorted(os.listdir(os.path.join(store.path, 'derived'))),
+                         ['name_codes.4.npy', 'name_rows.4.npy', 'order.equipment_name.4.npy'])
+
+        file = SimpleUploadedFile('more.csv', b'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n'
+                                              b'Agitator-001,Mixer,1.0,1.0,1.0\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/datasets/{self.dataset.pk}/append/', {'file': file}, format='multipart')
+        names = self.client.get(url, {'ordering': 'equipment_name', 'page_size': 1}).data['results']
+        self.assertEqual(names[0]['equipment_name'], 'Agitator-001')
+
+    def test_records_sampled_by_stride(self):
+        url = f'/api/datasets/{self.dataset.pk}/records/'
+        sampled = self.client.get(url, {'stride': 2, 'fields': 'equipment_name'}).data['results']
+        self.assertEqual([record['equipment_name'] for record in sampled], ['Reactor-001', 'Reactor-002'])
+        with override_settings(COLUMNAR_STORAGE=False):
+            rows_id = self.upload(SAMPLE_CSV + '\n').data['id']
+        self.assertEqual(len(self.client.get(f'/api/datasets/{rows_id}/records/', {'stride': 2}).data['results']), 2)
+        self.assertEqual(self.client.get(url, {'stride': 0}).status_code, 400)
+
+    def test_failed_upload_removes_column_files(self):
+        stores = os.path.join(self.media_root, 'columnar')
+        before = sorted(os.listdir(stores))
+        # Rolled back after the column files were written
+        with mock.patch('equipment_api.views.submit_retention', side_effect=RuntimeError('disk full')):
+            self.assertEqual(self.upload(SAMPLE_CSV + '\n').status_code, 400)
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+        self.assertEqual(sorted(os.listdir(stores)), before)
+
+    def test_delete_removes_column_files(self):
+        self.dataset.delete()
+        self.assertFalse(ColumnarStore.exists(self.dataset.pk))
+
+
+class DatasetQueryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f"/api/datasets/{self.upload().data['id']}/query/"
+
+    def test_filters_return_matching_records(self):
+        response = self.client.get(self.url, {'equipment_type': 'Reactor,Pump', 'pressure__gt': 11})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(record['equipment_name'] for record in response.data['results']),
+            ['Pump-001', 'Reactor-002'],
+        )
+
+    def test_group_by_pushes_aggregates_down(self):
+        response = self.client.get(self.url, {'group_by': 'equipment_type', 'aggregate': 'count,avg:temperature'})
+        self.assertEqual(response.data['groups'], [
+            {'equipment_type': 'Mixer', 'count': 1, 'avg_temperature': 65.0},
+            {'equipment_type': 'Pump', 'count': 1, 'avg_temperature': 40.0},
+            {'equipment_type': 'Reactor', 'count': 2, 'avg_temperature': 87.5},
+        ])
+
+    def test_aggregate_without_group_by(self):
+        response = self.client.get(self.url, {'flowrate__gte': 180, 'aggregate': 'count,max:pressure'})
+        self.assertEqual(response.data['aggregates'], {'count': 3, 'max_pressure': 15.3})
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(self.url, {'dataset': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+    def test_columnar_dataset_gives_same_answers(self):
+        with override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0):
+            dataset_id = self.upload(SAMPLE_CSV + '\n').data['id']
+        url = f'/api/datasets/{dataset_id}/query/'
+        for params in (
+            {'group_by': 'equipment_type', 'aggregate': 'count,avg:temperature,min:flowrate'},
+            {'group_by': 'equipment_name', 'aggregate': 'count,max:pressure', 'flowrate__gt': 160},
+            {'equipment_name': 'Pump-001,Mixer-001,Valve-009', 'aggregate': 'count,avg:flowrate'},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(url, params).data, self.client.get(self.url, params).data)
+
+        records = self.client.get(url, {'equipment_type': 'Reactor', 'ordering': '-flowrate'})
+        self.assertEqual(
+            [record['equipment_name'] for record in records.data['results']], ['Reactor-002', 'Reactor-001']
+        )
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.dataset_id = self.upload().data['id']
+
+    def test_repeat_fetch_returns_not_modified(self):
+        for url in (
+            f'/api/datasets/{self.dataset_id}/',
+            f'/api/datasets/{self.dataset_id}/summary/',
+            f'/api/datasets/{self.dataset_id}/generate_report/',
+            '/api/history/',
+        ):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(first.has_header('Last-Modified'))
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(second.status_code, 304, url)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_compressed_response_keeps_conditional_get(self):
+        url = f'/api/datasets/{self.dataset_id}/'
+        first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertEqual(json.loads(gzip.decompress(first.content))['id'], self.dataset_id)
+        second = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_cached_payload_skips_serialization(self):
+        url = f'/api/datasets/{self.dataset_id}/'
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+    def test_html_and_json_are_separate_representations(self):
+        for url in (f'/api/datasets/{self.dataset_id}/', '/api/history/'):
+            json_response = self.client.get(url)
+            html = self.client.get(url, HTTP_ACCEPT='text/html')
+            self.assertEqual(html.status_code, 200, url)
+            self.assertTrue(html['Content-Type'].startswith('text/html'))
+            self.assertNotEqual(html['ETag'], json_response['ETag'])
+            self.assertEqual(self.client.get(url, {'format': 'api'}, HTTP_IF_NONE_MATCH=json_response['ETag']).status_code, 200)
+            again = self.client.get(url)
+            self.assertEqual(again.content, json_response.content)
+            self.assertEqual(again['ETag'], json_response['ETag'])
+
+    def test_new_upload_changes_history_etag(self):
+        first = self.client.get('/api/history/')
+        self.upload(SAMPLE_CSV + '\n')
+        second = self.client.get('/api/history/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.data), 2)
+
+
+class ReportStoreTests(APITestCase):
+    def test_report_is_prerendered_after_ingest(self):
+        with override_settings(INGEST_JOB_EXECUTOR='inline'), self.captureOnCommitCallbacks(execute=True):
+            dataset_id = self.upload().data['id']
+        path = reports.report_path(EquipmentDataset.objects.get(pk=dataset_id))
+        self.assertTrue(os.path.exists(path))
+
+        with mock.patch.object(reports, 'render_report') as render:
+            response = self.client.get(f'/api/datasets/{dataset_id}/generate_report/')
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_concurrent_requests_render_once(self):
+        dataset = EquipmentDataset.objects.get(pk=self.upload().data['id'])
+        calls = []
+
+        def slow_render(dataset):
+            calls.append(dataset.pk)
+            time.sleep(0.2)
+            return b'%PDF-1.4 test'
+
+        with mock.patch.object(reports, 'render_report', side_effect=slow_render):
+            threads = [threading.Thread(target=reports.get_report, args=(dataset,)) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(os.path.exists(reports.report_path(dataset) + '.lock'))
+
+    def test_stale_lock_removed_by_another_waiter(self):
+        with override_settings(REPORT_PRERENDER=False):
+            dataset = EquipmentDataset.objects.get(pk=self.upload().data['id'])
+        path = reports.report_path(dataset)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path + '.lock', 'w').close()
+        remove = os.remove
+
+        def raced_remove(target):
+            # The other waiter got there first
+            remove(target)
+            if target.endswith('.lock'):
+                raise FileNotFoundError(target)
+
+        with mock.patch.object(reports, 'LOCK_TIMEOUT', 0), mock.patch.object(reports.os, 'remove', raced_remove):
+            self.assertEqual(reports.get_report(dataset), path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_deleting_dataset_removes_reports(self):
+        dataset = EquipmentDataset.objects.get(pk=self.upload().data['id'])
+        path = reports.get_report(dataset)
+        dataset.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+class DeduplicationTests(APITestCase):
+    def test_identical_upload_reuses_dataset(self):
+        first = self.upload()
+        second = self.upload(name='copy.csv')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+        self.assertEqual(EquipmentData.objects.count(), 4)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), ['sample.csv'])
+        self.assertGreater(second.data['upload_date'], first.data['upload_date'])
+
+    def test_different_content_is_ingested(self):
+        self.upload()
+        response = self.upload(SAMPLE_CSV + 'Valve-001,Valve,60.0,4.1,105.0\n')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(EquipmentDataset.objects.count(), 2)
+
+
+@override_settings(INGEST_JOB_EXECUTOR='inline', REPORT_PRERENDER=False)
+class RetentionTests(APITestCase):
+    def upload_distinct(self, count):
+        ids = []
+        for index in range(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                ids.append(self.upload(SAMPLE_CSV + f'Extra-{index},Pump,1,1,1\n', name=f'{index}.csv').data['id'])
+        return ids
+
+    def test_ingest_keeps_newest_datasets_and_removes_files(self):
+        ids = self.upload_distinct(7)
+        remaining = set(str(pk) for pk in EquipmentDataset.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, set(ids[2:]))
+        self.assertEqual(EquipmentData.objects.count(), 5 * 5)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'uploads'))), 5)
+
+    def test_prune_uses_set_based_deletes(self):
+        with override_settings(RETENTION_AFTER_INGEST=False):
+            self.upload_distinct(4)
+        with self.assertNumQueries(8):
+            pruned = retention.prune_datasets({**retention.DEFAULT_POLICY, 'max_count': 1})
+        self.assertEqual(len(pruned), 3)
+        self.assertEqual(EquipmentData.objects.count(), 5)
+
+    def test_command_removes_orphaned_uploads(self):
+        self.upload_distinct(1)
+        orphan = os.path.join(self.media_root, 'uploads', 'orphan.csv')
+        with open(orphan, 'w') as handle:
+            handle.write(SAMPLE_CSV)
+        call_command('prune_datasets', '--orphan-grace-seconds=0', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'uploads'))), 1)
+
+
+@override_settings(INGEST_JOB_EXECUTOR='inline', REPORT_PRERENDER=False)
+class ChunkedUploadTests(APITestCase):
+    content = SAMPLE_CSV.encode('utf-8')
+
+    def start(self, content=None, **extra):
+        content = self.content if content is None else content
+        response = self.client.post('/api/uploads/', {
+            'file_name': 'chunked.csv',
+            'total_bytes': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            **extra
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, start, end, content=None, checksum=None):
+        content = self.content if content is None else content
+        chunk = content[start:end]
+        return self.client.put(
+            f'/api/uploads/{upload_id}/', chunk, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(content)}',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest()
+        )
+
+    def test_chunks_then_complete_ingests_file(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, 50).data['received_bytes'], 50)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['received_bytes'], 50)
+        self.assertEqual(self.put_chunk(upload_id, 50, len(self.content)).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'completed')
+        dataset = EquipmentDataset.objects.get(pk=job['dataset'])
+        self.assertEqual(dataset.summary_data['total_count'], 4)
+        self.assertEqual(dataset.content_hash, hashlib.sha256(self.content).hexdigest())
+
+    def test_out_of_order_and_corrupt_chunks_keep_offset(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 40)
+
+        gap = self.put_chunk(upload_id, 60, 80)
+        self.assertEqual(gap.status_code, 409)
+        self.assertEqual(gap.data['received_bytes'], 40)
+        corrupt = self.put_chunk(upload_id, 40, 80, checksum='0' * 64)
+        self.assertEqual(corrupt.status_code, 400)
+        # A retried chunk overlapping acknowledged bytes only adds the new tail
+        self.assertEqual(self.put_chunk(upload_id, 20, 80).data['received_bytes'], 80)
+        changed = self.content[:60] + b'X' + self.content[61:]
+        self.assertEqual(self.put_chunk(upload_id, 40, 100, changed).status_code, 409)
+
+        early = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(early.status_code, 409)
+        self.put_chunk(upload_id, 80, len(self.content))
+        with open(UploadSession.objects.get(pk=upload_id).file_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_duplicate_content_reuses_dataset(self):
+        existing = self.upload().data['id']
+        response = self.client.post('/api/uploads/', {
+            'file_name': 'copy.csv',
+            'total_bytes': len(self.content),
+            'sha256': hashlib.sha256(self.content).hexdigest()
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], existing)
+
+        # Without an announced hash the duplicate is only noticed on completion
+        upload_id = self.start(sha256='')
+        self.put_chunk(upload_id, 0, len(self.content))
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], existing)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), ['sample.csv'])
+
+    @override_settings(UPLOAD_STALL_TIMEOUT=0)
+    def test_stream_reads_only_acknowledged_bytes(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 50)
+        stream = uploads.open_upload_stream(UploadSession.objects.get(pk=upload_id))
+        self.assertEqual(stream.read(50), self.content[:50])
+        with self.assertRaisesMessage(ValueError, 'Upload stalled'):
+            stream.read(1)
+
+        self.put_chunk(upload_id, 50, len(self.content))
+        self.assertEqual(stream.read(len(self.content) - 50), self.content[50:])
+        # The end of the file waits for the whole-file hash to be checked
+        with self.assertRaisesMessage(ValueError, 'Upload stalled'):
+            stream.read(1)
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/complete/').status_code, 202)
+        self.assertEqual(stream.read(), b'')
+        stream.close()
+
+
+
+@override_settings(INGEST_JOB_EXECUTOR='inline', REPORT_PRERENDER=False, RETENTION_AFTER_INGEST=False)
+class BenchmarkTests(APITestCase):
+    def test_suite_measures_every_endpoint_and_flags_regressions(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir, ignore_errors=True)
+        results = benchmarks.run_suite([200], data_dir, type_cardinality=3, repeat=2)
+
+        scenario = results['results']['200']
+        self.assertEqual(EquipmentData.objects.count(), 200)
+        self.assertEqual(scenario['create']['status'], 201)
+        self.assertGreater(scenario['create']['rows_per_second'], 0)
+        for endpoint in benchmarks.ENDPOINTS[1:]:
+            self.assertEqual(scenario[endpoint]['cold']['status'], 200)
+            self.assertIn('warm', scenario[endpoint])
+        self.assertEqual(benchmarks.compare(results, results), [])
+
+        slower = json.loads(json.dumps(results))
+        slower['results']['200']['summary']['cold']['seconds'] *= 2
+        slower['results']['200']['create']['rows_per_second'] /= 2
+        regressed = [metric for metric, *_ in benchmarks.compare(slower, results)]
+        self.assertEqual(regressed, ['200/create/rows_per_second', '200/summary/cold/seconds'])
+
+
+@override_settings(METRICS_ENABLED=True, INGEST_JOB_EXECUTOR='inline', REPORT_PRERENDER=False,
+                   RETENTION_AFTER_INGEST=False)
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.drain()
+        self.addCleanup(metrics.registry.drain)
+
+    def test_upload_reports_stages_and_metrics(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        stages = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        for name in ('save', 'dedup', 'parse', 'stats', 'insert', 'summary', 'serialize', 'db', 'total'):
+            self.assertIn(name, stages)
+
+        self.client.get('/api/history/')
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode('utf-8')
+        self.assertIn('equipment_ingest_rows_total{engine="csv"} 4', text)
+        self.assertIn(
+            'equipment_http_requests_total{handler="equipmentdataset-list",method="POST",status="201"} 1', text
+        )
+        self.assertIn('equipment_http_request_duration_seconds_count{handler="dataset-history",method="GET"} 1', text)
+        self.assertIn(
+            'equipment_stage_duration_seconds_bucket{handler="equipmentdataset-list",stage="insert",le="+Inf"} 1', text
+        )
+
+    def test_async_job_stages_are_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(**{'async': 'true'})
+        text = metrics.registry.render()
+        self.assertIn('equipment_stage_duration_seconds_count{handler="ingest_job",stage="parse"} 1', text)
+
+    def test_disabled(self):
+        with override_settings(METRICS_ENABLED=False):
+            response = self.upload()
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(self.client.get('/api/metrics').status_code, 404)
+        self.assertEqual(metrics.registry.render(), '\n')
+
+
+class DatabaseTests(APITestCase):
+    def test_sqlite_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    @skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL')
+    def test_postgres_ingest_uses_copy(self):
+        with mock.patch('equipment_api.database.EquipmentData.objects.bulk_create') as bulk_create:
+            response = self.upload(SAMPLE_CSV + ',Valve,1.5,2,3\n')
+        self.assertEqual(response.status_code, 201)
+        bulk_create.assert_not_called()
+        records = EquipmentData.objects.filter(dataset_id=response.data['id'])
+        self.assertEqual(records.count(), 5)
+        self.assertEqual(records.get(equipment_type='Valve').equipment_name, '')
+
+
+@override_settings(EXPORT_BATCH_SIZE=3)
+class ExportTests(APITestCase):
+    def download(self, dataset_id, export_format):
+        response = self.client.get(f'/api/datasets/{dataset_id}/export/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_npz_from_rows_and_columns(self):
+        row_id = self.upload().data['id']
+        with override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0):
+            column_id = self.upload(SAMPLE_CSV + '\n').data['id']
+        for dataset_id in (row_id, column_id):
+            arrays = np.load(io.BytesIO(self.download(dataset_id, 'npz')))
+            self.assertEqual(arrays['equipment_name'].tolist(), ['Reactor-001', 'Mixer-001', 'Reactor-002', 'Pump-001'])
+            types = arrays['equipment_type_dictionary']
+            self.assertEqual(types[arrays['equipment_type']].tolist(), ['Reactor', 'Mixer', 'Reactor', 'Pump'])
+            self.assertEqual(arrays['pressure'].tolist(), [10.2, 5.5, 12.1, 15.3])
+
+    @skipUnless(export.pa is not None, 'requires pyarrow')
+    def test_arrow_and_parquet(self):
+        dataset_id = self.upload().data['id']
+        table = export.pa.ipc.open_stream(self.download(dataset_id, 'arrow')).read_all()
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.column('equipment_type').to_pylist(), ['Reactor', 'Mixer', 'Reactor', 'Pump'])
+
+        parquet = export.pq.ParquetFile(io.BytesIO(self.download(dataset_id, 'parquet')))
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        self.assertEqual(parquet.read().column('flowrate').to_pylist(), [150.5, 200.0, 180.7, 300.2])
+
+    def test_unknown_format(self):
+        dataset_id = self.upload().data['id']
+        response = self.client.get(f'/api/datasets/{dataset_id}/export/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+
+class ComparisonTests(APITestCase):
+    OTHER_CSV = (
+        'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n'
+        'Pump-101,Pump,100.0,5.0,30.0\n'
+        'Pump-102,Pump,120.0,7.0,50.0\n'
+    )
+
+    def test_compare_merges_partials(self):
+        first = self.upload().data['id']
+        second = self.upload(self.OTHER_CSV, name='pumps.csv').data['id']
+        self.assertTrue(EquipmentDataset.objects.get(pk=first).summary_partials)
+
+        response = self.client.get('/api/datasets/compare/', {'ids': f'{second},{first}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dataset['id'] for dataset in response.data['datasets']], [second, first])
+        combined = response.data['combined']
+        self.assertEqual(combined['total_count'], 6)
+        self.assertAlmostEqual(combined['averages']['flowrate'], statistics.mean([150.5, 200.0, 180.7, 300.2, 100.0, 120.0]))
+
+        pumps = response.data['type_deltas']['Pump']
+        self.assertEqual(pumps['combined']['count'], 3)
+        self.assertAlmostEqual(pumps['combined']['flowrate']['mean'], (300.2 + 100.0 + 120.0) / 3)
+        self.assertEqual(pumps['datasets'][second]['share'], 1.0)
+        self.assertAlmostEqual(pumps['datasets'][first]['share_delta'], 0.25 - 0.5)
+        self.assertIsNone(response.data['type_deltas']['Mixer']['datasets'][second]['flowrate']['mean'])
+
+        revalidated = self.client.get('/api/datasets/compare/', {'ids': f'{second},{first}'},
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_partials_rebuilt_for_older_datasets(self):
+        dataset_id = self.upload().data['id']
+        EquipmentDataset.objects.filter(pk=dataset_id).update(summary_partials={})
+        response = self.client.get('/api/datasets/compare/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['combined']['total_count'], 4)
+        self.assertEqual(EquipmentDataset.objects.get(pk=dataset_id).summary_partials['count'], 4)
+
+    def test_datasets_with_baseline_summary(self):
+        first = self.upload().data['id']
+        second = self.upload(self.OTHER_CSV, name='pumps.csv').data['id']
+        # summary_data as stored before extended statistics existed
+        EquipmentDataset.objects.filter(pk=first).update(summary_partials={}, summary_data={
+            'total_count': 4,
+            'equipment_types': {'Reactor': 2, 'Mixer': 1, 'Pump': 1},
+            'averages': {'flowrate': 207.85, 'pressure': 10.775, 'temperature': 70.0},
+        })
+        response = self.client.get('/api/datasets/compare/', {'ids': f'{first},{second}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['combined']['total_count'], 6)
+        self.assertEqual(response.data['type_deltas']['Reactor']['datasets'][first]['count'], 2)
+        self.assertAlmostEqual(response.data['type_deltas']['Pump']['datasets'][first]['flowrate']['mean'], 300.2)
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.client.get('/api/datasets/compare/', {'ids': 'nope'}).status_code, 400)
+        missing = '00000000-0000-0000-0000-000000000000'
+        self.assertEqual(self.client.get('/api/datasets/compare/', {'ids': missing}).status_code, 404)
+
+
+@override_settings(INGEST_JOB_EXECUTOR='inline')
+class AppendTests(APITestCase):
+    NEW_ROWS = (
+        'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n'
+        'Pump-002,Pump,120.0,7.0,50.0\n'
+        'Valve-001,Valve,60.0,3.5,25.0\n'
+    )
+
+    def append(self, dataset_id, content):
+        file = SimpleUploadedFile('shift.csv', content.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/datasets/{dataset_id}/append/', {'file': file}, format='multipart')
+
+    def assert_matches_full_upload(self, summary):
+        combined = SAMPLE_CSV + self.NEW_ROWS.split('\n', 1)[1]
+        expected = self.upload(combined, name='combined.csv').data['summary_data']
+        self.assertEqual(summary['total_count'], 6)
+        self.assertEqual(summary['equipment_types'], expected['equipment_types'])
+        for field in ('flowrate', 'pressure', 'temperature'):
+            self.assertAlmostEqual(summary['averages'][field], expected['averages'][field])
+            self.assertAlmostEqual(summary['statistics'][field]['std'], expected['statistics'][field]['std'])
+            self.assertEqual(summary['ranges'][field], expected['ranges'][field])
+
+    def test_append_rows(self):
+        created = self.upload().data
+        etag = self.client.get(f'/api/datasets/{created["id"]}/summary/')['ETag']
+
+        response = self.append(created['id'], self.NEW_ROWS)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['revision'], 1)
+        self.assert_matches_full_upload(response.data['summary_data'])
+        self.assertEqual(EquipmentData.objects.filter(dataset_id=created['id']).count(), 6)
+        self.assertEqual(EquipmentDataset.objects.get(pk=created['id']).summary_partials['count'], 6)
+
+        summary = self.client.get(f'/api/datasets/{created["id"]}/summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(summary.status_code, 200)
+        self.assertEqual(summary.data['total_count'], 6)
+
+    @override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0)
+    def test_append_columns(self):
+        dataset_id = self.upload().data['id']
+        self.assertEqual(self.append(dataset_id, self.NEW_ROWS).status_code, 200)
+
+        store = ColumnarStore(dataset_id)
+        self.assertEqual(store.count, 6)
+        self.assertEqual(store.types, ['Reactor', 'Mixer', 'Pump', 'Valve'])
+        self.assertEqual(store.name(5), 'Valve-001')
+        self.assertEqual(store.columns['flowrate'].tolist()[-2:], [120.0, 60.0])
+        self.assert_matches_full_upload(self.client.get(f'/api/datasets/{dataset_id}/summary/').data)
+
+    @override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0, INGEST_BATCH_SIZE=1)
+    def test_failed_append_leaves_dataset_unchanged(self):
+        dataset_id = self.upload().data['id']
+        broken = self.NEW_ROWS + 'Pump-003,Pump,not-a-number,1.0,1.0\n'
+        response = self.append(dataset_id, broken)
+        self.assertEqual(response.status_code, 400)
+
+        dataset = EquipmentDataset.objects.get(pk=dataset_id)
+        self.assertEqual((dataset.revision, dataset.summary_data['total_count']), (0, 4))
+        store = ColumnarStore(dataset_id)
+        self.assertEqual(store.count, 4)
+        self.assertEqual(os.path.getsize(os.path.join(store.path, 'flowrate.f64')), 4 * 8)
+        self.assertEqual(self.append(dataset_id, self.NEW_ROWS).data['summary_data']['total_count'], 6)
+
+    @override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0)
+    def test_columns_are_finalized_on_commit(self):
+        dataset_id = self.upload().data['id']
+        file = SimpleUploadedFile('shift.csv', self.NEW_ROWS.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/api/datasets/{dataset_id}/append/', {'file': file}, format='multipart')
+        self.assertEqual(ColumnarStore(dataset_id).count, 4)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(ColumnarStore(dataset_id).count, 6)
+
+        # Rolled back after the rows were written
+        with mock.patch.object(EquipmentDataset, 'save', side_effect=RuntimeError('disk full')):
+            self.assertEqual(self.append(dataset_id, self.NEW_ROWS).status_code, 400)
+        store = ColumnarStore(dataset_id)
+        self.assertEqual(store.count, 6)
+        self.assertEqual(os.path.getsize(os.path.join(store.path, 'flowrate.f64')), 6 * 8)
+
+
+class OutlierTests(APITestCase):
+    CSV = 'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n' + ''.join(
+        f'Pump-{index:03d},Pump,{100 + index},5.0,40.0\n' for index in range(10)
+    ) + 'Pump-999,Pump,500.0,5.0,40.0\nValve-001,Valve,10.0,80.0,20.0\n'
+
+    def outliers(self, dataset_id, **params):
+        response = self.client.get(f'/api/datasets/{dataset_id}/outliers/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_flagged_at_ingest(self):
+        dataset_id = self.upload(self.CSV).data['id']
+        self.assertEqual(EquipmentData.objects.filter(dataset_id=dataset_id, is_outlier=True).count(), 1)
+
+        data = self.outliers(dataset_id)
+        self.assertEqual([record['equipment_name'] for record in data['results']], ['Pump-999'])
+        pump = data['thresholds']['Pump']
+        self.assertEqual((pump['method'], pump['k'], pump['outliers']), ('iqr', 1.5, 1))
+        self.assertLess(pump['fields']['flowrate']['high'], 500.0)
+        self.assertEqual(self.outliers(dataset_id, equipment_type='Valve')['results'], [])
+
+    @override_settings(OUTLIER_THRESHOLDS={'*': {'method': 'zscore', 'k': 2}, 'Valve': {'limits': {'pressure': [0, 50]}}})
+    def test_configured_per_type(self):
+        dataset_id = self.upload(self.CSV).data['id']
+        data = self.outliers(dataset_id, ordering='-flowrate')
+        self.assertEqual([record['equipment_name'] for record in data['results']], ['Pump-999', 'Valve-001'])
+        self.assertEqual(data['thresholds']['Valve']['fields']['pressure'], {'low': 0, 'high': 50})
+        self.assertEqual(data['thresholds']['Pump']['method'], 'zscore')
+
+    @override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ONLY_MIN_BYTES=0)
+    def test_columnar_store(self):
+        dataset_id = self.upload(self.CSV).data['id']
+        self.assertEqual(ColumnarStore(dataset_id).outlier_positions().tolist(), [10])
+        data = self.outliers(dataset_id, fields='equipment_name,flowrate')
+        self.assertEqual(data['results'], [{'equipment_name': 'Pump-999', 'flowrate': 500.0}])
+
+    @override_settings(INGEST_JOB_EXECUTOR='inline')
+    def test_flagged_in_background_when_disabled(self):
+        with override_settings(OUTLIER_DETECTION=False):
+            dataset_id = self.upload(self.CSV).data['id']
+        self.assertEqual(EquipmentDataset.objects.get(pk=dataset_id).outlier_thresholds, {})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(f'/api/datasets/{dataset_id}/outliers/')
+        self.assertEqual((response.status_code, response['Retry-After']), (202, '5'))
+        self.assertEqual(len(self.outliers(dataset_id)['results']), 1)
+        self.assertIsNone(EquipmentDataset.objects.get(pk=dataset_id).outliers_queued_at)
+
+    @override_settings(INGEST_JOB_EXECUTOR='inline')
+    def test_background_flagging_is_queued_once_until_released(self):
+        with override_settings(OUTLIER_DETECTION=False):
+            dataset_id = self.upload(self.CSV).data['id']
+        url = f'/api/datasets/{dataset_id}/outliers/'
+        with mock.patch.object(jobs, 'run_outlier_flagging') as run, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual([self.client.get(url).status_code for _ in range(2)], [202, 202])
+        self.assertEqual(run.call_count, 1)
+
+        # A worker that died releases the claim through its future
+        failed = Future()
+        failed.set_exception(RuntimeError('worker died'))
+        jobs.release_outlier_job(dataset_id, failed)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url)
+        self.assertEqual(len(self.outliers(dataset_id)['results']), 1)
+
+    @override_settings(INGEST_JOB_EXECUTOR='inline')
+    def test_append_checks_new_records_against_stored_thresholds(self):
+        new_rows = 'Equipment Name,Equipment Type,Flowrate,Pressure,Temperature\n' + ''.join(
+            f'Pump-{index},Pump,{value},5.0,40.0\n' for index, value in ((900, 600.0), (901, 104.0))
+        ) + 'Mixer-001,Mixer,30.0,2.0,25.0\n'
+        for storage in ({}, {'COLUMNAR_STORAGE': True, 'COLUMNAR_ONLY_MIN_BYTES': 0}):
+            with self.subTest(**storage), override_settings(**storage):
+                dataset_id = self.upload(self.CSV).data['id']
+                before = EquipmentDataset.objects.get(pk=dataset_id).outlier_thresholds
+                file = SimpleUploadedFile('more.csv', new_rows.encode('utf-8'), content_type='text/csv')
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(f'/api/datasets/{dataset_id}/append/', {'file': file}, format='multipart')
+
+                data = self.outliers(dataset_id, ordering='flowrate')
+                self.assertEqual([record['equipment_name'] for record in data['results']], ['Pump-999', 'Pump-900'])
+                self.assertEqual(data['thresholds']['Pump']['fields'], before['Pump']['fields'])
+                self.assertEqual((data['thresholds']['Pump']['outliers'], data['thresholds']['Mixer']['outliers']), (2, 0))
+
+                call_command('flag_outliers', dataset=[dataset_id], stdout=io.StringIO())
+                refreshed = EquipmentDataset.objects.get(pk=dataset_id).outlier_thresholds
+                self.assertNotEqual(refreshed['Pump']['fields'], before['Pump']['fields'])
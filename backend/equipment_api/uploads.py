@@ -0,0 +1,223 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from .models import UploadSession
+
+DEFAULT_MAX_CHUNK_BYTES = 16 * 1024 * 1024
+DEFAULT_STALL_TIMEOUT = 10 * 60
+READ_SIZE = 64 * 1024
+
+
+class ChunkConflict(ValueError):
+    """A chunk does not continue the upload at its acknowledged offset."""
+
+
+def upload_storage():
+    return FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'uploads'))
+
+
+def save_upload(file):
+    """Store an uploaded file under ``MEDIA_ROOT/uploads``, hashing it on the way.
+
+    The stream is written once, chunk by chunk, into a temporary file while
+    its SHA-256 is computed; the file is then renamed to a free name.
+    Returns ``(filename, file_path, content_hash)``.
+    """
+    fs = upload_storage()
+    os.makedirs(fs.location, exist_ok=True)
+    digest = hashlib.sha256()
+
+    handle, tmp_path = tempfile.mkstemp(dir=fs.location, suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as tmp:
+            for chunk in file.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+        filename = fs.get_available_name(os.path.basename(file.name))
+        os.replace(tmp_path, fs.path(filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return filename, fs.path(filename), digest.hexdigest()
+
+
+def discard_upload(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_max_chunk_bytes():
+    return getattr(settings, 'UPLOAD_MAX_CHUNK_BYTES', DEFAULT_MAX_CHUNK_BYTES)
+
+
+def start_upload_session(file_name, total_bytes, content_hash=''):
+    """Open a chunked upload, reserving its final file name up front.
+
+    The file is written in place so a parse that starts before the upload
+    finishes already reads it from where the dataset will keep it.
+    """
+    fs = upload_storage()
+    os.makedirs(fs.location, exist_ok=True)
+    filename = fs.get_available_name(os.path.basename(file_name))
+    file_path = fs.path(filename)
+    open(file_path, 'xb').close()
+    return UploadSession.objects.create(
+        file_name=filename,
+        file_path=file_path,
+        total_bytes=total_bytes,
+        content_hash=content_hash
+    )
+
+
+def parse_content_range(header):
+    """Parse ``bytes START-END/TOTAL`` into ``(start, end_exclusive, total)``."""
+    try:
+        unit, _, spec = header.strip().partition(' ')
+        span, _, total = spec.partition('/')
+        start, _, end = span.partition('-')
+        start, end, total = int(start), int(end) + 1, int(total)
+    except (AttributeError, ValueError):
+        raise ValueError('Content-Range must look like "bytes START-END/TOTAL"')
+    if unit != 'bytes' or start < 0 or end <= start:
+        raise ValueError('Content-Range must look like "bytes START-END/TOTAL"')
+    return start, end, total
+
+
+def write_chunk(session, stream, start, end, checksum=None):
+    """Write bytes ``[start, end)`` of ``session`` read from ``stream``.
+
+    The chunk must begin at or before the acknowledged offset; bytes that
+    were already acknowledged (a retried chunk) are compared with the file
+    instead of rewritten, and a mismatch is a :class:`ChunkConflict`.
+    ``checksum`` is the chunk's SHA-256 hex digest. The offset only moves
+    forward once the whole chunk has been received and verified, so an
+    interrupted chunk is simply sent again. Returns the new offset.
+    """
+    if end > session.total_bytes:
+        raise ValueError('Chunk extends past the end of the upload')
+    if end - start > get_max_chunk_bytes():
+        raise ValueError(f'Chunks may be at most {get_max_chunk_bytes()} bytes')
+    if stream is None:
+        raise ValueError('Chunk body is empty')
+    if start > session.received_bytes:
+        raise ChunkConflict(f'Expected a chunk starting at offset {session.received_bytes}')
+
+    digest = hashlib.sha256()
+    skip = session.received_bytes - start
+    remaining = end - start
+    with open(session.file_path, 'r+b') as f:
+        f.seek(start)
+        while remaining:
+            block = stream.read(min(READ_SIZE, remaining))
+            if not block:
+                raise ValueError('Chunk is shorter than its Content-Range')
+            digest.update(block)
+            remaining -= len(block)
+            overlap = min(skip, len(block))
+            if overlap:
+                if f.read(overlap) != block[:overlap]:
+                    raise ChunkConflict('Chunk does not match the bytes already received')
+                skip -= overlap
+            if overlap < len(block):
+                f.write(block[overlap:])
+        f.flush()
+        os.fsync(f.fileno())
+
+    if checksum and digest.hexdigest() != checksum.lower():
+        raise ValueError('Chunk checksum does not match')
+
+    # Never move the offset backwards if another request got there first
+    UploadSession.objects.filter(pk=session.pk, received_bytes__lt=end).update(received_bytes=end)
+    session.refresh_from_db(fields=['received_bytes', 'updated_at'])
+    return session.received_bytes
+
+
+def abort_upload(session):
+    session.status = UploadSession.STATUS_ABORTED
+    session.save(update_fields=['status', 'updated_at'])
+    discard_upload(session.file_path)
+
+
+class UploadStream(io.RawIOBase):
+    """Read a chunked upload's file while its chunks are still arriving.
+
+    Only acknowledged bytes are returned, and the end of the file only once
+    the upload has been completed, i.e. its whole-file hash checked. When the
+    reader catches up it polls the session, backing off from
+    ``poll_interval`` to ``max_poll_interval`` seconds while nothing arrives,
+    and gives up if the upload is aborted or stops advancing for
+    ``UPLOAD_STALL_TIMEOUT`` seconds.
+    """
+
+    def __init__(self, session, poll_interval=0.2, max_poll_interval=2.0):
+        super().__init__()
+        self.session_id = session.pk
+        self.file = open(session.file_path, 'rb')
+        self.total = session.total_bytes
+        self.available = session.received_bytes
+        self.completed = session.status == UploadSession.STATUS_COMPLETE
+        self.position = 0
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.stall_timeout = getattr(settings, 'UPLOAD_STALL_TIMEOUT', DEFAULT_STALL_TIMEOUT)
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.total:
+            if not self.completed:
+                self._wait_for_data()
+            return 0
+        if self.position >= self.available:
+            self._wait_for_data()
+
+        data = self.file.read(min(len(buffer), self.available - self.position))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def _wait_for_data(self):
+        deadline = time.monotonic() + self.stall_timeout
+        interval = self.poll_interval
+        while True:
+            received, status = UploadSession.objects.values_list(
+                'received_bytes', 'status'
+            ).get(pk=self.session_id)
+            if status == UploadSession.STATUS_ABORTED:
+                raise ValueError('Upload was aborted')
+            self.completed = status == UploadSession.STATUS_COMPLETE
+            if received > self.position or self.completed:
+                self.available = received
+                return
+            if time.monotonic() >= deadline:
+                raise ValueError('Upload stalled')
+            time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def open_upload_stream(session):
+    return io.BufferedReader(UploadStream(session), buffer_size=READ_SIZE)
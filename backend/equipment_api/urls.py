@@ -1,11 +1,14 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .views import EquipmentDatasetViewSet, get_all_datasets
+from .views import EquipmentDatasetViewSet, IngestJobViewSet, UploadSessionViewSet, get_all_datasets, get_metrics
 
 router = DefaultRouter()
 router.register(r'datasets', EquipmentDatasetViewSet)
+router.register(r'jobs', IngestJobViewSet)
+router.register(r'uploads', UploadSessionViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('history/', get_all_datasets, name='dataset-history'),
+    re_path(r'^metrics/?$', get_metrics, name='metrics'),
 ]
\ No newline at end of file
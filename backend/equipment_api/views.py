@@ -1,172 +1,512 @@
 import os
-import csv
+import uuid
 from django.conf import settings
-from django.http import JsonResponse, FileResponse
-from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models.functions import Mod
+from django.http import JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import EquipmentDataset, EquipmentData
-from .serializers import EquipmentDatasetSerializer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-import io
+from rest_framework.settings import api_settings
+from rest_framework.reverse import reverse
+from .models import EquipmentDataset, EquipmentData, IngestJob, UploadSession
+from .serializers import (EquipmentDatasetSerializer, EquipmentDatasetListSerializer,
+                          EquipmentDataSerializer, IngestJobSerializer, UploadSessionSerializer,
+                          records_payload)
+from .pagination import RecordCursorPagination, ColumnarRecordPagination
+from . import comparison
+from .export import stream_export
+from .ingest import ingest_csv
+from .jobs import (can_stream_ingest, submit_ingest_job, submit_outlier_flagging, submit_report_render,
+                   submit_retention)
+from .renderers import ColumnarJSONRenderer, wants_columnar
+from .reports import delete_stale_reports, get_report
+from .uploads import (ChunkConflict, abort_upload, discard_upload, hash_file, parse_content_range,
+                      save_upload, start_upload_session, write_chunk)
+from .columnar import ColumnarStore, choose_storage, dataset_lock, discard_uncommitted
+from . import metrics
+from .metrics import stage
+from .caching import (HISTORY_KEY, compare_key, conditional_response, dataset_key, dataset_version,
+                      is_cacheable)
+from .query import QueryError, aggregate_columns, aggregate_rows, columnar_mask, parse_query
 import datetime
-from collections import Counter
+
+def wants_async_ingest(request):
+    value = request.query_params.get('async', request.data.get('async'))
+    if value is None:
+        return getattr(settings, 'INGEST_ASYNC', False)
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def reuse_existing_dataset(content_hash, file_path=None):
+    """Return the dataset already ingested from identical content, if any.
+
+    The new copy of the file (if any) is discarded and the existing dataset
+    is moved to the top of the history.
+    """
+    existing = EquipmentDataset.objects.filter(content_hash=content_hash, is_complete=True).first()
+    if existing is not None and file_path:
+        discard_upload(file_path)
+    if existing is not None:
+        existing.upload_date = timezone.now()
+        existing.save(update_fields=['upload_date'])
+    return existing
+
+def accepted_job_response(request, job):
+    response = Response(IngestJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('ingestjob-detail', args=[job.pk], request=request)
+    return response
 
 class EquipmentDatasetViewSet(viewsets.ModelViewSet):
-    queryset = EquipmentDataset.objects.all().order_by('-upload_date')
+    # Partials are only read by compare, which loads them explicitly
+    queryset = EquipmentDataset.objects.filter(is_complete=True).order_by('-upload_date').defer('summary_partials')
     serializer_class = EquipmentDatasetSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    # Actions that return records and so can send them column-wise
+    columnar_actions = ('create', 'retrieve', 'records', 'query', 'outliers')
     
-    def create(self, request):
-        all_datasets = EquipmentDataset.objects.all().order_by('upload_date')
-        if all_datasets.count() >= 5:
-            datasets_to_delete = all_datasets[:all_datasets.count() - 4]
-            for dataset in datasets_to_delete:
-                dataset.delete()
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return EquipmentDatasetListSerializer
+        return super().get_serializer_class()
+    
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action not in self.columnar_actions:
+            renderers = [renderer for renderer in renderers if not isinstance(renderer, ColumnarJSONRenderer)]
+        return renderers
+    
+    def perform_content_negotiation(self, request, force=False):
+        # export's ?format= names a file format, not one of the API's renderers
+        return super().perform_content_negotiation(request, force=force or self.action == 'export')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['columnar'] = wants_columnar(self.request)
+        return context
+    
+    def retrieve(self, request, *args, **kwargs):
+        dataset = self.get_object()
+        
+        def build():
+            with stage('serialize'):
+                data = self.get_serializer(dataset).data
+            return Response(data)
         
+        variant = 'retrieve-columnar' if wants_columnar(request) else 'retrieve'
+        return conditional_response(
+            request, dataset_key(dataset.pk, variant), dataset_version(dataset),
+            dataset.upload_date, build, cacheable=is_cacheable(dataset)
+        )
+    
+    def create(self, request):
         file = request.FILES.get('file')
         if not file:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'uploads'))
-        filename = fs.save(file.name, file)
-        file_path = fs.path(filename)
+        with stage('save'):
+            filename, file_path, content_hash = save_upload(file)
         
-        try:
-            # Read CSV using Python's built-in csv module
-            with open(file_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                rows = list(reader)
-            
-            if not rows:
-                return Response({'error': 'CSV file is empty'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Extract data
-            equipment_types = []
-            flowrates = []
-            pressures = []
-            temperatures = []
-            equipment_records_data = []
-            
-            for row in rows:
-                equipment_types.append(row.get('Equipment Type', ''))
-                flowrate = float(row.get('Flowrate', 0))
-                pressure = float(row.get('Pressure', 0))
-                temperature = float(row.get('Temperature', 0))
-                
-                flowrates.append(flowrate)
-                pressures.append(pressure)
-                temperatures.append(temperature)
-                
-                equipment_records_data.append({
-                    'equipment_name': row.get('Equipment Name', ''),
-                    'equipment_type': row.get('Equipment Type', ''),
-                    'flowrate': flowrate,
-                    'pressure': pressure,
-                    'temperature': temperature
-                })
-            
-            # Calculate statistics
-            type_counter = Counter(equipment_types)
-            
-            summary = {
-                'total_count': len(rows),
-                'equipment_types': dict(type_counter),
-                'averages': {
-                    'flowrate': sum(flowrates) / len(flowrates) if flowrates else 0,
-                    'pressure': sum(pressures) / len(pressures) if pressures else 0,
-                    'temperature': sum(temperatures) / len(temperatures) if temperatures else 0
-                },
-                'ranges': {
-                    'flowrate': {'min': min(flowrates) if flowrates else 0, 'max': max(flowrates) if flowrates else 0},
-                    'pressure': {'min': min(pressures) if pressures else 0, 'max': max(pressures) if pressures else 0},
-                    'temperature': {'min': min(temperatures) if temperatures else 0, 'max': max(temperatures) if temperatures else 0}
-                }
-            }
-            
-            # Create dataset record
-            dataset = EquipmentDataset.objects.create(
-                name=filename,
+        # Identical content was already ingested: reuse that dataset instead
+        with stage('dedup'):
+            existing = reuse_existing_dataset(content_hash, file_path)
+        if existing is not None:
+            serializer = self.get_serializer(existing)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        
+        if wants_async_ingest(request):
+            job = IngestJob.objects.create(
+                file_name=filename,
                 file_path=file_path,
-                summary_data=summary
+                content_hash=content_hash,
+                total_bytes=os.path.getsize(file_path)
             )
+            submit_ingest_job(job)
+            return accepted_job_response(request, job)
+        
+        try:
+            # Stream rows into the database in batches while collecting stats
+            dataset = None
+            try:
+                with transaction.atomic():
+                    dataset = EquipmentDataset.objects.create(
+                        name=filename,
+                        file_path=file_path,
+                        content_hash=content_hash,
+                        summary_data={},
+                        storage=choose_storage(file_path)
+                    )
+                    dataset.summary_data = ingest_csv(dataset, file_path)
+                    dataset.save(update_fields=['summary_data', 'summary_partials', 'outlier_thresholds'])
+                    submit_report_render(dataset)
+                    submit_retention()
+            except BaseException:
+                # The column files would outlive the rolled-back dataset
+                if dataset is not None:
+                    discard_uncommitted(dataset.pk, created=True)
+                raise
             
-            # Create equipment records
-            equipment_records = []
-            for data in equipment_records_data:
-                equipment_records.append(EquipmentData(
-                    dataset=dataset,
-                    equipment_name=data['equipment_name'],
-                    equipment_type=data['equipment_type'],
-                    flowrate=data['flowrate'],
-                    pressure=data['pressure'],
-                    temperature=data['temperature']
-                ))
-            
-            EquipmentData.objects.bulk_create(equipment_records)
-            
-            serializer = self.get_serializer(dataset)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with stage('serialize'):
+                data = self.get_serializer(dataset).data
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'])
+    def append(self, request, pk=None):
+        """Ingest a CSV of additional rows into an existing dataset."""
+        dataset = self.get_object()
+        file = request.FILES.get('file')
+        if not file:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with stage('save'):
+            _, file_path, _ = save_upload(file)
+        try:
+            # Appends to one dataset run one at a time, until their column files are final
+            with dataset_lock(dataset.pk):
+                try:
+                    with transaction.atomic():
+                        dataset = EquipmentDataset.objects.select_for_update().get(pk=dataset.pk)
+                        dataset.summary_data = ingest_csv(dataset, file_path, append=True)
+                        dataset.revision += 1
+                        # Moves Last-Modified on; the content no longer matches the original upload
+                        dataset.upload_date = timezone.now()
+                        dataset.content_hash = ''
+                        dataset.save(update_fields=['summary_data', 'summary_partials', 'outlier_thresholds',
+                                                    'revision', 'upload_date', 'content_hash'])
+                        transaction.on_commit(lambda: delete_stale_reports(dataset))
+                        submit_report_render(dataset)
+                except BaseException:
+                    discard_uncommitted(dataset.pk)
+                    raise
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            discard_upload(file_path)
+        
+        return Response(EquipmentDatasetListSerializer(dataset).data)
+    
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         dataset = self.get_object()
-        return Response(dataset.summary_data)
+        return conditional_response(
+            request, dataset_key(dataset.pk, 'summary'), dataset_version(dataset), dataset.upload_date,
+            lambda: Response(dataset.summary_data)
+        )
+    
+    @action(detail=False, methods=['get'])
+    def compare(self, request):
+        """Per-dataset and combined statistics for ``?ids=`` (default: the five newest)."""
+        datasets = EquipmentDataset.objects.filter(is_complete=True)
+        requested = [value for value in request.query_params.get('ids', '').split(',') if value]
+        if not requested:
+            datasets = list(datasets.order_by('-upload_date')[:comparison.DEFAULT_LIMIT])
+        else:
+            try:
+                ids = list(dict.fromkeys(uuid.UUID(value) for value in requested))
+            except ValueError:
+                return Response({'error': 'ids must be dataset UUIDs'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > comparison.MAX_DATASETS:
+                return Response({'error': f'At most {comparison.MAX_DATASETS} datasets can be compared'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            found = datasets.in_bulk(ids)
+            missing = [str(pk) for pk in ids if pk not in found]
+            if missing:
+                return Response({'error': f'Unknown datasets: {", ".join(missing)}'},
+                                status=status.HTTP_404_NOT_FOUND)
+            datasets = [found[pk] for pk in ids]
+        if not datasets:
+            return Response({'error': 'No datasets to compare'}, status=status.HTTP_404_NOT_FOUND)
+        
+        def build():
+            with stage('merge'):
+                data = comparison.compare_datasets(datasets)
+            return Response(data)
+        
+        return conditional_response(
+            request, compare_key([dataset.pk for dataset in datasets]),
+            ','.join(dataset_version(dataset) for dataset in datasets),
+            max(dataset.upload_date for dataset in datasets), build
+        )
     
     @action(detail=True, methods=['get'])
-    def generate_report(self, request, pk=None):
+    def records(self, request, pk=None):
+        return self.paginated_records(request, self.get_object())
+    
+    @action(detail=True, methods=['get'])
+    def query(self, request, pk=None):
         dataset = self.get_object()
+        try:
+            query = parse_query(request.query_params)
+        except QueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        pdf.setFont("Helvetica-Bold", 16)
-        pdf.drawString(1*inch, height-1*inch, f"Equipment Analysis Report: {dataset.name}")
+        if not query.is_aggregate:
+            return self.paginated_records(request, dataset, query)
         
-        pdf.setFont("Helvetica", 10)
-        pdf.drawString(1*inch, height-1.25*inch, f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if dataset.has_rows:
+            result = aggregate_rows(EquipmentData.objects.filter(dataset=dataset), query)
+        else:
+            result = aggregate_columns(ColumnarStore(dataset.pk), query)
+        return Response({'groups' if query.group_by else 'aggregates': result})
+    
+    @action(detail=True, methods=['get'])
+    def outliers(self, request, pk=None):
+        """Records outside their type's normal range, plus the thresholds behind them."""
+        dataset = self.get_object()
+        try:
+            query = parse_query(request.query_params)
+        except QueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if query.is_aggregate:
+            return Response({'error': 'Outliers cannot be aggregated'}, status=status.HTTP_400_BAD_REQUEST)
         
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(1*inch, height-1.75*inch, "Summary Statistics:")
+        if not dataset.outlier_thresholds:
+            # Ingested or appended to with OUTLIER_DETECTION off: flagged in the background
+            submit_outlier_flagging(dataset)
+            response = Response({'status': 'pending'}, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = '5'
+            return response
         
-        pdf.setFont("Helvetica", 10)
-        y = height - 2*inch
-        summary = dataset.summary_data
+        # Without filters, only the outliers themselves are read
+        response = self.paginated_records(request, dataset, query if query.filter_kwargs() else None,
+                                          only_outliers=True)
+        if response.status_code == 200:
+            response.data['thresholds'] = dataset.outlier_thresholds
+        return response
+    
+    def paginated_records(self, request, dataset, query=None, only_outliers=False):
+        fields = EquipmentDataSerializer.Meta.fields
+        requested = request.query_params.get('fields')
+        if requested:
+            fields = [name for name in requested.split(',') if name in fields]
+            if not fields:
+                return Response({'error': 'No valid fields requested'}, status=status.HTTP_400_BAD_REQUEST)
+        # Every stride-th record only, e.g. to plot a sample of a large dataset
+        try:
+            stride = int(request.query_params.get('stride', 1))
+        except ValueError:
+            stride = 0
+        if stride < 1:
+            return Response({'error': 'stride must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
         
-        pdf.drawString(1.5*inch, y, f"Total Equipment: {summary['total_count']}")
-        y -= 0.25*inch
+        if not dataset.has_rows:
+            store = ColumnarStore(dataset.pk)
+            mask = columnar_mask(store, query) if query else None
+            positions = store.outlier_positions() if only_outliers else None
+            return ColumnarRecordPagination().paginate(store, request, fields, mask=mask,
+                                                       columnar=wants_columnar(request), positions=positions,
+                                                       stride=stride)
         
-        pdf.drawString(1.5*inch, y, "Equipment Type Distribution:")
-        y -= 0.2*inch
+        paginator = RecordCursorPagination()
+        # Load only the columns being rendered plus whatever the cursor orders by
+        loaded = {'id', *fields}
+        ordering = request.query_params.get('ordering', '').lstrip('-')
+        if ordering in paginator.ordering_fields:
+            loaded.add(ordering)
         
-        for eq_type, count in summary['equipment_types'].items():
-            pdf.drawString(2*inch, y, f"{eq_type}: {count}")
-            y -= 0.2*inch
+        # Plain dicts rather than model instances; the cursor reads its position from them too
+        queryset = EquipmentData.objects.filter(dataset=dataset).values(*loaded)
+        if query:
+            queryset = queryset.filter(**query.filter_kwargs())
+        if only_outliers:
+            queryset = queryset.filter(is_outlier=True)
+        if stride > 1:
+            # Ids of a dataset's records are (nearly) consecutive, so this keeps about 1 in stride
+            queryset = queryset.annotate(stride_offset=Mod('id', stride)).filter(stride_offset=0)
+        with stage('query'):
+            page = paginator.paginate_queryset(queryset, request, view=self)
+        with stage('serialize'):
+            rows = [tuple(row[field] for field in fields) for row in page]
+            data = records_payload(rows, fields, wants_columnar(request))
+        return paginator.get_paginated_response(data)
+    
+    @action(detail=True, methods=['get'])
+    def generate_report(self, request, pk=None):
+        dataset = self.get_object()
         
-        y -= 0.1*inch
-        pdf.drawString(1.5*inch, y, "Average Values:")
-        y -= 0.2*inch
+        def build():
+            with stage('report'):
+                path = get_report(dataset)
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"report_{dataset.name}.pdf")
         
-        for param, value in summary['averages'].items():
-            pdf.drawString(2*inch, y, f"{param.capitalize()}: {value:.2f}")
-            y -= 0.2*inch
+        return conditional_response(
+            request, dataset_key(dataset.pk, 'report'), dataset_version(dataset), dataset.upload_date,
+            build, cacheable=False
+        )
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """All records as an Arrow IPC stream, Parquet file or NumPy .npz (``?format=``)."""
+        dataset = self.get_object()
+        export_format = request.query_params.get('format', 'arrow')
+        try:
+            chunks, content_type, extension = stream_export(dataset, export_format)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        pdf.save()
-        buffer.seek(0)
+        def build():
+            response = StreamingHttpResponse(chunks, content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{dataset.pk}.{extension}"'
+            return response
         
-        return FileResponse(buffer, as_attachment=True, filename=f"report_{dataset.name}.pdf")
+        return conditional_response(
+            request, dataset_key(dataset.pk, f'export-{export_format}'), dataset_version(dataset),
+            dataset.upload_date, build, cacheable=False
+        )
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_all_datasets(request):
-    datasets = EquipmentDataset.objects.all().order_by('-upload_date')[:5]
-    serializer = EquipmentDatasetSerializer(datasets, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    datasets = EquipmentDataset.objects.filter(is_complete=True).order_by('-upload_date').defer('summary_partials')[:5]
+    # Cheap validator query; the full listing is only built on a cache miss
+    versions = list(datasets.values_list('id', 'upload_date'))
+    last_modified = versions[0][1] if versions else datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
+    
+    def build():
+        with stage('serialize'):
+            data = EquipmentDatasetListSerializer(datasets, many=True).data
+        return Response(data)
+    
+    return conditional_response(request, HISTORY_KEY, repr(versions), last_modified, build)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_metrics(request):
+    """Request, query and ingest metrics in the Prometheus text format."""
+    if not metrics.is_enabled():
+        return Response({'error': 'Metrics are disabled'}, status=status.HTTP_404_NOT_FOUND)
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+class IngestJobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = IngestJob.objects.all()
+    serializer_class = IngestJobSerializer
+    permission_classes = [IsAuthenticated]
+
+
+class UploadSessionViewSet(viewsets.GenericViewSet):
+    """Chunked, resumable uploads.
+
+    ``POST /api/uploads/`` opens a session for ``file_name`` and
+    ``total_bytes`` (optionally the file's ``sha256``). Each chunk is sent with
+    ``PUT /api/uploads/{id}/`` as a raw body with ``Content-Range: bytes
+    START-END/TOTAL`` and an optional ``X-Chunk-SHA256`` header; ``GET``
+    reports the acknowledged ``received_bytes`` to resume from, and
+    ``POST .../complete/`` hands the file to an ingest job. Unless ``stream``
+    is false, the job starts parsing as soon as the session is opened. If
+    the announced ``sha256`` matches a dataset that already exists, opening
+    the session answers 200 with that dataset and nothing needs sending.
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def create(self, request):
+        file_name = request.data.get('file_name')
+        try:
+            total_bytes = int(request.data.get('total_bytes'))
+        except (TypeError, ValueError):
+            total_bytes = 0
+        if not file_name or total_bytes <= 0:
+            return Response({'error': 'file_name and a positive total_bytes are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        content_hash = str(request.data.get('sha256', '')).lower()
+        existing = reuse_existing_dataset(content_hash) if content_hash else None
+        if existing is not None:
+            return Response(EquipmentDatasetListSerializer(existing).data, status=status.HTTP_200_OK)
+        
+        with transaction.atomic():
+            session = start_upload_session(file_name, total_bytes, content_hash)
+            # Parse while the chunks arrive; needs a worker since the job waits on them
+            stream = str(request.data.get('stream', 'true')).lower() in ('1', 'true', 'yes')
+            if stream and can_stream_ingest():
+                session.job = IngestJob.objects.create(
+                    file_name=session.file_name,
+                    file_path=session.file_path,
+                    total_bytes=total_bytes
+                )
+                session.save(update_fields=['job'])
+                submit_ingest_job(session.job, streaming=True)
+        
+        response = Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+        response['Location'] = reverse('uploadsession-detail', args=[session.pk], request=request)
+        return response
+    
+    def retrieve(self, request, pk=None):
+        return Response(self.get_serializer(self.get_object()).data)
+    
+    def update(self, request, pk=None):
+        session = self.get_object()
+        if session.status != UploadSession.STATUS_OPEN:
+            return Response({'error': f'Upload is {session.status}'}, status=status.HTTP_409_CONFLICT)
+        try:
+            start, end, total = parse_content_range(request.headers.get('Content-Range'))
+            if total != session.total_bytes:
+                raise ValueError('Content-Range total does not match the upload size')
+            with stage('write'):
+                write_chunk(session, request.stream, start, end, request.headers.get('X-Chunk-SHA256'))
+        except ChunkConflict as e:
+            data = self.get_serializer(session).data
+            return Response({'error': str(e), **data}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(session).data)
+    
+    def destroy(self, request, pk=None):
+        session = self.get_object()
+        if session.status == UploadSession.STATUS_OPEN:
+            abort_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        if session.status != UploadSession.STATUS_OPEN:
+            return Response({'error': f'Upload is {session.status}'}, status=status.HTTP_409_CONFLICT)
+        if session.received_bytes < session.total_bytes:
+            data = self.get_serializer(session).data
+            return Response({'error': 'Upload is incomplete', **data}, status=status.HTTP_409_CONFLICT)
+        
+        with stage('hash'):
+            content_hash = hash_file(session.file_path)
+        if session.content_hash and session.content_hash.lower() != content_hash:
+            job = session.job
+            if job is not None:
+                # Recorded before the abort ends the job's stream
+                IngestJob.objects.filter(pk=job.pk).update(
+                    status=IngestJob.STATUS_FAILED, error='Upload checksum does not match'
+                )
+                EquipmentDataset.objects.filter(jobs=job).delete()
+            abort_upload(session)
+            return Response({'error': 'Upload checksum does not match'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = session.job
+        with transaction.atomic():
+            session.content_hash = content_hash
+            session.status = UploadSession.STATUS_COMPLETE
+            if job is not None and job.status != IngestJob.STATUS_FAILED:
+                # Already parsing: it only still needs the hash for deduplication
+                IngestJob.objects.filter(pk=job.pk).update(content_hash=content_hash)
+                EquipmentDataset.objects.filter(jobs=job, content_hash='').update(content_hash=content_hash)
+                job.refresh_from_db()
+            else:
+                existing = reuse_existing_dataset(content_hash, session.file_path)
+                if existing is not None:
+                    session.job = None
+                    session.save(update_fields=['content_hash', 'status', 'job', 'updated_at'])
+                    return Response(EquipmentDatasetListSerializer(existing).data, status=status.HTTP_200_OK)
+                job = session.job = IngestJob.objects.create(
+                    file_name=session.file_name,
+                    file_path=session.file_path,
+                    content_hash=content_hash,
+                    total_bytes=session.total_bytes
+                )
+                submit_ingest_job(job)
+            session.save(update_fields=['content_hash', 'status', 'job', 'updated_at'])
+        
+        return accepted_job_response(request, job)
@@ -0,0 +1,77 @@
+"""Entry points executed inside ingest worker processes.
+
+Spawned workers unpickle these functions before Django is configured, so this
+module must not import models (directly or indirectly) at import time.
+"""
+import multiprocessing
+import os
+
+import django
+
+
+def init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+def run_ingest_job(job_id):
+    """Run a job on a fresh database connection.
+
+    In a worker process, returns the metrics it recorded so the parent can
+    merge them into the registry that ``/api/metrics`` serves.
+    """
+    from django.db import close_old_connections
+
+    from .jobs import process_ingest_job
+    from .metrics import is_enabled, registry
+
+    close_old_connections()
+    try:
+        process_ingest_job(job_id)
+    finally:
+        close_old_connections()
+    if is_enabled() and multiprocessing.parent_process() is not None:
+        return registry.drain()
+    return None
+
+
+def run_report_job(dataset_id):
+    """Pre-render a dataset's PDF report into the report store."""
+    from django.db import close_old_connections
+
+    from .models import EquipmentDataset
+    from .reports import get_report
+
+    close_old_connections()
+    try:
+        dataset = EquipmentDataset.objects.filter(pk=dataset_id).first()
+        if dataset is not None:
+            get_report(dataset)
+    finally:
+        close_old_connections()
+
+
+def run_outlier_job(dataset_id):
+    """Recompute a dataset's outlier thresholds and flags."""
+    from django.db import close_old_connections
+
+    from .jobs import run_outlier_flagging
+
+    close_old_connections()
+    try:
+        run_outlier_flagging(dataset_id)
+    finally:
+        close_old_connections()
+
+
+def run_retention_job():
+    """Prune datasets outside the retention policy."""
+    from django.db import close_old_connections
+
+    from .retention import prune_datasets
+
+    close_old_connections()
+    try:
+        prune_datasets()
+    finally:
+        close_old_connections()
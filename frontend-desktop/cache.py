@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import threading
+
+from PyQt5.QtCore import QStandardPaths
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    dataset_id TEXT,
+    etag TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_dataset_idx ON responses (dataset_id);
+CREATE TABLE IF NOT EXISTS datasets (
+    id TEXT PRIMARY KEY,
+    etag TEXT NOT NULL
+);
+"""
+
+
+def default_cache_path():
+    directory = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, 'datasets.sqlite3')
+
+
+class ResponseCache:
+    """Persistent store of API responses in an SQLite file.
+
+    Each response is kept under its URL together with the ETag the server
+    sent, so it can be revalidated with If-None-Match after a restart or
+    served as-is when the backend is unreachable. Responses that belong to
+    a dataset carry its id; when the dataset's own ETag changes, everything
+    cached for it is dropped, which is how record pages (which have no ETag
+    of their own) are kept in step with the server.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        # Written from the network service's pool threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def get(self, url):
+        """Return ``(etag, payload)`` for a cached URL, or ``None``."""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT etag, payload FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, url, etag, payload, dataset_id=None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (url, dataset_id, etag, payload) VALUES (?, ?, ?, ?)',
+                (url, dataset_id, etag, json.dumps(payload))
+            )
+
+    def validate_dataset(self, dataset_id, etag):
+        """Record a dataset's ETag; returns True (and drops its responses) if it changed."""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                'SELECT etag FROM datasets WHERE id = ?', (dataset_id,)
+            ).fetchone()
+            if row is not None and row[0] == etag:
+                return False
+            if row is not None:
+                self.connection.execute('DELETE FROM responses WHERE dataset_id = ?', (dataset_id,))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO datasets (id, etag) VALUES (?, ?)', (dataset_id, etag)
+            )
+            return row is not None
+
+    def retain_datasets(self, dataset_ids):
+        """Forget every dataset that is not in ``dataset_ids``."""
+        dataset_ids = [str(dataset_id) for dataset_id in dataset_ids]
+        placeholders = ', '.join('?' * len(dataset_ids)) or "''"
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'DELETE FROM responses WHERE dataset_id IS NOT NULL AND dataset_id NOT IN ({placeholders})',
+                dataset_ids
+            )
+            self.connection.execute(
+                f'DELETE FROM datasets WHERE id NOT IN ({placeholders})', dataset_ids
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
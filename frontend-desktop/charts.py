@@ -0,0 +1,177 @@
+import math
+
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QPainter
+from PyQt5.QtChart import (QChart, QChartView, QBarSet, QBarSeries, QBarCategoryAxis,
+                           QLineSeries, QScatterSeries, QValueAxis, QCategoryAxis)
+
+PARAMETERS = [('flowrate', 'Flowrate'), ('pressure', 'Pressure'), ('temperature', 'Temperature')]
+
+# Above this many points animations cost more than they show
+ANIMATION_MAX_POINTS = 2000
+# Above this many points series are drawn with OpenGL instead of QPainter
+OPENGL_MIN_POINTS = 10000
+# Larger datasets are plotted from an evenly strided sample of about this size
+SCATTER_MAX_POINTS = 50000
+
+
+def set_animations(chart, points):
+    chart.setAnimationOptions(QChart.SeriesAnimations if points <= ANIMATION_MAX_POINTS else QChart.NoAnimation)
+
+
+def padded_range(low, high):
+    pad = (high - low) * 0.05 or 1.0
+    return low - pad, high + pad
+
+
+class TypeDistributionChart(QChartView):
+    """Bar chart of the equipment type counts; updated in place per dataset."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        chart = QChart()
+        chart.setTitle("Equipment Type Distribution")
+
+        self.bar_set = QBarSet("Count")
+        self.series = QBarSeries()
+        self.series.append(self.bar_set)
+        chart.addSeries(self.series)
+
+        self.axis_x = QBarCategoryAxis()
+        chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.series.attachAxis(self.axis_x)
+        self.axis_y = QValueAxis()
+        chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.series.attachAxis(self.axis_y)
+
+        self.setChart(chart)
+        self.setRenderHint(QPainter.Antialiasing)
+
+    def update_summary(self, summary):
+        types = summary['equipment_types']
+        set_animations(self.chart(), len(types))
+
+        self.bar_set.remove(0, self.bar_set.count())
+        self.bar_set.append([float(count) for count in types.values()])
+        self.axis_x.clear()
+        self.axis_x.append(list(types))
+        self.axis_y.setRange(0, max(types.values(), default=0) or 1)
+
+
+class ParameterChart(QChartView):
+    """Min / max / average of each parameter as three line series."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        chart = QChart()
+        chart.setTitle("Parameter Analysis")
+        set_animations(chart, 0)
+
+        axis_x = QCategoryAxis()
+        for i, (_, label) in enumerate(PARAMETERS):
+            axis_x.append(label, i)
+        axis_x.setRange(0, len(PARAMETERS) - 1)
+        chart.addAxis(axis_x, Qt.AlignBottom)
+        self.axis_y = QValueAxis()
+        chart.addAxis(self.axis_y, Qt.AlignLeft)
+
+        self.series = {}
+        for name in ('Min', 'Max', 'Average'):
+            series = QLineSeries()
+            series.setName(name)
+            chart.addSeries(series)
+            series.attachAxis(axis_x)
+            series.attachAxis(self.axis_y)
+            self.series[name] = series
+
+        self.setChart(chart)
+        self.setRenderHint(QPainter.Antialiasing)
+
+    def update_summary(self, summary):
+        values = {
+            'Min': [summary['ranges'][field]['min'] for field, _ in PARAMETERS],
+            'Max': [summary['ranges'][field]['max'] for field, _ in PARAMETERS],
+            'Average': [summary['averages'][field] for field, _ in PARAMETERS],
+        }
+        for name, series in self.series.items():
+            series.replace([QPointF(i, value) for i, value in enumerate(values[name])])
+        self.axis_y.setRange(*padded_range(min(values['Min']), max(values['Max'])))
+
+
+class ScatterChart(QChartView):
+    """One point per record (flowrate against pressure), paged in from the API.
+
+    Pages are buffered and the series filled with one ``replace()`` once the
+    last has arrived, so it redraws once rather than per point or per page.
+    Datasets above ``SCATTER_MAX_POINTS`` records are sampled server-side
+    (``stride``), bounding both the fetch and the plot. The axes come from
+    the summary's ranges so they never need recomputing. Large samples switch
+    to OpenGL rendering and drop animations. ``fetch_page(url, on_page)`` has the same contract as for
+    ``RecordTableModel``.
+    """
+
+    x_field = 'flowrate'
+    y_field = 'pressure'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        chart = QChart()
+        chart.setTitle("Flowrate vs Pressure")
+        chart.legend().hide()
+
+        self.series = QScatterSeries()
+        self.series.setMarkerSize(4.0)
+        self.series.setBorderColor(Qt.transparent)
+        chart.addSeries(self.series)
+
+        self.axis_x = QValueAxis()
+        self.axis_x.setTitleText("Flowrate")
+        chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.series.attachAxis(self.axis_x)
+        self.axis_y = QValueAxis()
+        self.axis_y.setTitleText("Pressure")
+        chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.series.attachAxis(self.axis_y)
+
+        self.points = []
+        self.fetch_page = None
+        self.setChart(chart)
+
+    def load(self, summary, first_page_url, fetch_page):
+        total = summary['total_count']
+        stride = max(1, math.ceil(total / SCATTER_MAX_POINTS))
+        points = math.ceil(total / stride)
+        if stride > 1 and first_page_url:
+            first_page_url = f"{first_page_url}&stride={stride}"
+        self.chart().setTitle(
+            "Flowrate vs Pressure" if stride == 1 else f"Flowrate vs Pressure (1 in {stride:,} records)"
+        )
+        set_animations(self.chart(), points)
+        self.series.setUseOpenGL(points >= OPENGL_MIN_POINTS)
+        # Antialiasing hundreds of thousands of markers is what stalls QPainter
+        self.setRenderHint(QPainter.Antialiasing, points < OPENGL_MIN_POINTS)
+
+        ranges = summary['ranges']
+        self.axis_x.setRange(*padded_range(ranges[self.x_field]['min'], ranges[self.x_field]['max']))
+        self.axis_y.setRange(*padded_range(ranges[self.y_field]['min'], ranges[self.y_field]['max']))
+
+        self.points = []
+        self.series.clear()
+        self.fetch_page = fetch_page
+        if points and first_page_url:
+            fetch_page(first_page_url, self.append_page)
+
+    def append_page(self, page):
+        records = page.get('results', [])
+        if isinstance(records, dict):
+            columns = records['columns']
+            self.points.extend(map(QPointF, columns[self.x_field], columns[self.y_field]))
+        elif records:
+            x_field, y_field = self.x_field, self.y_field
+            self.points.extend(QPointF(record[x_field], record[y_field]) for record in records)
+        next_url = page.get('next')
+        if next_url and self.fetch_page is not None:
+            self.fetch_page(next_url, self.append_page)
+        else:
+            self.series.replace(self.points)
+            self.points = []
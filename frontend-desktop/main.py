@@ -1,41 +1,145 @@
+import gzip
+import hashlib
+import os
+import shutil
 import sys
-import requests
+import tempfile
+import time
 import traceback
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QFileDialog, QTableWidget,
-                             QTableWidgetItem, QLabel, QMessageBox, QTabWidget,
+                             QHBoxLayout, QPushButton, QFileDialog, QTableView,
+                             QLabel, QMessageBox, QTabWidget,
                              QGroupBox, QListWidget, QProgressBar, QHeaderView, 
-                             QGridLayout, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                             QGridLayout, QFrame, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette, QPainter
-from PyQt5.QtChart import QChart, QChartView, QBarSet, QBarSeries, QBarCategoryAxis
-from PyQt5.QtChart import QPieSeries, QLineSeries, QValueAxis, QCategoryAxis
 from datetime import datetime
+import requests
+from records_model import RecordTableModel, fit_columns_to_sample
+from network import NetworkService
+from charts import TypeDistributionChart, ParameterChart, ScatterChart
 
 class WorkerThread(QThread):
+    """Uploads a file in verified chunks, resuming after network errors.
+
+    With ``compress`` set, a plain CSV is gzipped to a temporary file first
+    (the server detects and inflates it while parsing).
+    """
     finished = pyqtSignal(object)
+    accepted = pyqtSignal(object)
+    progress = pyqtSignal(object, object)
     error = pyqtSignal(str)
     
-    def __init__(self, url, file_path, auth):
+    CHUNK_SIZE = 1024 * 1024
+    MAX_RETRIES = 8
+    
+    def __init__(self, base_url, file_path, session, compress=False):
         super().__init__()
-        self.url = url
+        self.base_url = base_url
         self.file_path = file_path
-        self.auth = auth
+        self.session = session
+        self.compress = compress
     
     def run(self):
+        upload_path = self.file_path
         try:
-            with open(self.file_path, 'rb') as f:
-                files = {'file': f}
-                response = requests.post(
-                    self.url,
-                    files=files,
-                    auth=self.auth,
-                    timeout=30
-                )
-                response.raise_for_status()
-                self.finished.emit(response.json())
+            if self.compress and not self.is_compressed(self.file_path):
+                upload_path = self.gzip_file(self.file_path)
+            self.upload(upload_path, os.path.basename(self.file_path))
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            if upload_path != self.file_path:
+                os.remove(upload_path)
+    
+    @staticmethod
+    def is_compressed(file_path):
+        with open(file_path, 'rb') as f:
+            head = f.read(4)
+        return head.startswith(b'\x1f\x8b') or head.startswith(b'\x28\xb5\x2f\xfd')
+    
+    def gzip_file(self, file_path):
+        handle, gz_path = tempfile.mkstemp(suffix='.csv.gz')
+        # A fixed mtime keeps the bytes (and so the server-side dedup hash) stable
+        with open(file_path, 'rb') as source, os.fdopen(handle, 'wb') as target:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=target, compresslevel=6, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed, self.CHUNK_SIZE)
+        return gz_path
+    
+    def upload(self, upload_path, file_name):
+        total = os.path.getsize(upload_path)
+        digest = hashlib.sha256()
+        with open(upload_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(block)
+        
+        # The server starts parsing as soon as the first chunks arrive
+        response = self.session.post(
+            f"{self.base_url}/uploads/",
+            json={
+                'file_name': file_name,
+                'total_bytes': total,
+                'sha256': digest.hexdigest(),
+                'stream': True
+            },
+            timeout=30
+        )
+        response.raise_for_status()
+        if response.status_code == 200:
+            # Identical content is already on the server; nothing to send
+            self.finished.emit(response.json())
+            return
+        upload_url = f"{self.base_url}/uploads/{response.json()['id']}/"
+        
+        self.send_chunks(upload_path, upload_url, total)
+        
+        response = self.session.post(f"{upload_url}complete/", timeout=60)
+        response.raise_for_status()
+        if response.status_code == 202:
+            self.accepted.emit(response.json())
+        else:
+            self.finished.emit(response.json())
+    
+    def send_chunks(self, upload_path, upload_url, total):
+        offset = 0
+        retries = 0
+        self.progress.emit(offset, total)
+        with open(upload_path, 'rb') as f:
+            while offset < total:
+                f.seek(offset)
+                chunk = f.read(self.CHUNK_SIZE)
+                try:
+                    response = self.session.put(
+                        upload_url,
+                        data=chunk,
+                        headers={
+                            'Content-Type': 'application/octet-stream',
+                            'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{total}",
+                            'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()
+                        },
+                        timeout=30
+                    )
+                    if response.status_code != 409:
+                        response.raise_for_status()
+                    # Continue from whatever the server acknowledged
+                    offset = response.json()['received_bytes']
+                    retries = 0
+                    self.progress.emit(offset, total)
+                except requests.RequestException:
+                    retries += 1
+                    if retries > self.MAX_RETRIES:
+                        raise
+                    time.sleep(min(2 ** retries, 30))
+                    offset = self.acknowledged_offset(upload_url, offset)
+    
+    def acknowledged_offset(self, upload_url, fallback):
+        try:
+            response = self.session.get(upload_url, timeout=10)
+            response.raise_for_status()
+            return response.json()['received_bytes']
+        except requests.RequestException:
+            return fallback
 
 class EquipmentVisualizer(QMainWindow):
     def __init__(self):
@@ -44,6 +148,13 @@ class EquipmentVisualizer(QMainWindow):
         self.history = []
         self.auth = ('admin', 'password123')
         self.base_url = 'http://localhost:8000/api'
+        self.current_job = None
+        # Every request goes through the service's pooled session and threads
+        self.network = NetworkService(self.auth, parent=self)
+        self.network.offline_changed.connect(self.on_offline_changed)
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(500)
+        self.job_timer.timeout.connect(self.poll_job)
         self.init_ui()
         self.load_history()
     
@@ -92,7 +203,7 @@ class EquipmentVisualizer(QMainWindow):
             QListWidget::item:selected {
                 background-color: #e3f2fd;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #ddd;
                 border-radius: 6px;
                 background-color: white;
@@ -137,6 +248,10 @@ class EquipmentVisualizer(QMainWindow):
         """)
         upload_layout.addWidget(self.upload_btn)
         
+        self.compress_check = QCheckBox("Compress upload (gzip)")
+        self.compress_check.setChecked(True)
+        upload_layout.addWidget(self.compress_check)
+        
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
         upload_layout.addWidget(self.progress_bar)
@@ -215,6 +330,14 @@ class EquipmentVisualizer(QMainWindow):
         self.charts_container = QWidget()
         self.charts_layout = QGridLayout()
         self.charts_container.setLayout(self.charts_layout)
+        # Charts are built once and fed new data for each dataset
+        self.type_chart = TypeDistributionChart()
+        self.parameter_chart = ParameterChart()
+        self.scatter_chart = ScatterChart()
+        self.charts_layout.addWidget(self.type_chart, 0, 0)
+        self.charts_layout.addWidget(self.parameter_chart, 0, 1)
+        self.charts_layout.addWidget(self.scatter_chart, 1, 0, 1, 2)
+        self.charts_container.setVisible(False)
         summary_layout.addWidget(self.charts_container)
         
         summary_tab.setLayout(summary_layout)
@@ -223,7 +346,10 @@ class EquipmentVisualizer(QMainWindow):
         table_tab = QWidget()
         table_layout = QVBoxLayout()
         
-        self.table = QTableWidget()
+        self.table = QTableView()
+        self.table.setModel(RecordTableModel())
+        self.table.setAlternatingRowColors(True)
+        self.table.verticalHeader().setDefaultSectionSize(24)
         table_layout.addWidget(self.table)
         
         table_tab.setLayout(table_layout)
@@ -243,17 +369,75 @@ class EquipmentVisualizer(QMainWindow):
             self.status_label.setText("Uploading...")
             self.upload_btn.setEnabled(False)
             self.progress_bar.setVisible(True)
-            self.progress_bar.setRange(0, 0)
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(0)
             
             self.worker = WorkerThread(
-                f"{self.base_url}/datasets/",
+                self.base_url,
                 file_path,
-                self.auth
+                self.network.session,
+                compress=self.compress_check.isChecked()
             )
+            self.worker.progress.connect(self.on_upload_progress)
             self.worker.finished.connect(self.on_upload_success)
+            self.worker.accepted.connect(self.on_upload_accepted)
             self.worker.error.connect(self.on_upload_error)
             self.worker.start()
     
+    def on_upload_progress(self, sent, total):
+        self.progress_bar.setValue(int(sent * 100 / total) if total else 100)
+        self.status_label.setText(f"Uploading... {sent / 1048576:.1f} / {total / 1048576:.1f} MB")
+    
+    def on_upload_accepted(self, job):
+        self.current_job = job
+        self.status_label.setText("Processing...")
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.job_timer.start()
+    
+    def poll_job(self):
+        if not self.current_job:
+            self.job_timer.stop()
+            return
+        
+        # A tick that fires while the last poll is unanswered shares its request
+        self.network.get_json(
+            f"{self.base_url}/jobs/{self.current_job['id']}/",
+            self.on_job_status,
+            self.on_job_error
+        )
+    
+    def on_job_error(self, error):
+        if not self.current_job:
+            return
+        self.job_timer.stop()
+        self.current_job = None
+        self.on_upload_error(error)
+    
+    def on_job_status(self, job):
+        if not self.current_job or job['id'] != self.current_job['id']:
+            return
+        
+        self.progress_bar.setValue(int(job['progress'] * 100))
+        self.status_label.setText(f"Processing... {job['rows_processed']:,} rows ({job['stage']})")
+        
+        if job['status'] == 'failed':
+            self.job_timer.stop()
+            self.current_job = None
+            self.on_upload_error(job['error'])
+        elif job['status'] == 'completed':
+            self.job_timer.stop()
+            self.current_job = None
+            self.network.get_json(
+                f"{self.base_url}/datasets/{job['dataset']}/summary/",
+                lambda summary: self.on_upload_success({
+                    'id': job['dataset'],
+                    'name': job['file_name'],
+                    'summary_data': summary
+                }),
+                self.on_upload_error
+            )
+    
     def on_upload_success(self, data):
         self.current_dataset = data
         self.status_label.setText("✓ Upload successful!")
@@ -272,30 +456,62 @@ class EquipmentVisualizer(QMainWindow):
         QMessageBox.critical(self, "Upload Error", f"Error: {str(error)}")
     
     def load_history(self):
-        try:
-            response = requests.get(
-                f"{self.base_url}/history/",
-                auth=self.auth,
-                timeout=10
-            )
-            response.raise_for_status()
-            self.history = response.json()
-            self.history_list.clear()
-            
-            for dataset in self.history:
-                date_str = datetime.fromisoformat(dataset['upload_date'].replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M')
-                item_text = f"{dataset['name']}\nUploaded: {date_str}\nRecords: {dataset['summary_data']['total_count']}"
-                self.history_list.addItem(item_text)
-                
-        except Exception as e:
-            QMessageBox.warning(self, "Warning", f"Failed to load history: {e}")
+        # Show the last known history from disk straight away, then revalidate
+        if not self.history:
+            cached = self.network.cache.get(f"{self.base_url}/history/")
+            if cached:
+                self.on_history_loaded(cached[1])
+        
+        # Repeated Refresh clicks share the request already in flight
+        self.network.get_json(
+            f"{self.base_url}/history/",
+            self.on_history_loaded,
+            self.on_history_error
+        )
+    
+    def on_history_loaded(self, history):
+        self.history = history
+        # Only datasets the history can still show are worth keeping on disk
+        self.network.cache.retain_datasets(dataset['id'] for dataset in history)
+        self.history_list.clear()
+        
+        for dataset in self.history:
+            date_str = datetime.fromisoformat(dataset['upload_date'].replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M')
+            item_text = f"{dataset['name']}\nUploaded: {date_str}\nRecords: {dataset['summary_data']['total_count']}"
+            self.history_list.addItem(item_text)
+    
+    def on_history_error(self, error):
+        QMessageBox.warning(self, "Warning", f"Failed to load history: {error}")
     
     def select_dataset(self, item):
         index = self.history_list.currentRow()
         if index < len(self.history):
+            # The table pages records in itself, so the summary entry is enough
             self.current_dataset = self.history[index]
             self.display_data()
             self.report_btn.setEnabled(True)
+            
+            # Cheap If-None-Match check; a changed dataset drops its cached pages
+            self.network.get_json(
+                f"{self.base_url}/datasets/{self.current_dataset['id']}/summary/",
+                self.on_summary_revalidated,
+                group='records',
+                dataset_id=self.current_dataset['id'],
+                validates=True
+            )
+    
+    def on_summary_revalidated(self, summary):
+        if self.current_dataset and summary != self.current_dataset['summary_data']:
+            self.current_dataset = dict(self.current_dataset, summary_data=summary)
+            self.display_data()
+    
+    def on_offline_changed(self, offline):
+        if offline:
+            self.status_label.setText("⚠ Offline - showing cached datasets")
+            self.status_label.setStyleSheet("color: #FF9800; padding: 5px; font-size: 12px;")
+        else:
+            self.status_label.setText("Ready to upload")
+            self.status_label.setStyleSheet("color: #666; padding: 5px; font-size: 12px;")
     
     def display_data(self):
         if not self.current_dataset:
@@ -339,138 +555,66 @@ class EquipmentVisualizer(QMainWindow):
         self.update_table()
     
     def update_charts(self):
-        # Clear existing charts
-        for i in reversed(range(self.charts_layout.count())): 
-            widget = self.charts_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
-        
         summary = self.current_dataset['summary_data']
-        
-        # Create Bar Chart
-        bar_chart = QChart()
-        bar_chart.setTitle("Equipment Type Distribution")
-        bar_chart.setAnimationOptions(QChart.SeriesAnimations)
-        
-        bar_set = QBarSet("Count")
-        categories = []
-        
-        for eq_type, count in summary['equipment_types'].items():
-            bar_set.append(count)
-            categories.append(eq_type)
-        
-        bar_series = QBarSeries()
-        bar_series.append(bar_set)
-        bar_chart.addSeries(bar_series)
-        
-        axis_x = QBarCategoryAxis()
-        axis_x.append(categories)
-        bar_chart.addAxis(axis_x, Qt.AlignBottom)
-        bar_series.attachAxis(axis_x)
-        
-        axis_y = QValueAxis()
-        bar_chart.addAxis(axis_y, Qt.AlignLeft)
-        bar_series.attachAxis(axis_y)
-        
-        bar_chart_view = QChartView(bar_chart)
-        bar_chart_view.setRenderHint(QPainter.Antialiasing)
-        
-        # Create Parameter Chart
-        line_chart = QChart()
-        line_chart.setTitle("Parameter Analysis")
-        line_chart.setAnimationOptions(QChart.SeriesAnimations)
-        
-        parameters = ['Flowrate', 'Pressure', 'Temperature']
-        min_values = [
-            summary['ranges']['flowrate']['min'],
-            summary['ranges']['pressure']['min'],
-            summary['ranges']['temperature']['min']
-        ]
-        max_values = [
-            summary['ranges']['flowrate']['max'],
-            summary['ranges']['pressure']['max'],
-            summary['ranges']['temperature']['max']
-        ]
-        avg_values = [
-            summary['averages']['flowrate'],
-            summary['averages']['pressure'],
-            summary['averages']['temperature']
-        ]
-        
-        # Min series
-        min_series = QLineSeries()
-        min_series.setName("Min")
-        for i, value in enumerate(min_values):
-            min_series.append(i, value)
-        
-        # Max series
-        max_series = QLineSeries()
-        max_series.setName("Max")
-        for i, value in enumerate(max_values):
-            max_series.append(i, value)
-        
-        # Avg series
-        avg_series = QLineSeries()
-        avg_series.setName("Average")
-        for i, value in enumerate(avg_values):
-            avg_series.append(i, value)
-        
-        line_chart.addSeries(min_series)
-        line_chart.addSeries(max_series)
-        line_chart.addSeries(avg_series)
-        
-        axis_x_line = QCategoryAxis()
-        for i, param in enumerate(parameters):
-            axis_x_line.append(param, i)
-        axis_x_line.setRange(0, len(parameters)-1)
-        line_chart.addAxis(axis_x_line, Qt.AlignBottom)
-        min_series.attachAxis(axis_x_line)
-        max_series.attachAxis(axis_x_line)
-        avg_series.attachAxis(axis_x_line)
-        
-        axis_y_line = QValueAxis()
-        line_chart.addAxis(axis_y_line, Qt.AlignLeft)
-        min_series.attachAxis(axis_y_line)
-        max_series.attachAxis(axis_y_line)
-        avg_series.attachAxis(axis_y_line)
-        
-        line_chart_view = QChartView(line_chart)
-        line_chart_view.setRenderHint(QPainter.Antialiasing)
-        
-        # Add charts to layout
-        self.charts_layout.addWidget(bar_chart_view, 0, 0)
-        self.charts_layout.addWidget(line_chart_view, 0, 1)
+        self.charts_container.setVisible(True)
+        self.type_chart.update_summary(summary)
+        self.parameter_chart.update_summary(summary)
+        
+        # Points still streaming in for the previous dataset are stale
+        self.network.cancel_group('scatter')
+        fields = f"{ScatterChart.x_field},{ScatterChart.y_field}"
+        self.scatter_chart.load(
+            summary,
+            f"{self.base_url}/datasets/{self.current_dataset['id']}/records/?fields={fields}&page_size=5000&format=columnar",
+            partial(self.fetch_records_page, self.current_dataset['id'], group='scatter')
+        )
     
     def update_table(self):
-        records = self.current_dataset['records']
-        self.table.setRowCount(len(records))
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            'Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'
-        ])
-        
-        for row, record in enumerate(records):
-            self.table.setItem(row, 0, QTableWidgetItem(record['equipment_name']))
-            self.table.setItem(row, 1, QTableWidgetItem(record['equipment_type']))
-            self.table.setItem(row, 2, QTableWidgetItem(f"{record['flowrate']:.2f}"))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{record['pressure']:.2f}"))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{record['temperature']:.2f}"))
-        
-        self.table.resizeColumnsToContents()
+        # Pages still loading for the previously selected dataset are stale
+        self.network.cancel_group('records')
+        
+        # Records are paged in from the server as the user scrolls
+        model = RecordTableModel(
+            f"{self.base_url}/datasets/{self.current_dataset['id']}/records/?page_size=1000&format=columnar",
+            self.current_dataset['summary_data']['total_count'],
+            partial(self.fetch_records_page, self.current_dataset['id']),
+            self.table
+        )
+        model.page_loaded.connect(self.on_records_page)
+        previous = self.table.model()
+        self.table.setModel(model)
+        # setModel() does not delete the old model, which owns its records
+        if previous is not None:
+            previous.deleteLater()
+        if model.canFetchMore():
+            model.fetchMore()
+    
+    def fetch_records_page(self, dataset_id, url, on_page, group='records'):
+        # Pages of an unchanged dataset never change, so disk copies are used as-is
+        self.network.get_json(
+            url, on_page, self.on_records_error, group=group, timeout=30,
+            dataset_id=dataset_id, immutable=True
+        )
+    
+    def on_records_page(self, first_row):
+        if first_row == 0:
+            fit_columns_to_sample(self.table)
+    
+    def on_records_error(self, error):
+        QMessageBox.warning(self, "Warning", f"Failed to load records: {error}")
     
     def generate_report(self):
         if not self.current_dataset:
             return
         
+        self.network.get_content(
+            f"{self.base_url}/datasets/{self.current_dataset['id']}/generate_report/",
+            self.save_report,
+            self.on_report_error
+        )
+    
+    def save_report(self, content):
         try:
-            response = requests.get(
-                f"{self.base_url}/datasets/{self.current_dataset['id']}/generate_report/",
-                auth=self.auth,
-                stream=True,
-                timeout=30
-            )
-            response.raise_for_status()
-            
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Save PDF Report", 
                 f"equipment_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf", 
@@ -479,13 +623,20 @@ class EquipmentVisualizer(QMainWindow):
             
             if file_path:
                 with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                    f.write(content)
                 
                 QMessageBox.information(self, "Success", f"PDF report saved to:\n{file_path}")
                 
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to generate report:\n{str(e)}")
+            self.on_report_error(e)
+    
+    def on_report_error(self, error):
+        QMessageBox.critical(self, "Error", f"Failed to generate report:\n{str(error)}")
+    
+    def closeEvent(self, event):
+        self.job_timer.stop()
+        self.network.shutdown()
+        super().closeEvent(event)
 
 def main():
     app = QApplication(sys.argv)
@@ -510,17 +661,23 @@ def main():
     window = EquipmentVisualizer()
     window.show()
     
-    # Check backend connection
-    try:
-        requests.get('http://localhost:8000/api/history/', auth=('admin', 'password123'), timeout=2)
-    except:
+    # Check backend connection; this shares the window's initial history request
+    def backend_unreachable(error=None):
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Warning)
         msg.setText("Backend Server Not Found")
-        msg.setInformativeText("Please ensure the Django backend is running on http://localhost:8000")
+        msg.setInformativeText("Please ensure the Django backend is running on http://localhost:8000\n"
+                               "Previously viewed datasets are still available offline.")
         msg.setWindowTitle("Connection Error")
         msg.exec_()
     
+    def check_backend(history):
+        # Offline, the history request is answered from the disk cache
+        if window.network.offline:
+            backend_unreachable()
+    
+    window.network.get_json(f"{window.base_url}/history/", check_backend, backend_unreachable)
+    
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,185 @@
+import requests
+from requests.adapters import HTTPAdapter
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from cache import ResponseCache
+
+
+class _Signals(QObject):
+    # QRunnable is not a QObject, so results travel back through this helper
+    succeeded = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+
+class Request(QRunnable):
+    """One queued call; ``call()`` runs on a pool thread."""
+
+    def __init__(self, key, group, call, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.group = group
+        self.call = call
+        self.signals = signals
+        self.callbacks = []
+        self.cancelled = False
+
+    def add_callbacks(self, on_success, on_error):
+        # A repeated click hands us the same bound methods; only call them once
+        if (on_success, on_error) not in self.callbacks:
+            self.callbacks.append((on_success, on_error))
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.call()
+        except Exception as e:
+            self.signals.failed.emit(self, e)
+        else:
+            self.signals.succeeded.emit(self, result)
+
+
+class NetworkService(QObject):
+    """Runs API requests off the GUI thread over one keep-alive session.
+
+    Results are delivered to callbacks on the GUI thread. Requests with the
+    same key share a single round trip while one is in flight, and requests
+    tagged with a ``group`` can be dropped together with ``cancel_group()``
+    once their answer is no longer wanted (e.g. another dataset was selected).
+
+    JSON responses are kept in a persistent ``ResponseCache``. When the
+    backend cannot be reached a cached copy is returned instead and
+    ``offline_changed`` is emitted, so the app stays browsable offline.
+    """
+
+    offline_changed = pyqtSignal(bool)
+
+    def __init__(self, auth, cache=None, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.signals = _Signals()
+        self.signals.succeeded.connect(self._on_succeeded)
+        self.signals.failed.connect(self._on_failed)
+        self.in_flight = {}
+        self.cache = cache or ResponseCache()
+        self.offline = False
+
+    def request(self, key, call, on_success=None, on_error=None, group=None):
+        """Queue ``call()`` unless a request with the same key is already running."""
+        request = self.in_flight.get(key)
+        if request is None:
+            request = Request(key, group, call, self.signals)
+            self.in_flight[key] = request
+            self.pool.start(request)
+        request.add_callbacks(on_success, on_error)
+        return request
+
+    def is_pending(self, key):
+        return key in self.in_flight
+
+    def cancel_group(self, group):
+        for key, request in list(self.in_flight.items()):
+            if request.group == group:
+                request.cancel()
+                self.pool.tryTake(request)
+                del self.in_flight[key]
+
+    def get_json(self, url, on_success=None, on_error=None, group=None, timeout=10,
+                 dataset_id=None, immutable=False, validates=False):
+        return self.request(
+            ('GET', url),
+            lambda: self.fetch_json(url, timeout, dataset_id, immutable, validates),
+            on_success, on_error, group
+        )
+
+    def get_content(self, url, on_success=None, on_error=None, group=None, timeout=30):
+        return self.request(
+            ('CONTENT', url),
+            lambda: self.fetch_content(url, timeout),
+            on_success, on_error, group
+        )
+
+    def fetch_json(self, url, timeout=10, dataset_id=None, immutable=False, validates=False):
+        """GET a JSON resource, revalidating any cached copy with If-None-Match.
+
+        ``dataset_id`` files the response under a dataset. ``immutable``
+        responses (record pages) are served from the cache without asking
+        the server; they are only refreshed once a ``validates`` response
+        for the same dataset comes back with a new ETag.
+        """
+        cached = self.cache.get(url)
+        if cached and immutable:
+            return cached[1]
+
+        headers = {}
+        if cached and cached[0]:
+            headers['If-None-Match'] = cached[0]
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            self.set_offline(True)
+            if cached is None:
+                raise
+            return cached[1]
+        self.set_offline(False)
+
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+
+        payload = response.json()
+        etag = response.headers.get('ETag')
+        if validates and dataset_id is not None and etag:
+            self.cache.validate_dataset(dataset_id, etag)
+        if etag or immutable:
+            self.cache.put(url, etag, payload, dataset_id)
+        return payload
+
+    def set_offline(self, offline):
+        if offline != self.offline:
+            self.offline = offline
+            self.offline_changed.emit(offline)
+
+    def fetch_content(self, url, timeout=30):
+        response = self.session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    def shutdown(self):
+        for request in self.in_flight.values():
+            request.cancel()
+        self.in_flight.clear()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.session.close()
+        self.cache.close()
+
+    def _finish(self, request):
+        if self.in_flight.get(request.key) is request:
+            del self.in_flight[request.key]
+        return not request.cancelled
+
+    @pyqtSlot(object, object)
+    def _on_succeeded(self, request, result):
+        if self._finish(request):
+            for on_success, _ in request.callbacks:
+                if on_success is not None:
+                    on_success(result)
+
+    @pyqtSlot(object, object)
+    def _on_failed(self, request, error):
+        if self._finish(request):
+            for _, on_error in request.callbacks:
+                if on_error is not None:
+                    on_error(error)
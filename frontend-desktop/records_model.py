@@ -0,0 +1,128 @@
+from array import array
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtGui import QFontMetrics
+
+COLUMNS = [
+    ('equipment_name', 'Equipment Name'),
+    ('equipment_type', 'Type'),
+    ('flowrate', 'Flowrate'),
+    ('pressure', 'Pressure'),
+    ('temperature', 'Temperature'),
+]
+NUMERIC_COLUMNS = ('flowrate', 'pressure', 'temperature')
+
+
+class RecordTableModel(QAbstractTableModel):
+    """Table model over a dataset's records, paged in from the API on demand.
+
+    Records are held column-wise (a list of names, dictionary-encoded types
+    and ``array('d')`` numbers) rather than as one object per cell, and
+    cells are only formatted when the view asks for them in ``data()``.
+    ``fetch_page(url, on_page)`` requests a page without blocking and later
+    calls ``on_page`` with ``{'results': ..., 'next': url_or_None}``; no
+    further page is requested while one is outstanding. Results may be a
+    list of records or the API's columnar format (``?format=columnar``),
+    which is appended column by column.
+    """
+
+    page_loaded = pyqtSignal(int)
+
+    def __init__(self, first_page_url=None, total_rows=0, fetch_page=None, parent=None):
+        super().__init__(parent)
+        self.fetch_page = fetch_page
+        self.next_url = first_page_url
+        self.total_rows = total_rows
+        self.names = []
+        self.type_names = []
+        self.type_lookup = {}
+        self.type_codes = array('I')
+        self.numbers = {column: array('d') for column in NUMERIC_COLUMNS}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = COLUMNS[index.column()][0]
+        row = index.row()
+
+        if role == Qt.DisplayRole:
+            if column == 'equipment_name':
+                return self.names[row]
+            if column == 'equipment_type':
+                return self.type_names[self.type_codes[row]]
+            return f"{self.numbers[column][row]:.2f}"
+        if role == Qt.TextAlignmentRole and column in NUMERIC_COLUMNS:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.next_url is not None and self.fetch_page is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        url, self.next_url = self.next_url, None
+        self.fetch_page(url, self.append_page)
+
+    def type_code(self, equipment_type):
+        code = self.type_lookup.get(equipment_type)
+        if code is None:
+            code = self.type_lookup[equipment_type] = len(self.type_names)
+            self.type_names.append(equipment_type)
+        return code
+
+    def append_page(self, page):
+        records = page.get('results', [])
+        self.next_url = page.get('next')
+        count = records.get('count', 0) if isinstance(records, dict) else len(records)
+        if not count:
+            return
+
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        if isinstance(records, dict):
+            columns = records['columns']
+            # Map the page's type dictionary onto ours once, not per row
+            codes = [self.type_code(name) for name in records['dictionaries']['equipment_type']]
+            self.names.extend(columns['equipment_name'])
+            self.type_codes.extend([codes[code] for code in columns['equipment_type']])
+            for column in NUMERIC_COLUMNS:
+                self.numbers[column].extend(columns[column])
+            self.endInsertRows()
+            self.page_loaded.emit(first)
+            return
+
+        for record in records:
+            self.names.append(record['equipment_name'])
+            self.type_codes.append(self.type_code(record['equipment_type']))
+            for column in NUMERIC_COLUMNS:
+                self.numbers[column].append(record[column])
+        self.endInsertRows()
+        self.page_loaded.emit(first)
+
+
+def fit_columns_to_sample(view, sample_size=200, padding=24):
+    """Size columns from a spread-out sample of rows instead of every row."""
+    model = view.model()
+    metrics = QFontMetrics(view.font())
+    header_metrics = QFontMetrics(view.horizontalHeader().font())
+    rows = model.rowCount()
+    step = max(rows // sample_size, 1)
+
+    for column in range(model.columnCount()):
+        width = header_metrics.horizontalAdvance(str(model.headerData(column, Qt.Horizontal)))
+        for row in range(0, rows, step):
+            text = model.data(model.index(row, column))
+            width = max(width, metrics.horizontalAdvance(text))
+        view.setColumnWidth(column, width + padding)
@@ -67,9 +67,16 @@ function App() {
     }
   };
 
-  const handleDatasetSelect = (dataset) => {
-    setCurrentDataset(dataset);
-    showMessage(`Loaded dataset: ${dataset.name}`, "success");
+  const handleDatasetSelect = async (dataset) => {
+    // History entries only carry summaries; fetch the records on demand
+    try {
+      const response = await axios.get(`/api/datasets/${dataset.id}/`);
+      setCurrentDataset(response.data);
+      showMessage(`Loaded dataset: ${dataset.name}`, "success");
+    } catch (error) {
+      showMessage("Failed to load dataset", "error");
+      console.error("Error loading dataset:", error);
+    }
   };
 
   const handleGenerateReport = async (datasetId) => {